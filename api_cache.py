@@ -0,0 +1,187 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+
+# Default cache location and size limit
+API_CACHE_DB = "api_cache.db"
+API_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Seconds a cached response stays fresh, per API resource. Playlist membership
+# changes rarely; statistics and comments change all the time.
+DEFAULT_TTLS = {
+    "channels": 6 * 3600,
+    "playlists": 24 * 3600,
+    "playlistItems": 24 * 3600,
+    "videos": 3600,
+    "commentThreads": 3600,
+    "comments": 3600,
+}
+DEFAULT_TTL = 3600
+
+
+# Raised in offline replay mode when a request has no cached response
+class CacheMiss(Exception):
+    pass
+
+
+# Size-bounded LRU store of API responses in a local SQLite file. Responses are
+# stored zlib-compressed; when the total size exceeds `max_bytes` the least
+# recently used entries are evicted. With `offline=True` nothing is sent to the
+# network: cached responses are replayed regardless of age and misses raise
+# CacheMiss.
+class ResponseCache:
+    def __init__(self, path=API_CACHE_DB, max_bytes=API_CACHE_MAX_BYTES, ttls=None, offline=False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.offline = offline
+        self.hits = Counter()
+        self.misses = Counter()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                cache_key TEXT PRIMARY KEY,
+                resource TEXT,
+                body BLOB,
+                size INTEGER,
+                stored_at REAL,
+                last_access REAL
+            )""")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+            self._total_bytes = self._connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(resource, method, params):
+        return json.dumps([resource, method, sorted(params.items())], default=str)
+
+    def get(self, resource, key):
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT body, stored_at FROM responses WHERE cache_key = ?", (key,)).fetchone()
+            fresh = row is not None and (self.offline or now - row[1] <= self.ttls.get(resource, DEFAULT_TTL))
+            if not fresh:
+                self.misses[resource] += 1
+                return None
+            self.hits[resource] += 1
+            with self._connection:
+                self._connection.execute(
+                    "UPDATE responses SET last_access = ? WHERE cache_key = ?", (now, key))
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, resource, key, response):
+        body = zlib.compress(json.dumps(response).encode("utf-8"))
+        now = time.time()
+        with self._lock, self._connection:
+            old = self._connection.execute(
+                "SELECT size FROM responses WHERE cache_key = ?", (key,)).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (cache_key, resource, body, size, stored_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (key, resource, body, len(body), now, now))
+            self._total_bytes += len(body) - (old[0] if old else 0)
+            self._evict()
+
+    # Drop least recently used entries until the cache fits in max_bytes
+    def _evict(self):
+        while self._total_bytes > self.max_bytes:
+            rows = self._connection.execute(
+                "SELECT cache_key, size FROM responses ORDER BY last_access LIMIT 100").fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            for cache_key, size in rows:
+                self._connection.execute("DELETE FROM responses WHERE cache_key = ?", (cache_key,))
+                self._total_bytes -= size
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def stats(self):
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        hits, misses = sum(self.hits.values()), sum(self.misses.values())
+        return dict(
+            entries=entries,
+            bytes=self._total_bytes,
+            hits=hits,
+            misses=misses,
+            hit_rate=hits / (hits + misses) if hits + misses else 0.0,
+            by_resource={resource: dict(hits=self.hits[resource], misses=self.misses[resource])
+                         for resource in sorted(set(self.hits) | set(self.misses))},
+        )
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM responses")
+            self._total_bytes = 0
+
+
+# Wraps the discovery client so every `.list(...).execute()` goes through a
+# ResponseCache. Conditional requests (with an If-None-Match header) are sent
+# to the network unless the cache is offline, since their point is freshness.
+class CachedYouTube:
+    def __init__(self, client, cache):
+        self._client = client
+        self.cache = cache
+
+    def __getattr__(self, resource):
+        def resource_accessor():
+            return _CachedResource(self, resource)
+        return resource_accessor
+
+
+class _CachedResource:
+    def __init__(self, api, resource):
+        self._api = api
+        self._resource = resource
+
+    def list(self, **params):
+        request = None if self._api.cache.offline else getattr(self._api._client, self._resource)().list(**params)
+        return _CachedRequest(self._api.cache, self._resource, params, request)
+
+
+class _CachedRequest:
+    def __init__(self, cache, resource, params, request):
+        self._cache = cache
+        self._resource = resource
+        self._key = ResponseCache.make_key(resource, "list", params)
+        self._request = request
+        self.headers = request.headers if request is not None else {}
+        self.methodId = f"youtube.{resource}.list"
+        # Whether the last execute() was answered from the cache
+        self.served_from_cache = False
+
+    def execute(self, http=None, num_retries=0):
+        # Discovery requests always carry default headers (accept, user-agent, ...)
+        conditional = any(name.lower() == 'if-none-match' for name in self.headers)
+        self.served_from_cache = False
+        if not conditional or self._cache.offline:
+            response = self._cache.get(self._resource, self._key)
+            if response is not None:
+                self.served_from_cache = True
+                return response
+        if self._cache.offline:
+            raise CacheMiss(f"No cached response for {self._resource}.list in offline mode: {self._key}")
+
+        response = self._request.execute(http=http, num_retries=num_retries)
+        self._cache.put(self._resource, self._key, response)
+        return response
+
+
+# Function to wrap a client in the response cache when YOUTUBE_API_CACHE is set
+# to a cache file path. YOUTUBE_API_OFFLINE=1 replays the cache without network
+# access and YOUTUBE_API_CACHE_MAX_MB bounds its size.
+def cached_client_from_env(client):
+    path = os.environ.get("YOUTUBE_API_CACHE")
+    if not path:
+        return client
+    max_mb = float(os.environ.get("YOUTUBE_API_CACHE_MAX_MB", API_CACHE_MAX_BYTES / 2 ** 20))
+    offline = os.environ.get("YOUTUBE_API_OFFLINE", "").lower() in ("1", "true", "yes")
+    return CachedYouTube(client, ResponseCache(path, max_bytes=int(max_mb * 2 ** 20), offline=offline))
@@ -1,21 +1,25 @@
 import streamlit as st
-from PIL import Image
-import mysql.connector
-import pandas as pd
-import plotly.express as px
-
-from main import (
-    create_tables,
-    channel_information,
-    playlist_information,
-    get_video_ids,
-    video_information,
-    comments_information,
-    insert_channel_data,
-    insert_playlist_data,
-    insert_video_data,
-    insert_comments_data,
+
+import os
+from datetime import date, datetime, timedelta
+
+import rollups
+import search
+import snapshot
+import storage
+import charts
+import harvest_jobs
+import metrics
+from queries import (
+    CHANNEL_GROWTH, DAILY_GROWTH, DASHBOARD_QUERIES, ENGAGEMENT_DENSITY, ENGAGEMENT_OUTLIERS,
+    FASTEST_GROWING_VIDEOS, TOP_LIKED_VIDEOS, VIDEO_BROWSER_FIRST_PAGE, VIDEO_BROWSER_NEXT_PAGE,
+    VIDEO_COMMENT_LANGUAGES, VIDEO_HISTORY, VIDEO_SENTIMENT, VIDEOS_PER_DAY,
 )
+from query_cache import QueryCache
+
+# pandas, plotly and the harvester (main and pipeline, which load the YouTube
+# API client library) are imported by the pages that use them, so every other
+# page starts without paying for them
 
 # Set page configuration
 st.set_page_config(
@@ -35,24 +39,98 @@ and analyze it through a user-friendly interface.
 # Sidebar menu
 menu = st.sidebar.selectbox(
     "Navigation",
-    ["Home", "Collect and Store Data", "Database Management", "Query and Visualize Data", "Visualize the Data"]
+    ["Home", "Collect and Store Data", "Database Management", "Query and Visualize Data", "Visualize the Data",
+     "Search", "Growth", "Operations"]
 )
 
+# Engine behind the query and visualization pages: the live warehouse (MySQL
+# or SQLite, see storage.py) or DuckDB over the Parquet snapshot written by
+# `python snapshot.py export`
+ENGINES = ["Warehouse", "DuckDB snapshot"]
+DEFAULT_ENGINE = (
+    "DuckDB snapshot" if os.environ.get("YOUTUBE_ANALYTICS_ENGINE", "").lower() == "duckdb" else "Warehouse")
+engine = st.sidebar.radio("Analytics engine", ENGINES, index=ENGINES.index(DEFAULT_ENGINE))
+
 
-# Database connection function
+# Database connection function. Connections come from the configured storage
+# backend; MySQL connections come from the process-wide pool in database.py,
+# shared by every Streamlit session, and close() returns them.
 def connect_to_mysql():
     try:
-        connection = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="Vishnu1101",
-            database="youtube"
-        )
-        return connection
-    except mysql.connector.Error as err:
+        return storage.get_backend().connect()
+    except storage.Error as err:
         st.error(f"Error: {err}")
         return None
 
+
+# Prometheus endpoint of this server process, when YOUTUBE_METRICS_PORT is set
+@st.cache_resource
+def start_metrics_server():
+    return metrics.start_http_server_from_env()
+
+
+start_metrics_server()
+
+
+# Background harvest worker of this server process (harvest_jobs.py), so a
+# harvest keeps running when the browser tab that queued it is closed. None
+# when YOUTUBE_JOB_CONCURRENCY=0 leaves the jobs to `python harvest_jobs.py worker`.
+@st.cache_resource
+def start_job_worker():
+    return harvest_jobs.worker_from_env()
+
+
+@st.cache_resource
+def get_job_queue():
+    return harvest_jobs.JobQueue()
+
+
+start_job_worker()
+
+
+# DuckDB session over the current snapshot, shared by every session and
+# reopened when a new snapshot is exported
+@st.cache_resource
+def get_snapshot_engine(snapshot_id):
+    return snapshot.SnapshotEngine(snapshot.SNAPSHOT_DIR)
+
+
+def current_snapshot_engine():
+    return get_snapshot_engine(snapshot.read_manifest()["snapshot_id"])
+
+
+# Query result cache shared by every session of this Streamlit server, one per
+# engine. Results are reused until a harvest bumps the warehouse generation
+# (or, for the snapshot, until a new snapshot is exported).
+@st.cache_resource
+def get_query_cache(engine):
+    if engine == "DuckDB snapshot":
+        return QueryCache(read_generation=lambda: current_snapshot_engine().generation())
+    return QueryCache(read_generation=storage.get_generation)
+
+
+# Function to run a dashboard query through the result cache; the database is
+# only contacted on a cache miss
+def run_query(query, params=()):
+    def fetch(query, params):
+        if engine == "DuckDB snapshot":
+            return current_snapshot_engine().query(query, params)
+        return storage.get_backend().query(query, params)
+    return get_query_cache(engine).fetch(query, params, fetch)
+
+
+# Function to run a query against the warehouse whatever the engine; the
+# statistics history and the search indexes are not part of the snapshot
+def run_warehouse_query(query, params=()):
+    return get_query_cache("Warehouse").fetch(query, params, storage.get_backend().query)
+
+
+def show_cache_stats():
+    stats = get_query_cache(engine).stats()
+    st.caption(f"Query cache: {stats['hits']} hits, {stats['misses']} misses "
+               f"({stats['hit_rate']:.0%} hit rate), {stats['entries']} results, "
+               f"{stats['bytes'] / 2 ** 20:.1f} MiB, generation {stats['generation']}")
+
 if menu == "Home":
     st.header("Welcome to the YouTube Data Harvesting Tool")
     st.write("""
@@ -77,211 +155,432 @@ elif menu == "Collect and Store Data":
 
     # Input for channel ID
     channel_id = st.text_input("Enter YouTube Channel ID", "")
+    incremental = st.checkbox(
+        "Incremental (only new uploads, refresh statistics of recent videos)", value=False
+    )
 
+    job_queue = get_job_queue()
     if st.button("Collect and Store Data"):
-        if channel_id:
-            try:
-                # Insert channel data
-                channel_data = channel_information(channel_id)
-                insert_channel_data(channel_data)
-                st.success(f"Channel '{channel_data['channel_name']}' data inserted successfully.")
-
-                # Insert playlist data
-                playlist_data = playlist_information(channel_id)
-                insert_playlist_data(playlist_data)
-                st.success("Playlist data inserted successfully.")
-
-                # Insert video data
-                video_ids = get_video_ids(channel_id)
-                video_data = video_information(video_ids)
-                insert_video_data(video_data)
-                st.success("Video data inserted successfully.")
-
-                # Insert comments data
-                comments_data = comments_information(video_ids)
-                insert_comments_data(comments_data)
-                st.success("Comments data inserted successfully.")
-
-            except Exception as e:
-                st.error(f"Error: {e}")
+        if channel_id.strip():
+            # The harvest runs in the background and streams channel, playlist,
+            # video and comment data into MySQL. Every batch is committed as it
+            # arrives, so the channel can be queried while it is still running.
+            job, created = job_queue.enqueue(channel_id.strip(), incremental)
+            if created:
+                st.success(f"Harvest of {job['channel_id']} queued as job #{job['job_id']}.")
+            else:
+                st.info(f"{job['channel_id']} is already {job['status']} as job #{job['job_id']}.")
         else:
             st.error("Please enter a valid YouTube Channel ID.")
+    if start_job_worker() is None:
+        st.caption("Queued harvests are run by `python harvest_jobs.py worker`.")
+
+    # The recent jobs with the per-stage progress of the active ones,
+    # refreshed every 2 seconds
+    @st.fragment(run_every=2)
+    def show_harvest_jobs():
+        jobs = job_queue.list_jobs(limit=20)
+        if not jobs:
+            st.info("No harvests queued yet.")
+            return
+        st.subheader("Harvest Jobs")
+        st.dataframe([{column: job[column] for column in ("job_id", "channel_id", "status", "attempts",
+                                                          "created_at", "started_at", "finished_at", "error")}
+                      for job in jobs])
+        # Only the newest job of a channel can be retried
+        seen_channels = set()
+        for job in jobs:
+            newest = job['channel_id'] not in seen_channels
+            seen_channels.add(job['channel_id'])
+            if job['status'] in harvest_jobs.ACTIVE_STATUSES:
+                st.write(f"Job #{job['job_id']} {job['channel_id']}: {job['status']}"
+                         + (" (cancelling)" if job['cancel_requested'] else ""))
+                if job['progress']:
+                    st.dataframe(job['progress'])
+                if not job['cancel_requested'] and st.button("Cancel", key=f"cancel_job_{job['job_id']}"):
+                    job_queue.cancel(job['job_id'])
+                    st.rerun(scope="fragment")
+            elif newest and job['status'] in harvest_jobs.RETRYABLE_STATUSES:
+                if st.button(f"Retry job #{job['job_id']} ({job['channel_id']}, {job['status']})",
+                             key=f"retry_job_{job['job_id']}"):
+                    job_queue.retry(job['job_id'])
+                    st.rerun(scope="fragment")
+
+    show_harvest_jobs()
 
 elif menu == "Database Management":
     st.header("Database Management")
+    st.caption(f"Storage backend: {storage.get_backend().describe()}")
+    if st.button("Check Connection"):
+        if storage.get_backend().check_health():
+            st.success("Database connection is healthy.")
+        else:
+            st.error("Failed to connect to the database.")
+
     if st.button("Create Tables"):
         try:
+            from main import create_tables
             create_tables()
             st.success("Database initialized and tables created successfully!")
         except Exception as e:
             st.error(f"Error: {e}")
 
-elif menu == "Query and Visualize Data":
-    st.header("Query and Visualize Data")
-    connection = connect_to_mysql()
-    if connection:
-        cursor = connection.cursor(dictionary=True)
-
-        # Query options
-        query_options = [
-            "Top 10 Most Viewed Videos",
-            "Channel with Most Subscribers",
-            "Top 10 Videos by Likes",
-            "Average Views per Video",
-            "Videos Count per Channel",
-            "Top 5 Most Commented Videos",
-            "Total Number of Comments",
-            "Playlists with Most Videos",
-            "Total Videos Across All Channels",
-            "Newest Videos by Publish Date"
-        ]
-        selected_query = st.selectbox("Select a Query", query_options)
-
-        # Query mapping
-        query_mapping = {
-            "Top 10 Most Viewed Videos": "SELECT video_name, view_count FROM videos ORDER BY view_count DESC LIMIT 10;",
-            "Channel with Most Subscribers": "SELECT channel_name, channel_subscribers FROM channels ORDER BY channel_subscribers DESC LIMIT 1;",
-            "Top 10 Videos by Likes": "SELECT video_name, like_count FROM videos ORDER BY like_count DESC LIMIT 10;",
-            "Average Views per Video": "SELECT AVG(view_count) AS average_views FROM videos;",
-            "Videos Count per Channel": "SELECT channel_name, COUNT(video_id) AS video_count FROM videos GROUP BY channel_name;",
-            "Top 5 Most Commented Videos": "SELECT video_name, comment_count FROM videos ORDER BY comment_count DESC LIMIT 5;",
-            "Total Number of Comments": "SELECT SUM(comment_count) AS total_comments FROM videos;",
-            "Playlists with Most Videos": "SELECT playlist_name, videoscount FROM playlist ORDER BY videoscount DESC LIMIT 5;",
-            "Total Videos Across All Channels": "SELECT SUM(channel_video_count) AS total_videos FROM channels;",
-            "Newest Videos by Publish Date": "SELECT video_name, publishedat FROM videos ORDER BY publishedat DESC LIMIT 10;"
-        }
-
-        if st.button("Run Query"):
-            query = query_mapping[selected_query]
+    if st.button("Check Rollups"):
+        connection = connect_to_mysql()
+        if connection:
             try:
-                cursor.execute(query)
-                results = cursor.fetchall()
-                st.write(f"Results for: {selected_query}")
-                st.dataframe(results)
+                cursor = connection.cursor()
+                problems = rollups.check_rollups(cursor)
+                if problems:
+                    st.warning(f"{len(problems)} rollup mismatch(es); rebuilding from the raw tables.")
+                    st.write(problems)
+                    rollups.rebuild_rollups(cursor)
+                    connection.commit()
+                    get_query_cache("Warehouse").clear()
+                st.success("Rollups match the raw tables.")
+                cursor.close()
             except Exception as e:
-                st.error(f"Error executing query: {e}")
-    else:
-        st.error("Failed to connect to the database.")
+                st.error(f"Error: {e}")
+            finally:
+                connection.close()
 
-if menu == "Visualize the Data":
-    st.header("🎥 Visualize YouTube Data 📊")
-    connection = connect_to_mysql()
+    if st.button("Export Snapshot"):
+        try:
+            with st.spinner("Exporting tables to Parquet..."):
+                manifest = snapshot.export_snapshot()
+            st.success(f"Snapshot {manifest['snapshot_id']} written to '{snapshot.SNAPSHOT_DIR}' "
+                       f"in {manifest['seconds']}s.")
+            st.write(manifest["rows"])
+        except Exception as e:
+            st.error(f"Error: {e}")
 
-    if connection:
+    if st.button("Clear Query Cache"):
+        get_query_cache(engine).clear()
+        st.success("Query result cache cleared.")
+    show_cache_stats()
+
+elif menu == "Query and Visualize Data":
+    st.header("Query and Visualize Data")
+
+    # Query options (SQL in queries.py)
+    query_mapping = DASHBOARD_QUERIES
+    selected_query = st.selectbox("Select a Query", list(query_mapping))
+
+    # Results are shown one page at a time; the page survives reruns
+    if st.button("Run Query"):
+        st.session_state["query_page"] = (selected_query, 0)
+    active_query, page = st.session_state.get("query_page", (None, 0))
+
+    if active_query == selected_query:
+        query, params = charts.page_query(query_mapping[selected_query], page)
         try:
-            cursor = connection.cursor(dictionary=True)
-
-            # Dropdown for Graph Selection
-            graph_options = [
-                "Top 10 Liked Videos",
-                "Subscriber Distribution by Channel",
-                "Videos Published Over Time",
-                "Engagement Analysis (Likes vs. Comments)",
-            ]
-            selected_graph = st.selectbox("Choose a visualization:", graph_options)
-
-            # Graphs Implementation
-            if selected_graph == "Top 10 Liked Videos":
-                st.subheader("👍 Top 10 Liked Videos")
-                cursor.execute("""
-                    SELECT video_name, like_count, comment_count, view_count 
-                    FROM videos 
-                    ORDER BY like_count DESC 
-                    LIMIT 10;
-                """)
-                results = cursor.fetchall()
-                df_liked_videos = pd.DataFrame(results)
-
-                if not df_liked_videos.empty:
-                    fig_liked_videos = px.bar(
-                        df_liked_videos,
-                        x="video_name",
-                        y="like_count",
-                        text="like_count",
-                        title="Top 10 Liked Videos",
-                        labels={"video_name": "Video Name", "like_count": "Like Count"},
-                        hover_data=["comment_count", "view_count"],
-                    )
-                    fig_liked_videos.update_layout(xaxis_tickangle=-45)
-                    st.plotly_chart(fig_liked_videos)
-                else:
-                    st.warning("No data available for liked videos.")
-
-            elif selected_graph == "Subscriber Distribution by Channel":
-                st.subheader("📊 Subscriber Distribution by Channel")
-                cursor.execute("""
-                    SELECT channel_name, channel_subscribers 
-                    FROM channels 
-                    ORDER BY channel_subscribers DESC;
-                """)
-                results = cursor.fetchall()
-                df_subscribers = pd.DataFrame(results)
-
-                if not df_subscribers.empty:
-                    fig_subscribers = px.bar(
-                        df_subscribers,
-                        x="channel_name",
-                        y="channel_subscribers",
-                        text="channel_subscribers",
-                        title="Subscriber Distribution by Channel",
-                        labels={"channel_name": "Channel Name", "channel_subscribers": "Subscriber Count"},
-                        color="channel_subscribers",
-                    )
-                    fig_subscribers.update_layout(xaxis_tickangle=-45)
-                    st.plotly_chart(fig_subscribers)
-                else:
-                    st.warning("No data available for subscriber distribution.")
-
-            elif selected_graph == "Videos Published Over Time":
-                st.subheader("📅 Videos Published Over Time")
-                cursor.execute("""
-                    SELECT DATE(publishedat) AS publish_date, COUNT(video_id) AS video_count 
-                    FROM videos 
-                    GROUP BY publish_date
-                    ORDER BY publish_date;
-                """)
-                results = cursor.fetchall()
-                df_videos_time = pd.DataFrame(results)
-
-                if not df_videos_time.empty:
-                    fig_videos_time = px.line(
-                        df_videos_time,
-                        x="publish_date",
-                        y="video_count",
-                        title="Videos Published Over Time",
-                        labels={"publish_date": "Date", "video_count": "Number of Videos"},
-                    )
-                    st.plotly_chart(fig_videos_time)
-                else:
-                    st.warning("No data available for videos published over time.")
-
-            elif selected_graph == "Engagement Analysis (Likes vs. Comments)":
-                st.subheader("💬 Engagement Analysis: Likes vs. Comments")
-                cursor.execute("""
-                    SELECT video_name, like_count, comment_count 
-                    FROM videos 
-                    WHERE like_count > 0 AND comment_count > 0;
-                """)
-                results = cursor.fetchall()
-                df_engagement = pd.DataFrame(results)
-
-                if not df_engagement.empty:
-                    fig_engagement = px.scatter(
-                        df_engagement,
-                        x="like_count",
-                        y="comment_count",
-                        hover_name="video_name",
-                        title="Engagement Analysis: Likes vs. Comments",
-                        labels={"like_count": "Likes", "comment_count": "Comments"},
-                        size="like_count",
-                        color="comment_count",
+            results, has_next = charts.split_page(run_query(query, params))
+            st.write(f"Results for: {selected_query} (page {page + 1})")
+            st.dataframe(results)
+            previous_column, next_column = st.columns(2)
+            if page > 0 and previous_column.button("Previous page"):
+                st.session_state["query_page"] = (selected_query, page - 1)
+                st.rerun()
+            if has_next and next_column.button("Next page"):
+                st.session_state["query_page"] = (selected_query, page + 1)
+                st.rerun()
+        except Exception as e:
+            st.error(f"Error executing query: {e}")
+
+    # Every video, most viewed first, paged with a keyset cursor: the stack
+    # holds the last row of each page shown so far
+    st.subheader("Browse Videos")
+    cursors = st.session_state.setdefault("video_browser_cursors", [])
+    try:
+        if cursors:
+            last = cursors[-1]
+            rows = run_query(VIDEO_BROWSER_NEXT_PAGE, (last['view_count'], last['video_id'], charts.PAGE_SIZE + 1))
+        else:
+            rows = run_query(VIDEO_BROWSER_FIRST_PAGE, (charts.PAGE_SIZE + 1,))
+        rows, has_next = charts.split_page(rows)
+        st.dataframe(rows)
+        previous_column, next_column = st.columns(2)
+        if cursors and previous_column.button("Previous videos"):
+            cursors.pop()
+            st.rerun()
+        if has_next and next_column.button("Next videos"):
+            cursors.append(rows[-1])
+            st.rerun()
+    except Exception as e:
+        st.error(f"Error executing query: {e}")
+    show_cache_stats()
+
+if menu == "Visualize the Data":
+    st.header("🎥 Visualize YouTube Data 📊")
+    import pandas as pd
+    import plotly.express as px
+    try:
+        # Dropdown for Graph Selection
+        graph_options = [
+            "Top 10 Liked Videos",
+            "Subscriber Distribution by Channel",
+            "Videos Published Over Time",
+            "Engagement Analysis (Likes vs. Comments)",
+            "Comment Sentiment by Video",
+        ]
+        selected_graph = st.selectbox("Choose a visualization:", graph_options)
+
+        # Graphs Implementation
+        if selected_graph == "Top 10 Liked Videos":
+            st.subheader("👍 Top 10 Liked Videos")
+            results = run_query(TOP_LIKED_VIDEOS)
+            df_liked_videos = pd.DataFrame(results)
+
+            if not df_liked_videos.empty:
+                fig_liked_videos = px.bar(
+                    df_liked_videos,
+                    x="video_name",
+                    y="like_count",
+                    text="like_count",
+                    title="Top 10 Liked Videos",
+                    labels={"video_name": "Video Name", "like_count": "Like Count"},
+                    hover_data=["comment_count", "view_count"],
+                )
+                fig_liked_videos.update_layout(xaxis_tickangle=-45)
+                st.plotly_chart(fig_liked_videos)
+            else:
+                st.warning("No data available for liked videos.")
+
+        elif selected_graph == "Subscriber Distribution by Channel":
+            st.subheader("📊 Subscriber Distribution by Channel")
+            results = run_query("""
+                SELECT channel_name, channel_subscribers 
+                FROM channels 
+                ORDER BY channel_subscribers DESC;
+            """)
+            df_subscribers = pd.DataFrame(results)
+
+            if not df_subscribers.empty:
+                fig_subscribers = px.bar(
+                    df_subscribers,
+                    x="channel_name",
+                    y="channel_subscribers",
+                    text="channel_subscribers",
+                    title="Subscriber Distribution by Channel",
+                    labels={"channel_name": "Channel Name", "channel_subscribers": "Subscriber Count"},
+                    color="channel_subscribers",
+                )
+                fig_subscribers.update_layout(xaxis_tickangle=-45)
+                st.plotly_chart(fig_subscribers)
+            else:
+                st.warning("No data available for subscriber distribution.")
+
+        elif selected_graph == "Videos Published Over Time":
+            st.subheader("📅 Videos Published Over Time")
+            results = run_query(VIDEOS_PER_DAY)
+            # Downsample long histories to a bounded number of points. SQLite
+            # returns publish_date as a 'YYYY-MM-DD' string, MySQL as a date.
+            points = charts.lttb([(date.fromisoformat(str(row['publish_date'])[:10]).toordinal(), row['video_count'], row)
+                                  for row in results])
+            df_videos_time = pd.DataFrame([point[2] for point in points])
+            if len(points) < len(results):
+                st.caption(f"Showing {len(points)} of {len(results)} days (LTTB downsampled).")
+
+            if not df_videos_time.empty:
+                fig_videos_time = px.line(
+                    df_videos_time,
+                    x="publish_date",
+                    y="video_count",
+                    title="Videos Published Over Time",
+                    labels={"publish_date": "Date", "video_count": "Number of Videos"},
+                )
+                st.plotly_chart(fig_videos_time)
+            else:
+                st.warning("No data available for videos published over time.")
+
+        elif selected_graph == "Engagement Analysis (Likes vs. Comments)":
+            st.subheader("💬 Engagement Analysis: Likes vs. Comments")
+            # Video counts per log-scale grid cell are computed by the database;
+            # only the leaderboard videos are drawn as individual points
+            bins = charts.DENSITY_BINS_PER_DECADE
+            density = pd.DataFrame(run_query(ENGAGEMENT_DENSITY, (bins, bins)))
+            outliers = pd.DataFrame(run_query(ENGAGEMENT_OUTLIERS))
+
+            if not density.empty:
+                density["like_count"] = density["like_bin"].map(charts.bin_center)
+                density["comment_count"] = density["comment_bin"].map(charts.bin_center)
+                fig_engagement = px.scatter(
+                    density,
+                    x="like_count",
+                    y="comment_count",
+                    title="Engagement Analysis: Likes vs. Comments",
+                    labels={"like_count": "Likes", "comment_count": "Comments", "video_count": "Videos"},
+                    size="video_count",
+                    color="video_count",
+                    log_x=True,
+                    log_y=True,
+                )
+                if not outliers.empty:
+                    fig_engagement.add_scatter(
+                        x=outliers["like_count"],
+                        y=outliers["comment_count"],
+                        mode="markers",
+                        marker=dict(symbol="x", color="red"),
+                        hovertext=outliers["video_name"],
+                        name="Top videos",
                     )
-                    st.plotly_chart(fig_engagement)
-                else:
-                  st.warning("No data available for engagement analysis.")
-                    
+                st.plotly_chart(fig_engagement)
+                st.caption(f"{int(density['video_count'].sum())} videos in {len(density)} grid cells; "
+                           f"{len(outliers)} top videos drawn individually.")
+            else:
+              st.warning("No data available for engagement analysis.")
+
+        elif selected_graph == "Comment Sentiment by Video":
+            st.subheader("🙂 Comment Sentiment by Video")
+            # Filled by the offline analytics stage (comment_analytics.py), which
+            # is not part of the snapshot
+            df_sentiment = pd.DataFrame(run_warehouse_query(VIDEO_SENTIMENT, (20,)))
+
+            if not df_sentiment.empty:
+                df_sentiment["video_name"] = df_sentiment["video_name"].fillna(df_sentiment["video_id"])
+                fig_sentiment = px.bar(
+                    df_sentiment,
+                    x="video_name",
+                    y=["positive", "neutral", "negative"],
+                    title="Sentiment of Analyzed Comments (Top 20 Videos by Comments)",
+                    labels={"video_name": "Video Name", "value": "Comments", "variable": "Sentiment"},
+                    hover_data=["average_sentiment"],
+                    color_discrete_map={"positive": "seagreen", "neutral": "lightgray", "negative": "indianred"},
+                )
+                fig_sentiment.update_layout(xaxis_tickangle=-45)
+                st.plotly_chart(fig_sentiment)
+
+                names = dict(zip(df_sentiment["video_id"], df_sentiment["video_name"]))
+                selected_video = st.selectbox("Comment languages of:", list(names), format_func=names.get)
+                df_languages = pd.DataFrame(run_warehouse_query(VIDEO_COMMENT_LANGUAGES, (selected_video,)))
+                if not df_languages.empty:
+                    st.plotly_chart(px.pie(df_languages, names="language", values="comments",
+                                           title=f"Comment Languages: {names[selected_video]}"))
+            else:
+                st.warning("No analyzed comments yet; run python comment_analytics.py after a harvest.")
+                
+    except Exception as e:
+        st.error(f"Error: {e}")
+    show_cache_stats()
+
+# Full-text search over comments and videos (search.py), best match first, one
+# page at a time. The page survives reruns until the search changes.
+if menu == "Search":
+    st.header("🔎 Search")
+    kind = st.radio("Search in", ["Comments", "Videos"], horizontal=True)
+    text = st.text_input("Search for", help="Every word must appear; results are ranked by relevance.")
+    if st.session_state.get("search_key") != (kind, text):
+        st.session_state["search_key"] = (kind, text)
+        st.session_state["search_page"] = 0
+    page = st.session_state["search_page"]
+
+    query = search.search_query(storage.get_backend().name, kind.lower(), text, charts.PAGE_SIZE + 1,
+                                page * charts.PAGE_SIZE)
+    if query is not None:
+        try:
+            rows, has_next = charts.split_page(run_warehouse_query(*query))
+            if rows:
+                st.write(f"{kind} matching '{text}' (page {page + 1})")
+                st.dataframe(rows)
+            else:
+                st.info("No matches.")
+            previous_column, next_column = st.columns(2)
+            if page > 0 and previous_column.button("Previous results"):
+                st.session_state["search_page"] = page - 1
+                st.rerun()
+            if has_next and next_column.button("Next results"):
+                st.session_state["search_page"] = page + 1
+                st.rerun()
         except Exception as e:
-            st.error(f"Error: {e}")
+            st.error(f"Error searching: {e}")
+    elif text:
+        st.warning("Enter at least one word to search for.")
+
+# Growth and velocity from the statistics history (stats_history.py): every
+# harvest that sees a changed view, like, comment or subscriber count records it
+if menu == "Growth":
+    st.header("📈 Growth")
+    import pandas as pd
+    import plotly.express as px
+    days = st.select_slider("Window (days)", options=[1, 7, 30, 90, 365], value=7)
+    since = (datetime.utcnow().date() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    st.caption(f"Changes recorded since {since}. Growth is counted from the first harvest that saw a video "
+               f"or channel.")
+    try:
+        daily = pd.DataFrame(run_warehouse_query(DAILY_GROWTH, (since,)))
+        if not daily.empty:
+            st.metric(f"Views gained in the last {days} day(s)", f"{int(daily['views_gained'].sum()):,}")
+            st.plotly_chart(px.bar(daily, x="captured_on", y="views_gained",
+                                   title="Views gained per day",
+                                   labels={"captured_on": "Date", "views_gained": "Views gained"}))
+        else:
+            st.info("No statistics changes recorded in this window yet; harvest again later.")
+
+        st.subheader("Fastest Growing Videos")
+        growing = pd.DataFrame(run_warehouse_query(FASTEST_GROWING_VIDEOS, (days, since, 20)))
+        if not growing.empty:
+            st.dataframe(growing)
+            st.plotly_chart(px.bar(growing, x="video_name", y="views_gained", hover_data=["views_per_day"],
+                                   title=f"Views gained in the last {days} day(s)",
+                                   labels={"video_name": "Video Name", "views_gained": "Views gained"}))
+
+        st.subheader("Channel Growth")
+        channels = pd.DataFrame(run_warehouse_query(CHANNEL_GROWTH, (since,)))
+        if not channels.empty:
+            st.dataframe(channels)
+
+        st.subheader("Video History")
+        video_id = st.text_input("Video ID")
+        if video_id:
+            history = pd.DataFrame(run_warehouse_query(VIDEO_HISTORY, (video_id,)))
+            if not history.empty:
+                st.plotly_chart(px.line(history, x="captured_on", y=["view_count", "like_count", "comment_count"],
+                                        markers=True, title=f"Statistics of {video_id}",
+                                        labels={"captured_on": "Date", "value": "Count", "variable": "Metric"}))
+            else:
+                st.warning("No history recorded for this video.")
+    except Exception as e:
+        st.error(f"Error: {e}")
+
+# Counters and latencies recorded by metrics.py for the harvests run by this
+# server process
+if menu == "Operations":
+    st.header("Operations")
+    import pandas as pd
+    import plotly.express as px
+    st.write("API calls and warehouse writes made by this server since it started. "
+             "Harvests run with harvest_cli.py report through YOUTUBE_METRICS_FILE or YOUTUBE_METRICS_PORT.")
+
+    st.subheader("YouTube API")
+    api = pd.DataFrame(metrics.api_summary())
+    if not api.empty:
+        st.dataframe(api)
+        st.plotly_chart(px.bar(api, x="endpoint", y=["p50_ms", "p95_ms"], barmode="group",
+                               title="Request latency by endpoint",
+                               labels={"value": "Milliseconds", "variable": "Quantile"}))
+        st.caption(f"{int(api['quota_units'].sum())} quota units, {int(api['retries'].sum())} retries.")
     else:
-        st.error("Failed to connect to the database.")
-
+        st.info("No API requests recorded yet.")
+
+    st.subheader("Warehouse writes")
+    writes = pd.DataFrame(metrics.write_summary())
+    if not writes.empty:
+        st.dataframe(writes)
+        st.plotly_chart(px.bar(writes, x="table", y=["batch_seconds", "commit_seconds"],
+                               title="Time spent writing by table",
+                               labels={"value": "Seconds", "variable": "Phase"}))
+    else:
+        st.info("No warehouse writes recorded yet.")
+
+    st.subheader("Pipeline stages")
+    stages = pd.DataFrame(metrics.stage_summary())
+    if not stages.empty:
+        st.dataframe(stages)
+
+    text = metrics.render()
+    st.download_button("Download metrics", text, file_name="youtube_metrics.prom", mime="text/plain")
+    with st.expander("Prometheus text"):
+        st.code(text)
+    if st.button("Reset Metrics"):
+        metrics.reset()
+        st.rerun()
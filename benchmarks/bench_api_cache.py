@@ -0,0 +1,48 @@
+import argparse
+import os
+import tempfile
+import time
+
+import main
+from api_cache import CachedYouTube, ResponseCache
+from fake_youtube import FakeYouTube
+
+
+# Cold, warm and offline runs of the harvest read path through the on-disk
+# response cache.
+# Run from the repository root:  python -m benchmarks.bench_api_cache --videos 500
+
+
+def harvest(channel_id):
+    channel_data = main.channel_information(channel_id)
+    main.playlist_information(channel_id)
+    video_ids = main.get_video_ids(channel_id)
+    main.video_information(video_ids)
+    main.comments_information(video_ids, requests_per_second=None)
+    return channel_data
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Benchmark the API response cache")
+    parser.add_argument("--videos", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.01, help="simulated seconds per request")
+    args = parser.parse_args()
+
+    fake = FakeYouTube(num_videos=args.videos, comments_per_video=30, latency=args.latency)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "api_cache.db")
+        for label, offline in [("cold", False), ("warm", False), ("offline", True)]:
+            cache = ResponseCache(path, offline=offline)
+            main.youtube = CachedYouTube(fake, cache)
+            fake.reset_counters()
+            start = time.perf_counter()
+            harvest(fake.channel_id)
+            elapsed = time.perf_counter() - start
+            stats = cache.stats()
+            print(f"{label:<8} network_requests={fake.total_requests():>6}  hits={stats['hits']:>6}  "
+                  f"misses={stats['misses']:>6}  hit_rate={stats['hit_rate']:6.1%}  "
+                  f"cache={stats['bytes'] / 2 ** 20:6.2f} MiB  wall={elapsed:7.3f}s")
+
+
+if __name__ == "__main__":
+    main_benchmark()
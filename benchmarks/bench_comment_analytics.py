@@ -0,0 +1,104 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import comment_analytics
+import migrations
+import storage
+import text_analytics
+from benchmarks.bench_inserts import StandInBackend, fresh_database
+
+
+# Throughput of the offline comment analytics stage (comment_analytics.py) on
+# the SQLite backend: reading, analyzing and writing every stored comment with
+# the analysis in this process and on process pools of increasing size, then
+# incremental runs that only read the comments added since (the high-water
+# mark) and a run with the backfill over every stored comment, which the stage
+# makes once a day. The analysis
+# alone (no database) is timed first for reference. Process pools only help
+# with more than one CPU core.
+# Run from the repository root:  python -m benchmarks.bench_comment_analytics --comments 200000
+
+FILLER = ("video part channel watch time first people song day year music game content "
+          "minute bro guys everyone here again").split()
+LEXICON = sorted(text_analytics.VALENCES) + sorted(text_analytics.EMOJI_VALENCES)
+FUNCTION_WORDS = sorted(text_analytics.FUNCTION_WORDS["en"]) * 4 + sorted(text_analytics.FUNCTION_WORDS["es"])
+
+
+def make_comment_rows(start, count, seed=5):
+    rng = random.Random(seed + start)
+    rows = []
+    for n in range(start, start + count):
+        words = rng.choices(FUNCTION_WORDS, k=rng.randint(3, 14)) + rng.choices(FILLER, k=rng.randint(1, 6))
+        words += rng.choices(LEXICON, k=rng.randint(0, 2))
+        if rng.random() < 0.2:
+            words.insert(rng.randrange(len(words)), "not")
+        rng.shuffle(words)
+        rows.append(("c%09d" % rng.randrange(10 ** 9) + "%07d" % n, "vid%08d" % (n % 5000),
+                     "<b>" + " ".join(words) + "</b>", "user%d" % (n % 997), "2024-01-01 08:30:00"))
+    return rows
+
+
+def insert_comments(connection, rows):
+    connection.connection.executemany("INSERT INTO comments VALUES (?, ?, ?, ?, ?)", rows)
+    connection.connection.commit()
+
+
+def analytics_database(directory, comments):
+    connection = fresh_database(directory, 0, 0.0)
+    cursor = connection.cursor()
+    for version, _, steps in migrations.MIGRATIONS:
+        if version in (10, 11, 13):
+            for step in steps:
+                if callable(step):
+                    step(cursor)
+                elif isinstance(step, dict):
+                    cursor.execute(step["sqlite"])
+                else:
+                    cursor.execute(step)
+    connection.commit()
+    insert_comments(connection, make_comment_rows(0, comments))
+    return connection
+
+
+def run(label, workers, chunk_size, backfill=False):
+    result = comment_analytics.analyze_new_comments(workers=workers, chunk_size=chunk_size, backfill=backfill)
+    print(f"{label:<26} rows={result['rows']:>8}  wall={result['seconds']:7.2f}s  "
+          f"rows/s={result['rows_per_second']:10.0f}")
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Benchmark the comment analytics stage")
+    parser.add_argument("--comments", type=int, default=200000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--chunk-size", type=int, default=comment_analytics.ANALYTICS_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPU core(s)")
+    rows = [(comment_id, video_id, text) for comment_id, video_id, text, _, _ in make_comment_rows(0, 20000)]
+    start = time.perf_counter()
+    text_analytics.analyze_chunk(rows)
+    elapsed = time.perf_counter() - start
+    print(f"{'analysis only':<26} rows={len(rows):>8}  wall={elapsed:7.2f}s  rows/s={len(rows) / elapsed:10.0f}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        connection = analytics_database(directory, args.comments)
+        storage.set_backend(StandInBackend(connection))
+        for workers in [1] + args.workers:
+            connection.connection.execute("DELETE FROM comment_analytics")
+            connection.connection.execute("DELETE FROM video_sentiment")
+            connection.connection.execute("UPDATE comment_analytics_progress SET last_comment_seq = 0")
+            connection.connection.commit()
+            run("in process" if workers == 1 else f"{workers} worker processes", workers, args.chunk_size)
+
+        run("nothing new", args.workers[-1], args.chunk_size)
+        insert_comments(connection, make_comment_rows(args.comments, args.comments // 100))
+        run("1% new comments", args.workers[-1], args.chunk_size)
+        run("with backfill", args.workers[-1], args.chunk_size, backfill=True)
+        connection.connection.close()
+
+
+if __name__ == "__main__":
+    main_benchmark()
@@ -0,0 +1,51 @@
+import argparse
+import time
+import tracemalloc
+
+import main
+from fake_youtube import FakeYouTube
+
+
+# Peak memory of the streaming comment source against collecting every record
+# in one list, for a channel with a single viral video.
+# Run from the repository root:  python -m benchmarks.bench_comment_stream --viral 50000
+
+
+def measure(label, fake, fn):
+    fake.reset_counters()
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<10} rows={rows:>8}  requests={fake.total_requests():>6}  "
+          f"wall={elapsed:7.3f}s  rows/s={rows / elapsed:10.0f}  peak_mem={peak / 2 ** 20:8.1f} MiB")
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Benchmark streaming comment harvesting memory")
+    parser.add_argument("--videos", type=int, default=20, help="number of videos in the fake channel")
+    parser.add_argument("--viral", type=int, default=50000, help="top level comments on the viral video")
+    parser.add_argument("--chunk-size", type=int, default=main.COMMENT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    fake = FakeYouTube(num_videos=args.videos, comments_per_video=150,
+                       comment_counts={"vid00000000": args.viral},
+                       replies_every=10, replies_per_thread=12)
+    main.youtube = fake
+    video_ids = fake.video_ids
+
+    measure("list", fake, lambda: len(main.comments_information(video_ids, requests_per_second=None)))
+
+    def stream():
+        rows = 0
+        for chunk in main.iter_comment_chunks(video_ids, chunk_size=args.chunk_size, requests_per_second=None):
+            rows += len(chunk)
+        return rows
+
+    measure("streaming", fake, stream)
+
+
+if __name__ == "__main__":
+    main_benchmark()
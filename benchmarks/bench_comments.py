@@ -0,0 +1,45 @@
+import argparse
+import time
+
+import main
+from fake_youtube import FakeYouTube
+
+
+# Benchmark of the concurrent comment harvester at increasing worker counts.
+# Run from the repository root:  python -m benchmarks.bench_comments --videos 400
+
+
+def run(fake, video_ids, workers, requests_per_second):
+    fake.reset_counters()
+    start = time.perf_counter()
+    rows = main.comments_information(video_ids, workers=workers, requests_per_second=requests_per_second)
+    elapsed = time.perf_counter() - start
+    return rows, elapsed
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent commentThreads().list harvesting")
+    parser.add_argument("--videos", type=int, default=400, help="number of videos in the fake channel")
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated seconds per request")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="worker counts to test")
+    parser.add_argument("--rps", type=float, default=0, help="global requests per second limit (0 = unlimited)")
+    args = parser.parse_args()
+
+    disabled = ["vid%08d" % n for n in range(0, args.videos, 50)]
+    fake = FakeYouTube(num_videos=args.videos, latency=args.latency, comments_disabled_ids=disabled)
+    main.youtube = fake
+    video_ids = fake.video_ids
+
+    baseline_rows, baseline_time = None, None
+    for workers in args.workers:
+        rows, elapsed = run(fake, video_ids, workers, args.rps or None)
+        # RecordBatches compare by identity, so compare their rows
+        if baseline_rows is None:
+            baseline_rows, baseline_time = rows.records(), elapsed
+        same = "yes" if rows.records() == baseline_rows else "NO"
+        print(f"workers={workers:>3}  rows={len(rows):>7}  requests={fake.total_requests():>6}  "
+              f"wall={elapsed:7.3f}s  speedup={baseline_time / elapsed:5.2f}x  same_records={same}")
+
+
+if __name__ == "__main__":
+    main_benchmark()
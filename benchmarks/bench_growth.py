@@ -0,0 +1,160 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+import stats_history
+from benchmarks.bench_inserts import SQLiteStandIn
+from queries import CHANNEL_GROWTH, DAILY_GROWTH, FASTEST_GROWING_VIDEOS, VIDEO_HISTORY
+
+
+# Latency of the growth queries over a large statistics history (stats_history.py)
+# on a SQLite copy of the schema, and the cost of recording a chunk of video
+# upserts. Each day a random share of the videos changes, so the history holds
+# --rows rows instead of videos x days daily snapshots.
+# Run from the repository root:  python -m benchmarks.bench_growth --rows 20000000
+
+SCHEMA = [
+    """CREATE TABLE videos (
+        video_id VARCHAR(50) PRIMARY KEY, channel_id VARCHAR(50), video_name VARCHAR(200),
+        view_count BIGINT, like_count INT, comment_count INT)""",
+    """CREATE TABLE channels (
+        channel_id VARCHAR(50) PRIMARY KEY, channel_name VARCHAR(100), channel_subscribers BIGINT,
+        channel_views BIGINT, channel_video_count INT)""",
+]
+
+# Views gained computed from the recorded values alone: the latest value in the
+# window minus the last value before it, looked up per video. This is what the
+# *_gained columns save.
+VALUE_LOOKUP_GROWTH = """
+    SELECT h.video_id, MAX(h.view_count) - COALESCE(
+        (SELECT p.view_count FROM video_stats_history p
+         WHERE p.video_id = h.video_id AND p.captured_on < %s
+         ORDER BY p.captured_on DESC LIMIT 1), MIN(h.view_count)) AS views_gained
+    FROM video_stats_history h
+    WHERE h.captured_on >= %s
+    GROUP BY +h.video_id
+    ORDER BY views_gained DESC
+    LIMIT 20
+"""
+
+
+def video_id(n):
+    return "v%010d" % n
+
+
+def load(connection, num_videos, num_channels, num_days, num_rows, today, seed=7):
+    rng = random.Random(seed)
+    views = [rng.randrange(10 ** 6) for _ in range(num_videos)]
+    per_day = max(1, min(num_videos, num_rows // num_days))
+
+    def history():
+        for day in range(num_days, 0, -1):
+            captured_on = (today - timedelta(days=day - 1)).isoformat()
+            for n in sorted(rng.sample(range(num_videos), per_day)):
+                gained = rng.randrange(1, 5000)
+                views[n] += gained
+                yield captured_on, video_id(n), views[n], views[n] // 50, views[n] // 500, gained, gained // 50, 0
+    connection.executemany("INSERT INTO video_stats_history VALUES (?, ?, ?, ?, ?, ?, ?, ?)", history())
+    connection.executemany(
+        "INSERT INTO videos VALUES (?, ?, ?, ?, ?, ?)",
+        ((video_id(n), "UC%08d" % (n % num_channels), "Video number %d" % n, views[n], views[n] // 50,
+          views[n] // 500) for n in range(num_videos)))
+    connection.executemany(
+        "INSERT INTO channels VALUES (?, ?, ?, ?, ?)",
+        (("UC%08d" % n, "Channel %d" % n, rng.randrange(10 ** 7), 0, 0) for n in range(num_channels)))
+    connection.executemany(
+        "INSERT INTO channel_stats_history VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (((today - timedelta(days=day)).isoformat(), "UC%08d" % n, 0, 0, 0, rng.randrange(100), 0, 0)
+         for day in range(num_days) for n in range(num_channels)))
+    connection.execute("""
+        INSERT INTO daily_growth
+        SELECT captured_on, SUM(views_gained), SUM(likes_gained), SUM(comments_gained)
+        FROM video_stats_history GROUP BY captured_on""")
+    connection.commit()
+    return per_day
+
+
+def time_query(stand_in, query, params, repeat):
+    best = None
+    for _ in range(repeat):
+        cursor = stand_in.cursor()
+        start = time.perf_counter()
+        cursor.execute(query, params)
+        cursor.fetchall()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+# Function to time recording `chunks` chunks of video upserts, a tenth of
+# whose rows changed, the way insert_video_data() does before each chunk
+def time_recording(stand_in, num_videos, chunks, chunk_size, today, seed=11):
+    rng = random.Random(seed)
+    columns = ('video_id', 'view_count', 'like_count', 'comment_count')
+    cursor = stand_in.cursor()
+    elapsed = 0.0
+    for _ in range(chunks):
+        start_id = rng.randrange(max(1, num_videos - chunk_size))
+        cursor.execute("SELECT video_id, view_count, like_count, comment_count FROM videos "
+                       "WHERE video_id >= %s ORDER BY video_id LIMIT %s", (video_id(start_id), chunk_size))
+        chunk = [(row[0], row[1] + (rng.randrange(1, 100) if rng.random() < 0.1 else 0), row[2], row[3])
+                 for row in cursor.fetchall()]
+        start = time.perf_counter()
+        stats_history.record_video_chunk(cursor, columns, chunk, captured_on=today.isoformat())
+        elapsed += time.perf_counter() - start
+    stand_in.rollback()
+    return elapsed / chunks
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Benchmark growth queries over the statistics history")
+    parser.add_argument("--videos", type=int, default=200000)
+    parser.add_argument("--channels", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=365, help="days of history")
+    parser.add_argument("--rows", type=int, default=5000000, help="video history rows in total")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per query; the best one is reported")
+    args = parser.parse_args()
+
+    today = date.today()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "growth.db")
+        stand_in = SQLiteStandIn(path)
+        connection = stand_in.connection
+        for statement in SCHEMA:
+            connection.execute(statement)
+        for step in stats_history.HISTORY_SCHEMA:
+            connection.execute((step["sqlite"] if isinstance(step, dict) else step).strip().rstrip(";"))
+        start = time.perf_counter()
+        per_day = load(connection, args.videos, args.channels, args.days, args.rows, today)
+        connection.execute("ANALYZE")
+        rows = connection.execute("SELECT COUNT(*) FROM video_stats_history").fetchone()[0]
+        print(f"Loaded {rows} history rows ({per_day} changed videos a day over {args.days} days) in "
+              f"{time.perf_counter() - start:.1f}s, {os.path.getsize(path) / 2 ** 20:.0f} MiB; daily "
+              f"snapshots of every video would be {args.videos * args.days} rows")
+
+        print(f"{'query':<40} {'7 days':>10} {'30 days':>10} {'90 days':>10}")
+        queries = [
+            ("Views gained per day", DAILY_GROWTH, lambda days, since: (since,)),
+            ("Fastest growing videos", FASTEST_GROWING_VIDEOS, lambda days, since: (days, since, 20)),
+            ("Fastest growing (value lookup)", VALUE_LOOKUP_GROWTH, lambda days, since: (since, since)),
+            ("Channel growth", CHANNEL_GROWTH, lambda days, since: (since,)),
+        ]
+        for name, query, params in queries:
+            timings = []
+            for days in (7, 30, 90):
+                since = (today - timedelta(days=days - 1)).isoformat()
+                timings.append(time_query(stand_in, query, params(days, since), args.repeat))
+            print(f"{name:<40} " + " ".join(f"{seconds * 1000:8.1f}ms" for seconds in timings))
+        seconds = time_query(stand_in, VIDEO_HISTORY, (video_id(args.videos // 2),), args.repeat)
+        print(f"{'History of one video':<40} {seconds * 1000:8.1f}ms")
+
+        seconds = time_recording(stand_in, args.videos, chunks=50, chunk_size=1000, today=today)
+        print(f"Recording a chunk of 1000 video upserts: {seconds * 1000:.1f}ms")
+        connection.close()
+
+
+if __name__ == "__main__":
+    main_benchmark()
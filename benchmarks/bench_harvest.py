@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import main
+import storage
+from fake_youtube import FakeYouTube
+
+
+# Per-stage benchmark of a full channel harvest against the fake API: requests
+# issued, quota units, injected errors, wall time and rows/sec for every stage,
+# then the whole pipeline into a temporary SQLite warehouse.
+# Run from the repository root:  python -m benchmarks.bench_harvest --videos 500
+# Use --json to keep the results for comparison between runs.
+
+
+def run_stage(fake, label, fn):
+    fake.reset_counters()
+    start = time.perf_counter()
+    rows = fn()
+    elapsed = time.perf_counter() - start
+    return dict(
+        stage=label,
+        rows=rows,
+        requests=fake.total_requests(),
+        quota=fake.quota_used(),
+        errors=fake.total_errors(),
+        seconds=round(elapsed, 4),
+        rows_per_second=round(rows / elapsed, 1) if elapsed else 0.0,
+    )
+
+
+# Function to run every harvest stage once; later stages reuse the output of
+# earlier ones, like pipeline.py does
+def harvest_stages(fake, workers, requests_per_second):
+    results = []
+    found = {}
+
+    def channel():
+        found["channel"] = main.channel_information(fake.channel_id)
+        return 1
+
+    def playlists():
+        return len(main.playlist_information(fake.channel_id))
+
+    def video_ids():
+        found["video_ids"] = main.get_video_ids(fake.channel_id)
+        return len(found["video_ids"])
+
+    def videos():
+        return len(main.video_information(found["video_ids"]))
+
+    def comments():
+        return len(main.comments_information(found["video_ids"], workers=workers,
+                                             requests_per_second=requests_per_second))
+
+    for label, fn in [("channel", channel), ("playlists", playlists), ("video ids", video_ids),
+                      ("videos", videos), ("comments", comments)]:
+        results.append(run_stage(fake, label, fn))
+    return results
+
+
+# Function to run the streaming pipeline end to end into a fresh SQLite warehouse
+def pipeline_stage(fake, directory, workers, requests_per_second):
+    from pipeline import harvest_channel
+    from state_store import StateStore
+
+    backend = storage.SQLiteBackend(os.path.join(directory, "warehouse.db"))
+    storage.set_backend(backend)
+    backend.create_schema()
+    state = StateStore(os.path.join(directory, "state.db"))
+
+    def harvest():
+        harvest_channel(fake.channel_id, comment_workers=workers, requests_per_second=requests_per_second,
+                        state=state)
+        counts = backend.query("SELECT (SELECT COUNT(*) FROM videos) AS videos, "
+                               "(SELECT COUNT(*) FROM comments) AS comments")[0]
+        return counts["videos"] + counts["comments"]
+
+    return run_stage(fake, "pipeline", harvest)
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Benchmark every harvest stage against the fake YouTube API")
+    parser.add_argument("--videos", type=int, default=500, help="videos in the fake channel")
+    parser.add_argument("--comments", type=int, default=20, help="comment threads per video")
+    parser.add_argument("--playlists", type=int, default=20)
+    parser.add_argument("--disabled-every", type=int, default=50,
+                        help="every n-th video has comments disabled (0 = none)")
+    parser.add_argument("--description-size", type=int, default=500, help="characters per video description")
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.5, help="latency jitter as a fraction of --latency")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="probability of a transient 5xx/429 per request; retries back off for ~1s")
+    parser.add_argument("--workers", type=int, default=8, help="comment worker threads")
+    parser.add_argument("--rps", type=float, default=0, help="comment requests per second limit (0 = unlimited)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-pipeline", action="store_true", help="only time the API stages")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    disabled = (["vid%08d" % n for n in range(0, args.videos, args.disabled_every)]
+                if args.disabled_every else [])
+    fake = FakeYouTube(num_videos=args.videos, comments_per_video=args.comments, num_playlists=args.playlists,
+                       comments_disabled_ids=disabled, latency=args.latency, latency_jitter=args.jitter,
+                       error_rate=args.error_rate, description_size=args.description_size, seed=args.seed)
+    main.youtube = fake
+    requests_per_second = args.rps or None
+
+    results = harvest_stages(fake, args.workers, requests_per_second)
+    if not args.skip_pipeline:
+        with tempfile.TemporaryDirectory() as directory:
+            results.append(pipeline_stage(fake, directory, args.workers, requests_per_second))
+
+    print(f"{'stage':<10} {'rows':>8} {'requests':>9} {'quota':>7} {'errors':>7} {'wall':>9} {'rows/s':>11}")
+    for result in results:
+        print(f"{result['stage']:<10} {result['rows']:>8} {result['requests']:>9} {result['quota']:>7} "
+              f"{result['errors']:>7} {result['seconds']:>8.3f}s {result['rows_per_second']:>11.0f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as out:
+            json.dump(dict(parameters=vars(args), stages=results), out, indent=2)
+
+
+if __name__ == "__main__":
+    main_benchmark()
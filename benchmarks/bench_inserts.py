@@ -0,0 +1,132 @@
+import argparse
+import os
+import tempfile
+import time
+
+import main
+import storage
+from records import RecordBatch
+
+
+# Rows/sec of the comment write path on the SQLite storage backend:
+# the old one-execute-per-row loop against the multi-row bulk upsert.
+# Run from the repository root:  python -m benchmarks.bench_inserts --rows 100000
+
+
+# SQLite backend connection (storage.py) that stays open between the write
+# calls of a run. `round_trip` adds a simulated client/server round trip to
+# every statement, as a MySQL server would.
+class SQLiteStandIn(storage.SQLiteConnection):
+    def __init__(self, path, round_trip=0.0):
+        super().__init__(path)
+        self.connection = self._connection
+        self.round_trip = round_trip
+
+    def cursor(self, dictionary=False):
+        return _StandInCursor(super().cursor(dictionary), self.round_trip)
+
+    def close(self):
+        pass
+
+
+class _StandInCursor:
+    def __init__(self, cursor, round_trip):
+        self._cursor = cursor
+        self._round_trip = round_trip
+
+    def execute(self, query, params=()):
+        if self._round_trip:
+            time.sleep(self._round_trip)
+        self._cursor.execute(query, params)
+
+    # mysql-connector sends an INSERT executemany as one multi-row statement
+    def executemany(self, query, rows):
+        if self._round_trip:
+            time.sleep(self._round_trip)
+        self._cursor.executemany(query, rows)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+# Backend handing every caller the run's SQLiteStandIn
+class StandInBackend(storage.SQLiteBackend):
+    def __init__(self, connection):
+        super().__init__(":memory:")
+        self.stand_in = connection
+
+    def connect(self, local_infile=False):
+        return self.stand_in
+
+
+def make_comments(count):
+    return RecordBatch.from_columns(dict(
+        comment_id=["c%09d" % n for n in range(count)],
+        video_id=["vid%08d" % (n % 5000) for n in range(count)],
+        comment_text=["Comment number %d with some text to store" % n for n in range(count)],
+        comment_author=["user%d" % (n % 997) for n in range(count)],
+        comment_publishedat=["2024-01-%02d 08:30:00" % (n % 28 + 1) for n in range(count)],
+    ))
+
+
+# The previous implementation: one execute per row, one commit at the end
+def per_row_insert(connection, comments_data):
+    cursor = connection.cursor()
+    query = storage.upsert_sql(storage.dialect_of(connection), "comments", main.COMMENT_COLUMNS, 1,
+                               main.COMMENT_UPDATE_COLUMNS)
+    for row in comments_data.rows(main.COMMENT_COLUMNS):
+        cursor.execute(query, row)
+    connection.commit()
+
+
+def executemany_insert(connection, comments_data):
+    cursor = connection.cursor()
+    query = storage.upsert_sql(storage.dialect_of(connection), "comments", main.COMMENT_COLUMNS, 1,
+                               main.COMMENT_UPDATE_COLUMNS)
+    cursor.executemany(query, list(comments_data.rows(main.COMMENT_COLUMNS)))
+    connection.commit()
+
+
+def fresh_database(directory, n, round_trip):
+    connection = SQLiteStandIn(os.path.join(directory, "bench%d.db" % n), round_trip)
+    connection.connection.execute("""
+        CREATE TABLE comments (
+            comment_id VARCHAR(50) PRIMARY KEY,
+            video_id VARCHAR(50),
+            comment_text TEXT,
+            comment_author VARCHAR(100),
+            comment_publishedat DATETIME
+        )""")
+    connection.connection.execute("CREATE TABLE warehouse_generation (id INTEGER PRIMARY KEY, generation BIGINT)")
+    connection.connection.execute("INSERT INTO warehouse_generation VALUES (1, 0)")
+    return connection
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Benchmark bulk comment upserts")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[100, 1000, 2500])
+    parser.add_argument("--round-trip", type=float, default=0.0001,
+                        help="simulated seconds per statement round trip to the server")
+    args = parser.parse_args()
+
+    comments_data = make_comments(args.rows)
+    with tempfile.TemporaryDirectory() as directory:
+        runs = [("per-row", lambda c: per_row_insert(c, comments_data)),
+                ("executemany", lambda c: executemany_insert(c, comments_data))]
+        for chunk_size in args.chunk_sizes:
+            runs.append((f"bulk x{chunk_size}",
+                         lambda c, size=chunk_size: main.insert_comments_data(comments_data, chunk_size=size)))
+
+        for n, (label, fn) in enumerate(runs):
+            connection = fresh_database(directory, n, args.round_trip)
+            storage.set_backend(StandInBackend(connection))
+            start = time.perf_counter()
+            fn(connection)
+            elapsed = time.perf_counter() - start
+            stored = connection.connection.execute("SELECT COUNT(*) FROM comments").fetchone()[0]
+            print(f"{label:<12} rows={stored:>8}  wall={elapsed:7.3f}s  rows/s={args.rows / elapsed:10.0f}")
+
+
+if __name__ == "__main__":
+    main_benchmark()
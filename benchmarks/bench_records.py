@@ -0,0 +1,188 @@
+import argparse
+import gc
+import re
+import time
+import tracemalloc
+from datetime import datetime
+
+import main
+import records
+from fake_youtube import FakeYouTube
+
+
+# Memory and throughput of the columnar record batches (records.py) against the
+# previous one-dict-per-row path, for video and comment pages as the API
+# returns them. API pages are fetched from the fake first; only the conversion
+# to records and to insert rows is timed.
+# Run from the repository root:  python -m benchmarks.bench_records --comments 200000
+
+
+# The previous implementation: one dict per row, timestamps parsed and counts
+# converted row by row
+DURATION_REGEX = re.compile(r'PT(\d+H)?(\d+M)?(\d+S)?')
+
+
+def convert_iso_to_mysql_datetime(iso_date):
+    try:
+        return datetime.strptime(iso_date, "%Y-%m-%dT%H:%M:%S.%fZ").strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return datetime.strptime(iso_date, "%Y-%m-%dT%H:%M:%SZ").strftime("%Y-%m-%d %H:%M:%S")
+
+
+def convert_duration(duration):
+    match = DURATION_REGEX.match(duration)
+    if not match:
+        return '00:00:00'
+    hours, minutes, seconds = (int(part[:-1]) if part else 0 for part in match.groups())
+    return '{:02d}:{:02d}:{:02d}'.format(hours, minutes, seconds)
+
+
+def parse_video_item(i):
+    return dict(
+        channel_id=i['snippet']['channelId'],
+        video_id=i['id'],
+        video_name=i['snippet']['title'],
+        video_Description=i['snippet']['description'],
+        Thumbnail=i['snippet']['thumbnails']['default']['url'],
+        Tags=i['snippet'].get('tags'),
+        publishedAt=convert_iso_to_mysql_datetime(i['snippet']['publishedAt']),
+        Duration=convert_duration(i['contentDetails']['duration']),
+        View_Count=i['statistics'].get('viewCount', 0),
+        Like_Count=i['statistics'].get('likeCount', 0),
+        Favorite_Count=i['statistics'].get('favoriteCount', 0),
+        Comment_Count=i['statistics'].get('commentCount', 0),
+        Caption_Status=i['contentDetails'].get('caption')
+    )
+
+
+def video_row(video):
+    hours, minutes, seconds = (int(part) for part in video['Duration'].split(':'))
+    return (
+        video['video_id'], video['channel_id'], video['video_name'], video['video_Description'],
+        video['Thumbnail'], ','.join(video['Tags']) if video['Tags'] else None, video['publishedAt'],
+        video['Duration'], int(video['View_Count']),
+        int(video['Like_Count']) if video['Like_Count'] else None,
+        int(video['Favorite_Count']) if video['Favorite_Count'] else None,
+        int(video['Comment_Count']), video['Caption_Status'], hours * 3600 + minutes * 60 + seconds
+    )
+
+
+def parse_comment_item(i):
+    comment = i['snippet']['topLevelComment']
+    return dict(
+        video_id=i['snippet']['videoId'],
+        comment_id=comment['id'],
+        comment_text=comment['snippet']['textDisplay'],
+        comment_author=comment['snippet']['authorDisplayName'],
+        comment_publishedat=convert_iso_to_mysql_datetime(comment['snippet']['publishedAt'])
+    )
+
+
+def comment_row(comment):
+    return (comment['comment_id'], comment['video_id'], comment['comment_text'], comment['comment_author'],
+            comment['comment_publishedat'])
+
+
+def dict_videos(pages):
+    return [parse_video_item(i) for page in pages for i in page]
+
+
+def batch_videos(pages):
+    return records.RecordBatch.concat([records.video_batch(page) for page in pages], records.VIDEO_FIELDS)
+
+
+def dict_comments(pages):
+    return [parse_comment_item(i) for page in pages for i in page]
+
+
+def batch_comments(pages):
+    return records.RecordBatch.concat(
+        [records.comment_batch([(i['snippet']['videoId'], i['snippet']['topLevelComment']) for i in page])
+         for page in pages], records.COMMENT_FIELDS)
+
+
+# Function to return the bytes held by Arrow (pandas' string columns live
+# there with pyarrow installed, where tracemalloc cannot see them)
+def arrow_bytes():
+    try:
+        import pyarrow
+    except ImportError:
+        return 0
+    return pyarrow.total_allocated_bytes()
+
+
+# Function to time `build` on pages fetched beforehand, then measure the
+# memory its result keeps once the API pages it came from are released, as
+# they are in a harvest
+def measure(label, fetch, build, to_rows):
+    pages = fetch()
+    start = time.perf_counter()
+    result = build(pages)
+    build_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    rows = sum(1 for _ in to_rows(result))
+    rows_seconds = time.perf_counter() - start
+    del pages, result
+
+    gc.collect()
+    arrow_before = arrow_bytes()
+    tracemalloc.start()
+    pages = fetch()
+    result = build(pages)
+    del pages
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    retained += arrow_bytes() - arrow_before
+    print(f"{label:<16} rows={rows:>8}  build={build_seconds:7.3f}s ({rows / build_seconds:>9.0f} rows/s)  "
+          f"to rows={rows_seconds:6.3f}s  retained={retained / 2 ** 20:7.1f} MiB  peak={peak / 2 ** 20:7.1f} MiB")
+
+
+# Functions to fetch the raw API pages of every video and comment thread
+def fetch_video_pages(fake):
+    pages = []
+    for batch in main.chunk_list(fake.video_ids, main.VIDEO_BATCH_SIZE):
+        response = fake.videos().list(part="snippet,contentDetails,statistics", id=",".join(batch)).execute()
+        pages.append(response['items'])
+    return pages
+
+
+def fetch_comment_pages(fake):
+    pages = []
+    for video_id in fake.video_ids:
+        page_token = None
+        while True:
+            response = fake.commentThreads().list(part="snippet", videoId=video_id, maxResults=100,
+                                                  pageToken=page_token).execute()
+            pages.append(response['items'])
+            page_token = response.get('nextPageToken')
+            if page_token is None:
+                break
+    return pages
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Benchmark record batches against per-row dicts")
+    parser.add_argument("--videos", type=int, default=5000, help="videos in the fake channel")
+    parser.add_argument("--comments", type=int, default=200000, help="top level comments in total")
+    parser.add_argument("--description-size", type=int, default=500, help="characters per video description")
+    args = parser.parse_args()
+
+    fake = FakeYouTube(num_videos=args.videos, comments_per_video=max(1, args.comments // args.videos),
+                       description_size=args.description_size)
+
+    def videos():
+        return fetch_video_pages(fake)
+
+    def comments():
+        return fetch_comment_pages(fake)
+
+    measure("videos dicts", videos, dict_videos, lambda result: (video_row(video) for video in result))
+    measure("videos batch", videos, batch_videos, lambda batch: batch.rows(main.VIDEO_COLUMNS))
+    measure("comments dicts", comments, dict_comments,
+            lambda result: (comment_row(comment) for comment in result))
+    measure("comments batch", comments, batch_comments, lambda batch: batch.rows(main.COMMENT_COLUMNS))
+
+
+if __name__ == "__main__":
+    main_benchmark()
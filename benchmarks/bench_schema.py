@@ -0,0 +1,125 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import rollups
+from benchmarks.bench_inserts import SQLiteStandIn
+from migrations import DASHBOARD_INDEXES
+from queries import DASHBOARD_QUERIES, RAW_DASHBOARD_QUERIES
+
+
+# Latency of every dashboard query at 1M videos on a SQLite copy of the schema:
+# computed from the raw tables before and after the indexes of schema
+# migration 3, and read from the rollup tables.
+# Run from the repository root:  python -m benchmarks.bench_schema --videos 1000000
+
+SCHEMA = [
+    """CREATE TABLE channels (
+        channel_id VARCHAR(50) PRIMARY KEY, channel_name VARCHAR(100), channel_subscribers BIGINT,
+        channel_video_count INT)""",
+    """CREATE TABLE playlist (
+        playlist_id VARCHAR(50) PRIMARY KEY, playlist_name VARCHAR(100), channel_id VARCHAR(50),
+        videoscount BIGINT)""",
+    """CREATE TABLE videos (
+        video_id VARCHAR(50) PRIMARY KEY, channel_id VARCHAR(50), video_name VARCHAR(200),
+        video_description TEXT, tags TEXT, publishedat DATETIME, duration VARCHAR(20),
+        view_count BIGINT, like_count INT, comment_count INT, duration_seconds INT)""",
+    """CREATE TABLE comments (
+        comment_id VARCHAR(50) PRIMARY KEY, video_id VARCHAR(50), comment_text TEXT,
+        comment_publishedat DATETIME)""",
+    """CREATE TABLE video_tags (
+        video_id VARCHAR(50), tag VARCHAR(255), PRIMARY KEY (video_id, tag))""",
+    "CREATE INDEX idx_video_tags_tag ON video_tags (tag)",
+]
+
+
+def load(connection, num_videos, num_channels, tags_per_video, seed=7):
+    rng = random.Random(seed)
+    connection.executemany(
+        "INSERT INTO channels VALUES (?, ?, ?, ?)",
+        [("UC%08d" % n, "Channel %d" % n, rng.randrange(10 ** 7), num_videos // num_channels)
+         for n in range(num_channels)])
+    connection.executemany(
+        "INSERT INTO playlist VALUES (?, ?, ?, ?)",
+        [("PL%08d" % n, "Playlist %d" % n, "UC%08d" % (n % num_channels), rng.randrange(500))
+         for n in range(num_channels * 5)])
+
+    def videos():
+        for n in range(num_videos):
+            seconds = rng.randrange(30, 4 * 3600)
+            tags = ["tag%d" % rng.randrange(2000) for _ in range(tags_per_video)]
+            yield ("v%010d" % n, "UC%08d" % rng.randrange(num_channels), "Video number %d" % n,
+                   "Description of video %d" % n, ",".join(tags),
+                   "20%02d-%02d-%02d 12:00:00" % (rng.randrange(10, 25), rng.randrange(1, 13), rng.randrange(1, 29)),
+                   "%02d:%02d:%02d" % (seconds // 3600, seconds // 60 % 60, seconds % 60),
+                   rng.randrange(10 ** 8), rng.randrange(10 ** 6), rng.randrange(10 ** 5), seconds)
+    connection.executemany("INSERT INTO videos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", videos())
+    connection.execute("""
+        INSERT OR IGNORE INTO video_tags
+        WITH RECURSIVE split(video_id, tag, rest) AS (
+            SELECT video_id, '', tags || ',' FROM videos
+            UNION ALL
+            SELECT video_id, substr(rest, 1, instr(rest, ',') - 1), substr(rest, instr(rest, ',') + 1)
+            FROM split WHERE rest <> ''
+        )
+        SELECT video_id, tag FROM split WHERE tag <> ''""")
+    connection.commit()
+
+
+def time_queries(connection, queries, repeat):
+    timings = {}
+    for name, query in queries.items():
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            connection.execute(query.rstrip(";")).fetchall()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+    return timings
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Benchmark dashboard query latency with and without indexes")
+    parser.add_argument("--videos", type=int, default=1000000)
+    parser.add_argument("--channels", type=int, default=1000)
+    parser.add_argument("--tags-per-video", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per query; the best one is reported")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        stand_in = SQLiteStandIn(os.path.join(directory, "schema.db"))
+        connection = stand_in.connection
+        for statement in SCHEMA + rollups.ROLLUP_TABLES:
+            connection.execute(statement.strip().rstrip(";"))
+        start = time.perf_counter()
+        load(connection, args.videos, args.channels, args.tags_per_video)
+        print(f"Loaded {args.videos} videos in {time.perf_counter() - start:.1f}s")
+
+        before = time_queries(connection, RAW_DASHBOARD_QUERIES, args.repeat)
+        start = time.perf_counter()
+        for statement in DASHBOARD_INDEXES:
+            connection.execute(statement)
+        connection.execute("ANALYZE")
+        print(f"Built {len(DASHBOARD_INDEXES)} indexes in {time.perf_counter() - start:.1f}s")
+        after = time_queries(connection, RAW_DASHBOARD_QUERIES, args.repeat)
+
+        start = time.perf_counter()
+        cursor = stand_in.cursor()
+        rollups.rebuild_rollups(cursor)
+        stand_in.commit()
+        print(f"Built the rollups in {time.perf_counter() - start:.1f}s")
+        rollup = time_queries(connection, DASHBOARD_QUERIES, args.repeat)
+        connection.close()
+
+    print(f"{'query':<36} {'no index':>10} {'indexed':>10} {'rollup':>10} {'speedup':>9}")
+    for name in RAW_DASHBOARD_QUERIES:
+        best = min(after[name], rollup[name])
+        print(f"{name:<36} {before[name] * 1000:8.2f}ms {after[name] * 1000:8.2f}ms {rollup[name] * 1000:8.2f}ms "
+              f"{before[name] / max(best, 1e-9):8.1f}x")
+
+
+if __name__ == "__main__":
+    main_benchmark()
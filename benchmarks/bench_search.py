@@ -0,0 +1,109 @@
+import argparse
+import itertools
+import os
+import random
+import tempfile
+import time
+
+import main
+import search
+import storage
+from benchmarks.bench_inserts import StandInBackend, fresh_database
+from records import RecordBatch
+
+
+# Full-text search over comments on the SQLite backend (FTS5, search.py) against
+# LIKE '%word%' scans, for a rare, a medium and a common word, and the cost
+# of keeping the index up to date on the bulk insert path. Comment texts draw
+# their words from a Zipf-distributed vocabulary. LIKE results are unranked,
+# so LIKE stops at the first page of matches and is only fast for common words.
+# Run from the repository root:  python -m benchmarks.bench_search --comments 1000000
+
+VOCABULARY_SIZE = 50000
+WORDS_PER_COMMENT = 12
+
+LIKE_SEARCH = """
+    SELECT comment_id, video_id, comment_author, comment_text, comment_publishedat
+    FROM comments
+    WHERE comment_text LIKE %s
+    LIMIT %s
+"""
+
+
+def vocabulary():
+    return ["w%05d" % n for n in range(VOCABULARY_SIZE)]
+
+
+def make_comments(count, seed=3):
+    rng = random.Random(seed)
+    words = vocabulary()
+    cumulative = list(itertools.accumulate(1 / rank for rank in range(1, VOCABULARY_SIZE + 1)))
+    return RecordBatch.from_columns(dict(
+        comment_id=["c%09d" % n for n in range(count)],
+        video_id=["vid%08d" % (n % 5000) for n in range(count)],
+        comment_text=[" ".join(rng.choices(words, cum_weights=cumulative, k=WORDS_PER_COMMENT))
+                      for _ in range(count)],
+        comment_author=["user%d" % (n % 997) for n in range(count)],
+        comment_publishedat=["2024-01-%02d 08:30:00" % (n % 28 + 1) for n in range(count)],
+    ))
+
+
+def search_database(directory, name, indexed):
+    connection = fresh_database(directory, name, 0.0)
+    connection.connection.execute(
+        "CREATE TABLE videos (video_id VARCHAR(50) PRIMARY KEY, video_name VARCHAR(200), video_description TEXT)")
+    if indexed:
+        cursor = connection.cursor()
+        search.create_search_indexes(cursor)
+        connection.commit()
+    return connection
+
+
+def time_query(connection, query, params, repeat):
+    best = None
+    for _ in range(repeat):
+        cursor = connection.cursor()
+        start = time.perf_counter()
+        cursor.execute(query, params)
+        cursor.fetchall()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Benchmark full-text comment search")
+    parser.add_argument("--comments", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per query; the best one is reported")
+    args = parser.parse_args()
+
+    comments_data = make_comments(args.comments)
+    words = vocabulary()
+    with tempfile.TemporaryDirectory() as directory:
+        for indexed in (False, True):
+            connection = search_database(directory, int(indexed), indexed)
+            storage.set_backend(StandInBackend(connection))
+            start = time.perf_counter()
+            main.insert_comments_data(comments_data)
+            elapsed = time.perf_counter() - start
+            print(f"insert {'with FTS5' if indexed else 'no index':<10} rows={args.comments:>8}  "
+                  f"wall={elapsed:7.2f}s  rows/s={args.comments / elapsed:10.0f}")
+
+        page_size = 50
+        print(f"{'search':<26} {'matches':>9} {'FTS5 p1':>10} {'FTS5 p10':>10} {'LIKE p1':>10}")
+        for label, text in [("rare word", words[20000]), ("medium word", words[200]), ("common word", words[0]),
+                            ("two words", f"{words[0]} {words[50]}")]:
+            match = search.match_expression("sqlite", text)
+            matches = connection.connection.execute(
+                "SELECT COUNT(*) FROM comments_fts WHERE comments_fts MATCH ?", (match,)).fetchone()[0]
+            query, params = search.search_query("sqlite", "comments", text, page_size + 1)
+            first = time_query(connection, query, params, args.repeat)
+            query, params = search.search_query("sqlite", "comments", text, page_size + 1, 9 * page_size)
+            tenth = time_query(connection, query, params, args.repeat)
+            like = time_query(connection, LIKE_SEARCH, (f"%{text.split()[-1]}%", page_size + 1), args.repeat)
+            print(f"{label:<26} {matches:>9} {first * 1000:8.1f}ms {tenth * 1000:8.1f}ms {like * 1000:8.1f}ms")
+        connection.connection.close()
+
+
+if __name__ == "__main__":
+    main_benchmark()
@@ -0,0 +1,104 @@
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Cold start of the dashboard: for every page of app.py, the time a fresh
+# Python process takes to import what the app imports at startup plus what the
+# page imports itself. The imports are read from app.py, so the numbers follow
+# the app as it changes. The harvester is timed the same way: importing main,
+# and building the YouTube client on first use from the bundled discovery
+# document (no network access is needed). Modules that are not installed are
+# reported and skipped. Every number is the median of --repeat processes.
+# Run from the repository root:  python -m benchmarks.bench_startup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+missing = []
+for name in sys.argv[2:]:
+    try:
+        __import__(name)
+    except ImportError:
+        missing.append(name)
+imported = time.perf_counter()
+if sys.argv[1] == "client":
+    import main
+    main.youtube.channels
+print(json.dumps(dict(imports=imported - start, client=time.perf_counter() - imported, missing=missing,
+                      modules=len(sys.modules))))
+"""
+
+
+def _module(node):
+    if isinstance(node, ast.Import):
+        return [alias.name for alias in node.names]
+    if isinstance(node, ast.ImportFrom) and not node.level:
+        return [node.module]
+    return []
+
+
+def _page(test):
+    if (isinstance(test, ast.Compare) and isinstance(test.left, ast.Name) and test.left.id == "menu"
+            and isinstance(test.ops[0], ast.Eq) and isinstance(test.comparators[0], ast.Constant)):
+        return test.comparators[0].value
+    return None
+
+
+# Function to read the modules app.py imports at startup and per page
+def app_imports(path=os.path.join(ROOT, "app.py")):
+    with open(path, encoding="utf-8") as app_file:
+        tree = ast.parse(app_file.read())
+    startup = []
+    pages = {}
+    for node in tree.body:
+        startup.extend(_module(node))
+        while isinstance(node, ast.If) and _page(node.test) is not None:
+            pages[_page(node.test)] = [name for statement in node.body for child in ast.walk(statement)
+                                       for name in _module(child)]
+            node = node.orelse[0] if len(node.orelse) == 1 else None
+    return startup, pages
+
+
+def probe(modules, repeat, mode="imports"):
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", PROBE, mode] + modules, cwd=ROOT, env=dict(os.environ),
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return dict(imports=statistics.median(run["imports"] for run in runs),
+                client=statistics.median(run["client"] for run in runs),
+                missing=runs[0]["missing"], modules=runs[0]["modules"])
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Benchmark cold start of the dashboard pages and the harvester")
+    parser.add_argument("--repeat", type=int, default=5, help="processes per measurement; the median is reported")
+    args = parser.parse_args()
+
+    startup, pages = app_imports()
+    missing = set()
+    print(f"{'cold start':<44} {'imports':>10} {'modules':>8}")
+    result = probe(startup, args.repeat)
+    missing.update(result["missing"])
+    print(f"{'app.py startup':<44} {result['imports'] * 1000:8.0f}ms {result['modules']:>8}")
+    for page, modules in pages.items():
+        result = probe(startup + modules, args.repeat)
+        missing.update(result["missing"])
+        extra = ", ".join(modules) if modules else "-"
+        print(f"{'page ' + page:<44} {result['imports'] * 1000:8.0f}ms {result['modules']:>8}  ({extra})")
+
+    result = probe(["main"], args.repeat, mode="client")
+    print(f"{'import main':<44} {result['imports'] * 1000:8.0f}ms {result['modules']:>8}")
+    print(f"{'first use of main.youtube (client build)':<44} {result['client'] * 1000:8.0f}ms")
+    if missing:
+        print(f"Not installed, skipped: {', '.join(sorted(missing))}")
+
+
+if __name__ == "__main__":
+    main_benchmark()
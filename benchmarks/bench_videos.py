@@ -0,0 +1,56 @@
+import argparse
+import time
+
+import main
+import records
+from fake_youtube import FakeYouTube
+
+
+# Benchmark of the batched video fetcher against the old one-request-per-ID path.
+# Run from the repository root:  python -m benchmarks.bench_videos --videos 5000
+
+# The previous implementation: one videos().list call for every video ID
+def per_id_video_information(video_IDS):
+    pages = []
+    for video_id in video_IDS:
+        response = main.youtube.videos().list(
+            part="snippet,contentDetails,statistics",
+            id=video_id
+        ).execute()
+        pages.append(records.video_batch(response['items']))
+    return records.RecordBatch.concat(pages, records.VIDEO_FIELDS)
+
+
+def run(label, fake, fn, video_ids):
+    fake.reset_counters()
+    start = time.perf_counter()
+    rows = fn(video_ids)
+    elapsed = time.perf_counter() - start
+    requests = fake.total_requests()
+    print(f"{label:<10} rows={len(rows):>6}  requests={requests:>6}  quota_units={requests:>6}  wall={elapsed:8.3f}s")
+    return requests, elapsed
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Benchmark batched videos().list calls")
+    parser.add_argument("--videos", type=int, default=5000, help="number of videos in the fake channel")
+    parser.add_argument("--deleted", type=int, default=25, help="number of deleted videos in the uploads list")
+    parser.add_argument("--latency", type=float, default=0.002, help="simulated seconds per request")
+    args = parser.parse_args()
+
+    # Spread the deleted videos evenly over the uploads list
+    step = max(1, args.videos // max(1, args.deleted))
+    deleted_ids = ["vid%08d" % n for n in range(0, args.videos, step)][:args.deleted]
+    fake = FakeYouTube(num_videos=args.videos, latency=args.latency, deleted_ids=deleted_ids)
+    main.youtube = fake
+    video_ids = fake.video_ids
+
+    old_requests, old_time = run("per-id", fake, per_id_video_information, video_ids)
+    new_requests, new_time = run("batched", fake, main.video_information, video_ids)
+
+    print(f"request reduction: {old_requests / max(1, new_requests):.1f}x  "
+          f"wall time speedup: {old_time / max(new_time, 1e-9):.1f}x")
+
+
+if __name__ == "__main__":
+    main_benchmark()
@@ -0,0 +1,61 @@
+import math
+
+# Helpers that keep the data sent to the browser bounded: paging for tables,
+# binning for scatter plots and LTTB downsampling for time series.
+
+PAGE_SIZE = 50
+MAX_CHART_POINTS = 1000
+DENSITY_BINS_PER_DECADE = 8
+
+
+# Function to wrap a query so it returns one page of rows. One extra row is
+# requested to tell whether there is a next page. Returns (query, params).
+def page_query(query, page, page_size=PAGE_SIZE):
+    return (f"SELECT * FROM ({query.strip().rstrip(';')}) AS page_source LIMIT %s OFFSET %s",
+            (page_size + 1, page * page_size))
+
+
+# Function to split a page fetched with page_query into (rows, has_next)
+def split_page(rows, page_size=PAGE_SIZE):
+    return rows[:page_size], len(rows) > page_size
+
+
+# Function to turn the log-scale bin numbers of a density query back into
+# the geometric centre of each bin
+def bin_center(bin_number, bins_per_decade=DENSITY_BINS_PER_DECADE):
+    return 10 ** ((bin_number + 0.5) / bins_per_decade)
+
+
+# Largest-Triangle-Three-Buckets downsampling of a series of (x, y) points
+# sorted by x. Keeps the first and last points and, from each bucket in
+# between, the point forming the largest triangle with its neighbours, so
+# peaks and dips survive. Series shorter than `threshold` are returned as is.
+def lttb(points, threshold=MAX_CHART_POINTS):
+    points = list(points)
+    if threshold >= len(points) or threshold < 3:
+        return points
+
+    sampled = [points[0]]
+    bucket_size = (len(points) - 2) / (threshold - 2)
+    previous = 0
+    for bucket in range(threshold - 2):
+        start = int(math.floor(bucket * bucket_size)) + 1
+        end = int(math.floor((bucket + 1) * bucket_size)) + 1
+        next_end = min(int(math.floor((bucket + 2) * bucket_size)) + 1, len(points))
+
+        # Average of the next bucket (the last point for the final bucket)
+        next_points = points[end:next_end] or [points[-1]]
+        average_x = sum(point[0] for point in next_points) / len(next_points)
+        average_y = sum(point[1] for point in next_points) / len(next_points)
+
+        x0, y0 = points[previous][0], points[previous][1]
+        best_area, best = -1.0, start
+        for index in range(start, end):
+            x, y = points[index][0], points[index][1]
+            area = abs((x0 - average_x) * (y - y0) - (x0 - x) * (average_y - y0))
+            if area > best_area:
+                best_area, best = area, index
+        sampled.append(points[best])
+        previous = best
+    sampled.append(points[-1])
+    return sampled
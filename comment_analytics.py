@@ -0,0 +1,263 @@
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import main
+import metrics
+import storage
+import text_analytics
+
+# Offline analytics stage over the stored comments:
+#   python comment_analytics.py --workers 4
+# Comments are read in keyset chunks, analyzed (text_analytics.py) on a
+# process pool and written to comment_analytics with the bulk upsert path.
+# video_sentiment sums the labels per video for the dashboard and is updated
+# in the same transaction as each chunk. Both tables are created by schema
+# migration 10 (migrations.py).
+#
+# Comments are numbered in insertion order (comment_seq on MySQL, the rowid on
+# SQLite; schema migration 11) and comment_analytics_progress keeps the last
+# number read. A run only reads the comments above it, and every chunk moves it
+# in the same transaction as the chunk's rows, so an interrupted run resumes
+# where it stopped. Comments already analyzed are skipped either way, so
+# nothing is counted twice in video_sentiment.
+#
+# Concurrent writers (harvest threads, the job worker, the pipeline's comment
+# stage) can commit a comment numbered below the mark after a run moved past
+# it. On MySQL every run therefore reads again from RECHECK_WINDOW numbers
+# below the mark; SQLite commits one writer at a time, in rowid order. As a
+# safety net for what the window misses and for rowids a SQLite VACUUM
+# renumbered, a run also makes the anti-join of every stored comment against
+# comment_analytics when the last one is BACKFILL_EVERY_HOURS old (schema
+# migration 13 records when); --backfill forces it.
+# Comments whose text is edited later keep the analysis of their first text.
+# Run one analytics stage at a time.
+
+ANALYTICS_CHUNK_SIZE = 2000
+DEFAULT_ANALYTICS_WORKERS = os.cpu_count() or 1
+
+ANALYTICS_COLUMNS = ('comment_id', 'video_id', 'sentiment', 'sentiment_label', 'language', 'keywords',
+                     'analyzed_at')
+SENTIMENT_COLUMNS = ('video_id', 'analyzed_comments', 'positive', 'neutral', 'negative', 'sentiment_sum')
+
+# Insertion order column of comments per dialect
+COMMENT_SEQUENCE = {"mysql": "comment_seq", "sqlite": "rowid"}
+# Numbers below the mark read again by every run, for late commits
+RECHECK_WINDOW = {"mysql": 100000, "sqlite": 0}
+BACKFILL_EVERY_HOURS = 24
+
+# The next chunk of comments without analytics stored after the last one read
+NEW_COMMENTS = """
+    SELECT c.{seq}, c.comment_id, c.video_id, c.comment_text
+    FROM comments c
+    WHERE c.{seq} > %s
+      AND NOT EXISTS (SELECT 1 FROM comment_analytics a WHERE a.comment_id = c.comment_id)
+    ORDER BY c.{seq}
+    LIMIT %s
+"""
+
+# The next chunk of comments without analytics after the last comment_id read,
+# for the backfill
+PENDING_COMMENTS = """
+    SELECT c.comment_id, c.video_id, c.comment_text
+    FROM comments c
+    WHERE c.comment_id > %s
+      AND NOT EXISTS (SELECT 1 FROM comment_analytics a WHERE a.comment_id = c.comment_id)
+    ORDER BY c.comment_id
+    LIMIT %s
+"""
+
+
+# Function to add a chunk of comment_analytics rows to video_sentiment; runs
+# before the chunk is written, in the same transaction
+def _before_analytics_chunk(cursor, chunk):
+    totals = defaultdict(lambda: [0, 0, 0, 0, 0.0])
+    labels = {'positive': 1, 'neutral': 2, 'negative': 3}
+    for _, video_id, sentiment, label, _, _, _ in chunk:
+        total = totals[video_id]
+        total[0] += 1
+        total[labels[label]] += 1
+        total[4] += sentiment
+    cursor.execute(
+        storage.upsert_sql(storage.dialect_of(cursor), 'video_sentiment', SENTIMENT_COLUMNS, len(totals),
+                           increment_columns=SENTIMENT_COLUMNS[1:]),
+        [value for video_id in sorted(totals) for value in [video_id] + totals[video_id]])
+
+
+# Function to move the high-water mark past a chunk of comment_analytics rows
+# written in insertion order; `sequence` maps their comment_ids to their number
+def _advance_high_water_mark(cursor, chunk, sequence):
+    last_seq = max(sequence.pop(row[0]) for row in chunk)
+    cursor.execute("UPDATE comment_analytics_progress SET last_comment_seq = %s "
+                   "WHERE id = 1 AND last_comment_seq < %s", (last_seq, last_seq))
+
+
+# Function to read the new comments of the connection in chunks of
+# `chunk_size` rows, at most `limit` in total. The insertion number of every
+# comment read is added to `sequence` (comment_id -> number).
+def iter_new_chunks(connection, sequence, chunk_size=ANALYTICS_CHUNK_SIZE, limit=None):
+    cursor = connection.cursor()
+    dialect = storage.dialect_of(connection)
+    query = NEW_COMMENTS.format(seq=COMMENT_SEQUENCE[dialect])
+    remaining = limit
+    try:
+        cursor.execute("SELECT last_comment_seq FROM comment_analytics_progress WHERE id = 1")
+        row = cursor.fetchone()
+        last_seq = max(0, (row[0] if row else 0) - RECHECK_WINDOW[dialect])
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            cursor.execute(query, (last_seq, size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            for seq, comment_id, _, _ in rows:
+                sequence[comment_id] = seq
+            yield [tuple(row[1:]) for row in rows]
+            last_seq = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+    finally:
+        cursor.close()
+
+
+# Function to read the comments without analytics of the connection in chunks
+# of `chunk_size` rows, at most `limit` in total
+def iter_pending_chunks(connection, chunk_size=ANALYTICS_CHUNK_SIZE, limit=None):
+    cursor = connection.cursor()
+    last_comment_id = ""
+    remaining = limit
+    try:
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            cursor.execute(PENDING_COMMENTS, (last_comment_id, size))
+            chunk = [tuple(row) for row in cursor.fetchall()]
+            if not chunk:
+                break
+            yield chunk
+            last_comment_id = chunk[-1][0]
+            if remaining is not None:
+                remaining -= len(chunk)
+    finally:
+        cursor.close()
+
+
+# Function to analyze chunks of comments, in this process with workers <= 1
+# and otherwise on a process pool with up to 2 chunks per worker in flight.
+# Yields the comment_analytics rows in the order the comments were read.
+def iter_analyzed_rows(chunks, workers=DEFAULT_ANALYTICS_WORKERS):
+    analyzed_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    if workers <= 1:
+        for chunk in chunks:
+            for row in text_analytics.analyze_chunk(chunk):
+                yield row + (analyzed_at,)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        chunks = iter(chunks)
+        while True:
+            for chunk in chunks:
+                pending.append(executor.submit(text_analytics.analyze_chunk, chunk))
+                if len(pending) >= workers * 2:
+                    break
+            if not pending:
+                break
+            for row in pending.popleft().result():
+                yield row + (analyzed_at,)
+
+
+# Function to tell whether the last backfill is BACKFILL_EVERY_HOURS old
+def backfill_due(connection):
+    since = (datetime.utcnow() - timedelta(hours=BACKFILL_EVERY_HOURS)).strftime("%Y-%m-%d %H:%M:%S")
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM comment_analytics_progress "
+                       "WHERE id = 1 AND (last_backfill_at IS NULL OR last_backfill_at < %s)", (since,))
+        return cursor.fetchone()[0] > 0
+    finally:
+        cursor.close()
+
+
+def _mark_backfilled(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute("UPDATE comment_analytics_progress SET last_backfill_at = %s WHERE id = 1",
+                       (datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),))
+        connection.commit()
+    finally:
+        cursor.close()
+
+
+# Function to analyze every comment added since the last run and store the
+# results, followed by the backfill of every stored comment without analytics
+# when it is due (`backfill=None`) or forced (`backfill=True`). Returns
+# dict(rows, seconds, rows_per_second), or None when the database is
+# unavailable.
+def analyze_new_comments(workers=DEFAULT_ANALYTICS_WORKERS, chunk_size=ANALYTICS_CHUNK_SIZE, limit=None,
+                         commit_every=main.COMMIT_EVERY, backfill=None):
+    connection = main.connect_to_mysql()
+    if connection is None:
+        print("Failed to connect to the database.")
+        return None
+    start = time.perf_counter()
+    try:
+        sequence = {}
+
+        def before_new_chunk(cursor, chunk):
+            _before_analytics_chunk(cursor, chunk)
+            _advance_high_water_mark(cursor, chunk, sequence)
+
+        rows = iter_analyzed_rows(iter_new_chunks(connection, sequence, chunk_size, limit), workers)
+        written = main.bulk_upsert(connection, 'comment_analytics', ANALYTICS_COLUMNS, ANALYTICS_COLUMNS[2:],
+                                   rows, main.INSERT_CHUNK_SIZE, commit_every, before_new_chunk)
+
+        remaining = None if limit is None else limit - written
+        if backfill is None:
+            backfill = backfill_due(connection)
+        if backfill and (remaining is None or remaining > 0):
+            rows = iter_analyzed_rows(iter_pending_chunks(connection, chunk_size, remaining), workers)
+            backfilled = main.bulk_upsert(connection, 'comment_analytics', ANALYTICS_COLUMNS,
+                                          ANALYTICS_COLUMNS[2:], rows, main.INSERT_CHUNK_SIZE, commit_every,
+                                          _before_analytics_chunk)
+            written += backfilled
+            # A backfill cut short by the limit has not seen every comment
+            if remaining is None or backfilled < remaining:
+                _mark_backfilled(connection)
+        if written:
+            main.bump_generation(connection)
+    finally:
+        connection.close()
+    seconds = time.perf_counter() - start
+    metrics.STAGE_ROWS.inc(written, stage='comment_analytics')
+    metrics.write_textfile_from_env(force=True)
+    return dict(rows=written, seconds=seconds, rows_per_second=written / seconds if seconds else 0.0)
+
+
+# Command line entry point:  python comment_analytics.py [--workers N] [--limit N] [--backfill]
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze the comments stored since the last run")
+    parser.add_argument("--workers", type=int, default=DEFAULT_ANALYTICS_WORKERS,
+                        help="analysis processes; 1 analyzes in this process")
+    parser.add_argument("--chunk-size", type=int, default=ANALYTICS_CHUNK_SIZE, help="comments per chunk")
+    parser.add_argument("--limit", type=int, help="analyze at most this many comments")
+    parser.add_argument("--backfill", action="store_true",
+                        help="also check every stored comment for missing analytics, even if not due")
+    args = parser.parse_args(argv)
+
+    try:
+        result = analyze_new_comments(args.workers, args.chunk_size, args.limit, backfill=args.backfill or None)
+    except storage.Error as err:
+        print(f"Error analyzing comments: {err}")
+        return 1
+    if result is None:
+        return 1
+    print(f"Analyzed {result['rows']} comment(s) in {result['seconds']:.1f}s "
+          f"({result['rows_per_second']:.0f} comments/s).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
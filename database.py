@@ -0,0 +1,152 @@
+import json
+import os
+import threading
+import time
+
+import mysql.connector
+from mysql.connector import pooling
+
+# Optional JSON file with connection settings; environment variables override it.
+#   {"host": "localhost", "port": 3306, "user": "root", "password": "...",
+#    "database": "youtube", "pool_size": 5}
+# "backend" selects the storage backend (see storage.py): "mysql" or "sqlite".
+DB_CONFIG_FILE = os.environ.get("YOUTUBE_DB_CONFIG", "db_config.json")
+
+DEFAULT_DB_CONFIG = dict(
+    host="localhost",
+    port=3306,
+    user="root",
+    password="",
+    database="youtube",
+    pool_size=5,
+    pool_timeout=10.0,
+    allow_local_infile=False,
+    backend="mysql",
+    sqlite_path="youtube.db",
+)
+
+# Environment variable for every setting, e.g. YOUTUBE_DB_PASSWORD
+ENV_PREFIX = "YOUTUBE_DB_"
+
+
+# Function to load the database settings from the config file and the environment
+def load_db_config(path=None):
+    config = dict(DEFAULT_DB_CONFIG)
+    path = path or DB_CONFIG_FILE
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as config_file:
+            config.update(json.load(config_file))
+
+    for key, default in DEFAULT_DB_CONFIG.items():
+        value = os.environ.get(ENV_PREFIX + key.upper())
+        if value is None:
+            continue
+        if isinstance(default, bool):
+            value = value.lower() in ("1", "true", "yes", "on")
+        elif isinstance(default, int):
+            value = int(value)
+        elif isinstance(default, float):
+            value = float(value)
+        config[key] = value
+    return config
+
+
+# Function to split the settings into mysql.connector.connect() arguments
+def _connect_args(config):
+    return dict(
+        host=config["host"],
+        port=config["port"],
+        user=config["user"],
+        password=config["password"],
+        allow_local_infile=config["allow_local_infile"],
+    )
+
+
+_pool = None
+_pool_config = None
+_pool_lock = threading.Lock()
+
+
+# Function to create the process-wide pool on first use. The database is
+# created once here instead of on every connection.
+def get_pool():
+    global _pool, _pool_config
+    if _pool is not None:
+        return _pool
+
+    with _pool_lock:
+        if _pool is None:
+            config = load_db_config()
+            bootstrap = mysql.connector.connect(**_connect_args(config))
+            try:
+                cursor = bootstrap.cursor()
+                cursor.execute(f"CREATE DATABASE IF NOT EXISTS {config['database']}")
+                cursor.close()
+            finally:
+                bootstrap.close()
+
+            _pool = pooling.MySQLConnectionPool(
+                pool_name="youtube_pool",
+                pool_size=config["pool_size"],
+                pool_reset_session=True,
+                database=config["database"],
+                **_connect_args(config)
+            )
+            _pool_config = config
+            print(f"Connection pool to MySQL database '{config['database']}' is ready "
+                  f"({config['pool_size']} connections).")
+    return _pool
+
+
+# Function to borrow a healthy connection from the pool. Waits up to
+# `pool_timeout` seconds when every connection is in use. Calling close() on
+# the returned connection hands it back to the pool.
+def get_connection(allow_local_infile=False):
+    pool = get_pool()
+    if allow_local_infile and not _pool_config["allow_local_infile"]:
+        return get_dedicated_connection(allow_local_infile=True)
+
+    deadline = time.monotonic() + _pool_config["pool_timeout"]
+    while True:
+        try:
+            connection = pool.get_connection()
+            break
+        except pooling.PoolError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.05)
+
+    # Health check: reconnect connections the server has dropped
+    try:
+        connection.ping(reconnect=True, attempts=2, delay=0)
+    except mysql.connector.Error:
+        connection.close()
+        raise
+    return connection
+
+
+# Function to open a connection outside the pool, for options the pool was not
+# configured with (LOAD DATA LOCAL INFILE)
+def get_dedicated_connection(allow_local_infile=False):
+    get_pool()
+    args = _connect_args(_pool_config)
+    args["allow_local_infile"] = allow_local_infile
+    return mysql.connector.connect(database=_pool_config["database"], **args)
+
+
+# Function to report whether the database answers a trivial query
+def check_health():
+    try:
+        connection = get_connection()
+    except mysql.connector.Error:
+        return False
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        cursor.close()
+        return True
+    except mysql.connector.Error:
+        return False
+    finally:
+        connection.close()
@@ -0,0 +1,361 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from googleapiclient.errors import HttpError
+
+
+UPLOADS_START = datetime(2020, 1, 1, 12, 0, 0)
+
+# Quota units charged per request; every list call used by main.py costs 1
+QUOTA_COSTS = {"channels": 1, "playlists": 1, "playlistItems": 1, "videos": 1, "commentThreads": 1, "comments": 1}
+
+# Transient failures injected by `error_rate`, as (status, reason); all of
+# them are retryable per rate_limit.is_retryable
+TRANSIENT_ERRORS = [(500, "backendError"), (503, "backendError"), (429, "rateLimitExceeded")]
+
+# Headers googleapiclient puts on every request, so wrappers that look at
+# request.headers see what they would with the real client
+DEFAULT_HEADERS = {
+    "accept": "application/json",
+    "accept-encoding": "gzip, deflate",
+    "user-agent": "(gzip)",
+    "x-goog-api-client": "gdcl/2.0.0 gl-python/3.11.0",
+}
+
+
+# A local stand-in for the YouTube Data API v3 client used in main.py.
+# It mimics the `youtube.<resource>().list(...).execute()` call chain of the
+# discovery client and counts every request, so harvest functions can be
+# benchmarked without network access or quota.
+# `latency` (seconds, +/- `latency_jitter` as a fraction) is slept per request;
+# `error_rate` is the probability of a transient 5xx/429 answer, either one
+# rate for every endpoint or a dict per endpoint; `description_size` pads
+# video descriptions to that many characters. `seed` makes the injected
+# errors and jitter reproducible.
+class FakeYouTube:
+    def __init__(self, channel_id="UCfakechannel0000000000", num_videos=100,
+                 deleted_ids=(), comments_per_video=20, comment_counts=None,
+                 comments_disabled_ids=(), replies_every=0, replies_per_thread=0,
+                 num_playlists=3, latency=0.0, latency_jitter=0.0, error_rate=0.0,
+                 description_size=0, seed=0):
+        self.channel_id = channel_id
+        self.uploads_playlist_id = "UU" + channel_id[2:]
+        self.num_playlists = num_playlists
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.description_size = description_size
+        self.requests = Counter()
+        self.errors = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        # Uploads are numbered oldest first; video_ids is newest first like the
+        # uploads playlist. Upload n is published n hours after UPLOADS_START.
+        self.video_ids = ["vid%08d" % n for n in reversed(range(num_videos))]
+        self.deleted_ids = set(deleted_ids)
+        # comment_counts overrides comments_per_video for single (viral) videos;
+        # every `replies_every`-th thread gets `replies_per_thread` replies
+        self.comments_per_video = comments_per_video
+        self.comment_counts = dict(comment_counts or {})
+        self.replies_every = replies_every
+        self.replies_per_thread = replies_per_thread
+        self.comments_disabled_ids = set(comments_disabled_ids)
+        self._videos = {
+            video_id: self._make_video(n, video_id)
+            for n, video_id in enumerate(reversed(self.video_ids))
+            if video_id not in self.deleted_ids
+        }
+
+    # Simulate new uploads on the channel; returns their IDs, newest first
+    def add_uploads(self, count):
+        first = len(self.video_ids)
+        new_ids = ["vid%08d" % n for n in reversed(range(first, first + count))]
+        for n, video_id in zip(reversed(range(first, first + count)), new_ids):
+            self._videos[video_id] = self._make_video(n, video_id)
+        self.video_ids = new_ids + self.video_ids
+        return new_ids
+
+    def _published_at(self, n):
+        return (UPLOADS_START + timedelta(hours=n)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def _make_video(self, n, video_id):
+        description = "Description of video %d" % n
+        if len(description) < self.description_size:
+            description += " " + "lorem ipsum " * ((self.description_size - len(description)) // 12 + 1)
+            description = description[:self.description_size]
+        return {
+            "id": video_id,
+            "snippet": {
+                "channelId": self.channel_id,
+                "title": "Video %d" % n,
+                "description": description,
+                "thumbnails": {"default": {"url": "https://i.ytimg.com/vi/%s/default.jpg" % video_id}},
+                "tags": ["tag%d" % (n % 7), "fake"],
+                "publishedAt": self._published_at(n),
+            },
+            "contentDetails": {"duration": "PT%dM%dS" % (n % 60, n % 50), "caption": "false"},
+            "statistics": {
+                "viewCount": str(1000 + n * 13),
+                "likeCount": str(10 + n),
+                "favoriteCount": "0",
+                "commentCount": str(n % 40),
+            },
+        }
+
+    def _reply_count(self, n):
+        if self.replies_every and n % self.replies_every == 0:
+            return self.replies_per_thread
+        return 0
+
+    def _make_comment(self, video_id, n, with_replies=False):
+        comment_id = "%s-c%06d" % (video_id, n)
+        thread = {
+            "id": comment_id,
+            "snippet": {
+                "videoId": video_id,
+                "topLevelComment": {
+                    "id": comment_id,
+                    "snippet": {
+                        "videoId": video_id,
+                        "textDisplay": "Comment %d on %s" % (n, video_id),
+                        "authorDisplayName": "user%d" % (n % 97),
+                        "publishedAt": "2024-01-%02dT08:30:00Z" % (n % 28 + 1),
+                    },
+                },
+                "totalReplyCount": self._reply_count(n),
+            },
+        }
+        if with_replies and thread["snippet"]["totalReplyCount"]:
+            # The API returns at most 5 replies inline with the thread
+            thread["replies"] = {"comments": [
+                self._make_reply(comment_id, r) for r in range(min(5, thread["snippet"]["totalReplyCount"]))
+            ]}
+        return thread
+
+    def _make_reply(self, parent_id, r):
+        return {
+            "id": "%s.r%04d" % (parent_id, r),
+            "snippet": {
+                "parentId": parent_id,
+                "textDisplay": "Reply %d to %s" % (r, parent_id),
+                "authorDisplayName": "user%d" % (r % 89),
+                "publishedAt": "2024-02-%02dT09:15:00Z" % (r % 28 + 1),
+            },
+        }
+
+    def comment_count(self, video_id):
+        return self.comment_counts.get(video_id, self.comments_per_video)
+
+    def total_requests(self):
+        return sum(self.requests.values())
+
+    # Quota units the requests so far would have cost
+    def quota_used(self):
+        return sum(QUOTA_COSTS[endpoint] * count for endpoint, count in self.requests.items())
+
+    def total_errors(self):
+        return sum(self.errors.values())
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests.clear()
+            self.errors.clear()
+
+    def _error_rate(self, endpoint):
+        if isinstance(self.error_rate, dict):
+            return self.error_rate.get(endpoint, 0.0)
+        return self.error_rate
+
+    # Resource accessors, mirroring the discovery client
+    def channels(self):
+        return _FakeResource(self, "channels")
+
+    def playlists(self):
+        return _FakeResource(self, "playlists")
+
+    def playlistItems(self):
+        return _FakeResource(self, "playlistItems")
+
+    def videos(self):
+        return _FakeResource(self, "videos")
+
+    def commentThreads(self):
+        return _FakeResource(self, "commentThreads")
+
+    def comments(self):
+        return _FakeResource(self, "comments")
+
+    def _execute(self, endpoint, params, headers=None):
+        with self._lock:
+            self.requests[endpoint] += 1
+            latency = self.latency * (1 + self.latency_jitter * self._random.uniform(-1, 1))
+            error = None
+            if self._random.random() < self._error_rate(endpoint):
+                error = self._random.choice(TRANSIENT_ERRORS)
+                self.errors[endpoint] += 1
+        if latency > 0:
+            time.sleep(latency)
+        if error is not None:
+            raise http_error(error[0], error[1], "Injected transient error.")
+        response = getattr(self, "_list_" + endpoint)(**params)
+        # Conditional requests: an unchanged response answers 304 Not Modified
+        etag = '"%s"' % hashlib.md5(json.dumps(response, sort_keys=True).encode("utf-8")).hexdigest()
+        if headers and {name.lower(): value for name, value in headers.items()}.get("if-none-match") == etag:
+            raise HttpError(_FakeResponse(304), b"")
+        response["etag"] = etag
+        return response
+
+    def _list_channels(self, part, id, **_):
+        items = []
+        if id == self.channel_id:
+            items.append({
+                "id": self.channel_id,
+                "snippet": {
+                    "title": "Fake Channel",
+                    "description": "A channel served by fake_youtube",
+                    "thumbnails": {"default": {"url": "https://yt3.ggpht.com/fake/default.jpg"}},
+                    "publishedAt": "2015-06-01T10:00:00Z",
+                },
+                "contentDetails": {"relatedPlaylists": {"uploads": self.uploads_playlist_id}},
+                "statistics": {
+                    "subscriberCount": "123456",
+                    "videoCount": str(len(self._videos)),
+                    "viewCount": str(sum(int(v["statistics"]["viewCount"]) for v in self._videos.values())),
+                },
+            })
+        return {"kind": "youtube#channelListResponse", "items": items}
+
+    def _list_playlists(self, part, channelId, maxResults=5, pageToken=None, **_):
+        total = self.num_playlists if channelId == self.channel_id else 0
+        start, end, next_token = _page(total, maxResults, pageToken)
+        response = {
+            "kind": "youtube#playlistListResponse",
+            "items": [{
+                "id": "PL%s%04d" % (self.channel_id[2:12], n),
+                "snippet": {
+                    "title": "Playlist %d" % n,
+                    "publishedAt": "2020-03-%02dT07:00:00Z" % (n % 28 + 1),
+                    "channelId": self.channel_id,
+                    "channelTitle": "Fake Channel",
+                },
+                "contentDetails": {"itemCount": 10 + n},
+            } for n in range(start, end)],
+        }
+        if next_token:
+            response["nextPageToken"] = next_token
+        return response
+
+    def _list_playlistItems(self, part, playlistId, maxResults=5, pageToken=None, **_):
+        if playlistId != self.uploads_playlist_id:
+            raise http_error(404, "playlistNotFound", "The playlist identified with the request's playlistId parameter cannot be found.")
+        start, end, next_token = _page(len(self.video_ids), maxResults, pageToken)
+        response = {
+            "kind": "youtube#playlistItemListResponse",
+            "items": [{
+                "id": "PI%s" % video_id,
+                "snippet": {
+                    "playlistId": playlistId,
+                    "publishedAt": self._published_at(int(video_id[3:])),
+                    "resourceId": {"kind": "youtube#video", "videoId": video_id},
+                },
+            } for video_id in self.video_ids[start:end]],
+        }
+        if next_token:
+            response["nextPageToken"] = next_token
+        return response
+
+    def _list_videos(self, part, id, **_):
+        ids = id.split(",")
+        if len(ids) > 50:
+            raise ValueError("videos().list accepts at most 50 IDs, got %d" % len(ids))
+        return {
+            "kind": "youtube#videoListResponse",
+            "items": [self._videos[video_id] for video_id in ids if video_id in self._videos],
+        }
+
+    def _list_commentThreads(self, part, videoId, maxResults=20, pageToken=None, **_):
+        if videoId in self.comments_disabled_ids:
+            raise http_error(403, "commentsDisabled",
+                             "The video identified by the videoId parameter has disabled comments.")
+        if videoId not in self._videos:
+            raise http_error(404, "videoNotFound", "The video identified by the videoId parameter could not be found.")
+        start, end, next_token = _page(self.comment_count(videoId), maxResults, pageToken)
+        with_replies = "replies" in part.split(",")
+        response = {
+            "kind": "youtube#commentThreadListResponse",
+            "items": [self._make_comment(videoId, n, with_replies) for n in range(start, end)],
+        }
+        if next_token:
+            response["nextPageToken"] = next_token
+        return response
+
+    def _list_comments(self, part, parentId, maxResults=20, pageToken=None, **_):
+        n = int(parentId.rsplit("-c", 1)[1])
+        start, end, next_token = _page(self._reply_count(n), maxResults, pageToken)
+        response = {
+            "kind": "youtube#commentListResponse",
+            "items": [self._make_reply(parentId, r) for r in range(start, end)],
+        }
+        if next_token:
+            response["nextPageToken"] = next_token
+        return response
+
+
+# Function to slice `total` items into pages; page tokens are plain offsets
+def _page(total, max_results, page_token):
+    start = int(page_token) if page_token else 0
+    end = min(total, start + max_results)
+    return start, end, str(end) if end < total else None
+
+
+# Function to build an HttpError shaped like the ones the real client raises
+def http_error(status, reason, message):
+    content = json.dumps({
+        "error": {
+            "code": status,
+            "message": message,
+            "errors": [{"message": message, "domain": "youtube", "reason": reason}],
+        }
+    }).encode("utf-8")
+    return HttpError(_FakeResponse(status), content)
+
+
+class _FakeResponse(dict):
+    def __init__(self, status):
+        super().__init__(status=str(status))
+        self.status = status
+        self.reason = _reason_phrase(status)
+
+
+def _reason_phrase(status):
+    return {304: "Not Modified", 403: "Forbidden", 404: "Not Found", 429: "Too Many Requests",
+            500: "Internal Server Error", 503: "Service Unavailable"}.get(status, "Error")
+
+
+class _FakeResource:
+    def __init__(self, api, endpoint):
+        self._api = api
+        self._endpoint = endpoint
+
+    def list(self, **params):
+        return _FakeRequest(self._api, self._endpoint, params)
+
+
+class _FakeRequest:
+    def __init__(self, api, endpoint, params):
+        self._api = api
+        self._endpoint = endpoint
+        self._params = params
+        self.headers = dict(DEFAULT_HEADERS)
+        self.methodId = "youtube.%s.list" % endpoint
+
+    # `http` and `num_retries` are accepted for signature compatibility with
+    # googleapiclient.http.HttpRequest.execute
+    def execute(self, http=None, num_retries=0):
+        return self._api._execute(self._endpoint, self._params, self.headers)
@@ -0,0 +1,165 @@
+import argparse
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import metrics
+from main import COMMENT_REQUESTS_PER_SECOND
+from pipeline import PIPELINE_BATCH_SIZE, PIPELINE_COMMENT_WORKERS, harvest_channel
+from rate_limit import RateLimiter
+from state_store import StateStore
+
+# Command line harvester for many channels at once:
+#   python harvest_cli.py channels.txt --workers 4 --incremental
+# The channels file holds one channel ID per line; blank lines and lines
+# starting with '#' are ignored.
+
+DEFAULT_CHANNEL_WORKERS = 4
+
+
+# Function to read channel IDs from a file, dropping comments and duplicates
+def read_channel_ids(path):
+    channel_ids = []
+    with open(path, encoding="utf-8") as channels_file:
+        for line in channels_file:
+            channel_id = line.split("#", 1)[0].strip()
+            if channel_id:
+                channel_ids.append(channel_id)
+    return list(dict.fromkeys(channel_ids))
+
+
+# Function to summarise the final pipeline stats of one channel
+def _stage_rows(stats):
+    return {stage['stage']: stage['rows'] for stage in stats}
+
+
+# Function to harvest one channel and never raise, so one bad channel does not
+# abort the batch. Returns a result dict with the status and row counts.
+def harvest_one(channel_id, options, limiter=None, state=None, on_progress=None):
+    start = time.perf_counter()
+    try:
+        stats = harvest_channel(
+            channel_id,
+            batch_size=options['batch_size'],
+            comment_workers=options['comment_workers'],
+            requests_per_second=options['requests_per_second'],
+            incremental=options['incremental'],
+            state=state,
+            limiter=limiter,
+            on_progress=on_progress,
+            progress_interval=options['progress_interval'],
+        )
+        return dict(channel_id=channel_id, status="ok", seconds=time.perf_counter() - start,
+                    rows=_stage_rows(stats), error=None)
+    except Exception as e:
+        return dict(channel_id=channel_id, status="failed", seconds=time.perf_counter() - start,
+                    rows={}, error=f"{type(e).__name__}: {e}",
+                    traceback=traceback.format_exc())
+
+
+# Function used by the process pool; every worker process builds its own API
+# client on its first request (see main.LazyClient) and its own connection pool
+def _harvest_in_process(channel_id, options):
+    return harvest_one(channel_id, options)
+
+
+def _progress_printer(channel_id, position, total):
+    def print_progress(stats):
+        rows = " ".join(f"{stage['stage']}={stage['rows']}({stage['rows_per_second']}/s)" for stage in stats)
+        print(f"[{position}/{total}] {channel_id}: {rows}", flush=True)
+    return print_progress
+
+
+# Function to harvest every channel on a thread or process pool and print a
+# per-channel line as each one finishes. Returns the list of result dicts.
+def harvest_channels(channel_ids, options, workers=DEFAULT_CHANNEL_WORKERS, use_processes=False):
+    results = []
+    total = len(channel_ids)
+    if use_processes:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        futures = {executor.submit(_harvest_in_process, channel_id, options): channel_id
+                   for channel_id in channel_ids}
+    else:
+        # Threads share one requests-per-second budget and one state store
+        limiter = RateLimiter(options['requests_per_second']) if options['requests_per_second'] else None
+        state = StateStore()
+        executor = ThreadPoolExecutor(max_workers=workers)
+        futures = {
+            executor.submit(harvest_one, channel_id, options, limiter, state,
+                            _progress_printer(channel_id, position, total)): channel_id
+            for position, channel_id in enumerate(channel_ids, start=1)
+        }
+
+    with executor:
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            results.append(result)
+            if result['status'] == "ok":
+                rows = result['rows']
+                print(f"[{done}/{total}] {result['channel_id']} done in {result['seconds']:.1f}s: "
+                      f"{rows.get('write_videos', 0)} videos, {rows.get('write_comments', 0)} comments",
+                      flush=True)
+            else:
+                print(f"[{done}/{total}] {result['channel_id']} FAILED after {result['seconds']:.1f}s: "
+                      f"{result['error']}", flush=True)
+    return results
+
+
+def print_summary(results, elapsed):
+    succeeded = [result for result in results if result['status'] == "ok"]
+    failed = [result for result in results if result['status'] != "ok"]
+    videos = sum(result['rows'].get('write_videos', 0) for result in succeeded)
+    comments = sum(result['rows'].get('write_comments', 0) for result in succeeded)
+    print()
+    print(f"Channels: {len(succeeded)} succeeded, {len(failed)} failed, {len(results)} total")
+    print(f"Rows written: {videos} videos, {comments} comments")
+    print(f"Wall time: {elapsed:.1f}s  throughput: {len(results) / elapsed * 60:.1f} channels/min, "
+          f"{(videos + comments) / elapsed:.0f} rows/s")
+    for result in failed:
+        print(f"  failed: {result['channel_id']} - {result['error']}")
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Harvest many YouTube channels into MySQL in parallel")
+    parser.add_argument("channels_file", help="file with one channel ID per line")
+    parser.add_argument("--workers", type=int, default=DEFAULT_CHANNEL_WORKERS,
+                        help="channels harvested at the same time")
+    parser.add_argument("--processes", action="store_true",
+                        help="use a process pool instead of threads")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only fetch new uploads and refresh recent statistics")
+    parser.add_argument("--batch-size", type=int, default=PIPELINE_BATCH_SIZE)
+    parser.add_argument("--comment-workers", type=int, default=PIPELINE_COMMENT_WORKERS)
+    parser.add_argument("--rps", type=float, default=COMMENT_REQUESTS_PER_SECOND,
+                        help="requests per second for comment fetching (shared by all channels in thread mode)")
+    parser.add_argument("--progress-interval", type=float, default=10.0,
+                        help="seconds between progress lines per channel")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics on this port (default: YOUTUBE_METRICS_PORT)")
+    args = parser.parse_args(argv)
+
+    channel_ids = read_channel_ids(args.channels_file)
+    if not channel_ids:
+        print("No channel IDs found.")
+        return 1
+
+    options = dict(
+        batch_size=args.batch_size,
+        comment_workers=args.comment_workers,
+        requests_per_second=args.rps,
+        incremental=args.incremental,
+        progress_interval=args.progress_interval,
+    )
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port)
+    else:
+        metrics.start_http_server_from_env()
+    start = time.perf_counter()
+    results = harvest_channels(channel_ids, options, workers=args.workers, use_processes=args.processes)
+    print_summary(results, time.perf_counter() - start)
+    return 0 if all(result['status'] == "ok" for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,345 @@
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timedelta
+
+from state_store import STATE_DB
+
+# Persistent queue of channel harvests, run in the background so a harvest
+# does not depend on the browser session that asked for it:
+#   app.py                          queues harvests and shows their progress
+#   JobWorker                       runs them; the Streamlit server starts one
+#   python harvest_jobs.py worker   runs them in a separate process instead
+# Jobs live in the local harvest state database (state_store.py), shared by
+# every process on the machine. A channel has at most one queued or running
+# job, and at most `concurrency` jobs run at once across all workers.
+#
+# A running job records its per-stage progress (pipeline.py) every second and
+# stops at its next report once cancelled.
+# Retrying a failed or cancelled job queues a new one; the harvest resumes
+# from its checkpoint in the state store. Running jobs whose worker stopped
+# sending heartbeats (killed, restarted) are queued again.
+
+DEFAULT_JOB_CONCURRENCY = 2
+JOB_POLL_SECONDS = 1.0
+JOB_PROGRESS_SECONDS = 1.0
+# Workers refresh the heartbeat of their running jobs this often; a running
+# job without a heartbeat for JOB_STALE_SECONDS is considered abandoned
+JOB_HEARTBEAT_SECONDS = 10
+JOB_STALE_SECONDS = 60
+# Abandoned jobs are queued again at most this many times
+JOB_MAX_ATTEMPTS = 3
+
+ACTIVE_STATUSES = ('queued', 'running')
+RETRYABLE_STATUSES = ('failed', 'cancelled')
+
+
+# Raised from the progress callback to stop the pipeline of a cancelled job
+class JobCancelled(Exception):
+    pass
+
+
+def _now(offset_seconds=0):
+    return (datetime.utcnow() - timedelta(seconds=offset_seconds)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _job(row):
+    if row is None:
+        return None
+    job = dict(row)
+    job['incremental'] = bool(job['incremental'])
+    job['progress'] = json.loads(job['progress']) if job['progress'] else []
+    return job
+
+
+# SQLite-backed job queue. One connection is shared by all threads of a
+# process and guarded by a lock; every state change is a single statement, so
+# processes sharing the file cannot claim the same job.
+class JobQueue:
+    def __init__(self, path=STATE_DB):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._connection.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS harvest_jobs (
+                job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel_id TEXT NOT NULL,
+                incremental INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                progress TEXT,
+                error TEXT,
+                worker TEXT,
+                created_at TEXT,
+                started_at TEXT,
+                finished_at TEXT,
+                heartbeat_at TEXT
+            )""")
+            # At most one queued or running job per channel
+            self._connection.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_harvest_jobs_active ON harvest_jobs (channel_id) "
+                "WHERE status IN ('queued', 'running')")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_harvest_jobs_status ON harvest_jobs (status, job_id)")
+
+    def get(self, job_id):
+        with self._lock:
+            return _job(self._connection.execute(
+                "SELECT * FROM harvest_jobs WHERE job_id = ?", (job_id,)).fetchone())
+
+    # Function to list the most recent jobs, newest first
+    def list_jobs(self, limit=50):
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT * FROM harvest_jobs ORDER BY job_id DESC LIMIT ?", (limit,)).fetchall()
+        return [_job(row) for row in rows]
+
+    # Function to queue a harvest of a channel. Returns (job, created); when the
+    # channel already has a queued or running job, that job is returned.
+    def enqueue(self, channel_id, incremental=False):
+        active = "SELECT * FROM harvest_jobs WHERE channel_id = ? AND status IN ('queued', 'running')"
+        with self._lock, self._connection:
+            row = self._connection.execute(active, (channel_id,)).fetchone()
+            if row is not None:
+                return _job(row), False
+            # The unique index settles a race with another process
+            cursor = self._connection.execute(
+                "INSERT OR IGNORE INTO harvest_jobs (channel_id, incremental, status, created_at) "
+                "VALUES (?, ?, 'queued', ?)", (channel_id, int(incremental), _now()))
+            row = self._connection.execute(active, (channel_id,)).fetchone()
+        return _job(row), cursor.rowcount == 1
+
+    # Function to claim the oldest queued job for `worker` unless
+    # `concurrency` jobs are already running. Returns the job or None.
+    def claim(self, worker, concurrency=DEFAULT_JOB_CONCURRENCY):
+        now = _now()
+        with self._lock, self._connection:
+            row = self._connection.execute("""
+            UPDATE harvest_jobs
+            SET status = 'running', worker = ?, started_at = ?, heartbeat_at = ?, attempts = attempts + 1,
+                progress = NULL, error = NULL
+            WHERE job_id = (SELECT job_id FROM harvest_jobs WHERE status = 'queued' ORDER BY job_id LIMIT 1)
+              AND (SELECT COUNT(*) FROM harvest_jobs WHERE status = 'running') < ?
+            RETURNING *""", (worker, now, now, concurrency)).fetchone()
+        return _job(row)
+
+    # Function to record the progress of a running job (the list of stage
+    # stats). Returns True when the job has been cancelled.
+    def report_progress(self, job_id, stats):
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "UPDATE harvest_jobs SET progress = ? WHERE job_id = ? RETURNING cancel_requested",
+                (json.dumps(stats), job_id)).fetchone()
+        return bool(row and row[0])
+
+    # Function to refresh the heartbeat of the jobs `worker` is running
+    def heartbeat(self, worker):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE harvest_jobs SET heartbeat_at = ? WHERE status = 'running' AND worker LIKE ?",
+                (_now(), worker + "/%"))
+
+    def finish(self, job_id, status, error=None, stats=None):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE harvest_jobs SET status = ?, error = ?, progress = COALESCE(?, progress), "
+                "finished_at = ? WHERE job_id = ?",
+                (status, error, json.dumps(stats) if stats is not None else None, _now(), job_id))
+
+    # Function to cancel a job: a queued job is cancelled at once, a running
+    # one stops at its next progress report. Returns False for finished jobs.
+    def cancel(self, job_id):
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "UPDATE harvest_jobs SET status = 'cancelled', finished_at = ? "
+                "WHERE job_id = ? AND status = 'queued'", (_now(), job_id))
+            if cursor.rowcount:
+                return True
+            cursor = self._connection.execute(
+                "UPDATE harvest_jobs SET cancel_requested = 1 WHERE job_id = ? AND status = 'running'",
+                (job_id,))
+            return cursor.rowcount == 1
+
+    # Function to queue a failed or cancelled job again. Returns (job, created)
+    # as enqueue() does, or (None, False) when the job has not finished badly.
+    def retry(self, job_id):
+        job = self.get(job_id)
+        if job is None or job['status'] not in RETRYABLE_STATUSES:
+            return None, False
+        return self.enqueue(job['channel_id'], job['incremental'])
+
+    # Function to queue again the running jobs without a heartbeat for
+    # `stale_seconds`, or to fail them after JOB_MAX_ATTEMPTS attempts (or
+    # cancel them when that was requested). Returns the number of jobs changed.
+    def recover_stale(self, stale_seconds=JOB_STALE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS):
+        now = _now()
+        with self._lock, self._connection:
+            cursor = self._connection.execute("""
+            UPDATE harvest_jobs
+            SET status = CASE WHEN cancel_requested THEN 'cancelled'
+                              WHEN attempts >= ? THEN 'failed'
+                              ELSE 'queued' END,
+                error = CASE WHEN cancel_requested THEN error
+                             ELSE 'Worker ' || COALESCE(worker, '?') || ' stopped responding' END,
+                finished_at = CASE WHEN cancel_requested OR attempts >= ? THEN ? END
+            WHERE status = 'running' AND heartbeat_at < ?""",
+                (max_attempts, max_attempts, now, _now(stale_seconds)))
+            return cursor.rowcount
+
+
+# Function to harvest the channel of a claimed job, reporting progress to the
+# queue, and record how it ended
+def run_job(job_queue, job, limiter=None, progress_seconds=JOB_PROGRESS_SECONDS):
+    # The harvester (and the YouTube client library) is only loaded once a
+    # job runs, so a server that never harvests does not pay for it
+    from pipeline import harvest_channel
+
+    def on_progress(stats):
+        if job_queue.report_progress(job['job_id'], stats):
+            raise JobCancelled()
+
+    try:
+        stats = harvest_channel(job['channel_id'], incremental=job['incremental'], limiter=limiter,
+                                on_progress=on_progress, progress_interval=progress_seconds)
+    except JobCancelled:
+        job_queue.finish(job['job_id'], 'cancelled')
+        return 'cancelled'
+    except Exception as e:
+        job_queue.finish(job['job_id'], 'failed', error=f"{type(e).__name__}: {e}")
+        return 'failed'
+    job_queue.finish(job['job_id'], 'succeeded', stats=stats)
+    return 'succeeded'
+
+
+# Background worker: `concurrency` threads that claim and run queued jobs,
+# sharing one comment rate limiter as harvest_cli.py does, plus a thread that
+# keeps the heartbeat of its running jobs and recovers abandoned ones
+class JobWorker:
+    def __init__(self, path=STATE_DB, concurrency=DEFAULT_JOB_CONCURRENCY, poll_seconds=JOB_POLL_SECONDS,
+                 requests_per_second=None):
+        self.queue = JobQueue(path)
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.requests_per_second = requests_per_second
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.stopped = threading.Event()
+        self._threads = []
+        self._limiter = None
+        self._limiter_lock = threading.Lock()
+
+    def limiter(self):
+        with self._limiter_lock:
+            if self._limiter is None:
+                from main import COMMENT_REQUESTS_PER_SECOND
+                from rate_limit import RateLimiter
+                self._limiter = RateLimiter(self.requests_per_second or COMMENT_REQUESTS_PER_SECOND)
+            return self._limiter
+
+    def _run_jobs(self, n):
+        while not self.stopped.is_set():
+            job = self.queue.claim(f"{self.name}/{n}", self.concurrency)
+            if job is None:
+                self.stopped.wait(self.poll_seconds)
+                continue
+            status = run_job(self.queue, job, self.limiter())
+            print(f"Harvest job {job['job_id']} ({job['channel_id']}): {status}", flush=True)
+
+    def _keep_alive(self):
+        while not self.stopped.wait(JOB_HEARTBEAT_SECONDS):
+            self.queue.heartbeat(self.name)
+            self.queue.recover_stale()
+
+    def start(self):
+        self.queue.recover_stale()
+        targets = [(self._keep_alive, (), "harvest-job-heartbeat")]
+        targets += [(self._run_jobs, (n,), f"harvest-job-{n}") for n in range(self.concurrency)]
+        for target, args, name in targets:
+            thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+            self._threads.append(thread)
+            thread.start()
+        return self
+
+    # Function to stop claiming jobs and wait for the running ones to finish
+    def stop(self, timeout=None):
+        self.stopped.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+
+# Function to start the worker of a server process with YOUTUBE_JOB_CONCURRENCY
+# threads (DEFAULT_JOB_CONCURRENCY when unset). 0 starts none, for when jobs
+# are run by `python harvest_jobs.py worker` instead. Returns the worker or None.
+def worker_from_env():
+    concurrency = int(os.environ.get("YOUTUBE_JOB_CONCURRENCY", DEFAULT_JOB_CONCURRENCY))
+    if concurrency <= 0:
+        return None
+    return JobWorker(concurrency=concurrency).start()
+
+
+def _print_job(job):
+    rows = " ".join(f"{stage['stage']}={stage['rows']}" for stage in job['progress'])
+    print(f"#{job['job_id']} {job['channel_id']} {job['status']} attempts={job['attempts']} "
+          f"created={job['created_at']} {rows} {job['error'] or ''}".rstrip())
+
+
+# Command line entry point:
+#   python harvest_jobs.py worker [--concurrency N]
+#   python harvest_jobs.py enqueue CHANNEL_ID [--incremental]
+#   python harvest_jobs.py list | cancel JOB_ID | retry JOB_ID
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Background harvest job queue")
+    parser.add_argument("--db", default=STATE_DB, help="harvest state database holding the queue")
+    commands = parser.add_subparsers(dest="command", required=True)
+    worker_parser = commands.add_parser("worker", help="run queued harvests until interrupted")
+    worker_parser.add_argument("--concurrency", type=int, default=DEFAULT_JOB_CONCURRENCY,
+                               help="harvests running at once across all workers")
+    worker_parser.add_argument("--requests-per-second", type=float, help="comment requests per second")
+    enqueue_parser = commands.add_parser("enqueue", help="queue a channel harvest")
+    enqueue_parser.add_argument("channel_id")
+    enqueue_parser.add_argument("--incremental", action="store_true")
+    commands.add_parser("list", help="show the most recent jobs")
+    for command in ("cancel", "retry"):
+        commands.add_parser(command, help=f"{command} a job").add_argument("job_id", type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == "worker":
+        worker = JobWorker(args.db, args.concurrency, requests_per_second=args.requests_per_second).start()
+        print(f"Harvest worker {worker.name} running up to {args.concurrency} job(s); Ctrl+C to stop.")
+        try:
+            while not worker.stopped.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            print("Stopping after the running jobs finish...")
+            worker.stop()
+        return 0
+
+    job_queue = JobQueue(args.db)
+    if args.command == "enqueue":
+        job, created = job_queue.enqueue(args.channel_id, args.incremental)
+        print(f"{'Queued' if created else 'Already queued or running:'} job #{job['job_id']}")
+    elif args.command == "list":
+        for job in job_queue.list_jobs():
+            _print_job(job)
+    elif args.command == "cancel":
+        if not job_queue.cancel(args.job_id):
+            print(f"Job #{args.job_id} is not queued or running.")
+            return 1
+        print(f"Cancelled job #{args.job_id}.")
+    else:
+        job, created = job_queue.retry(args.job_id)
+        if job is None:
+            print(f"Job #{args.job_id} has not failed or been cancelled.")
+            return 1
+        print(f"{'Queued' if created else 'Already queued or running:'} job #{job['job_id']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -1,12 +1,80 @@
-import googleapiclient.discovery
-import mysql.connector
-import re
+import googleapiclient.errors
+import queue
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import islice
+
+import metrics
+import migrations
+import query_cache
+import quota
+import records
+import rollups
+import stats_history
+import storage
+from api_cache import cached_client_from_env
+from rate_limit import RateLimiter, execute_with_backoff
+from records import RecordBatch
 
 # API Key connection to interact with YouTube API
 api_service_name = "youtube"
 api_version = "v3"
 api_key = "YOUR_API_KEY"
-youtube = googleapiclient.discovery.build(api_service_name, api_version, developerKey=api_key)
+
+# Function to build a discovery client for one API key from the discovery
+# document bundled with google-api-python-client (no request to the discovery
+# service). The discovery module is only imported once a client is needed.
+def build_client(key):
+    import googleapiclient.discovery
+    return googleapiclient.discovery.build(api_service_name, api_version, developerKey=key,
+                                           static_discovery=True)
+
+# Function to build the YouTube client of this process. With YOUTUBE_API_KEYS
+# set, requests rotate over a pool of keys with daily quota accounting (see
+# quota.py); otherwise `api_key` is used. YOUTUBE_API_CACHE adds the on-disk
+# response cache (see api_cache.py).
+def build_youtube():
+    return cached_client_from_env(quota.client_from_env(build_client, api_key))
+
+# Stand-in for the YouTube client that builds it on first use and keeps it for
+# the process; a forked worker process builds its own. Importing main therefore
+# costs no client construction and needs no network access.
+class LazyClient:
+    def __init__(self, factory):
+        self._factory = factory
+        self._built = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    # The wrapped client, as for the other client wrappers (see quota.pool_of)
+    @property
+    def _client(self):
+        if self._built is None or self._pid != os.getpid():
+            with self._lock:
+                if self._built is None or self._pid != os.getpid():
+                    self._built = self._factory()
+                    self._pid = os.getpid()
+        return self._built
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+youtube = LazyClient(build_youtube)
+
+# httplib2 connections are not thread-safe, so every worker thread executes
+# its requests over its own Http object
+_thread_local = threading.local()
+
+def thread_http():
+    http = getattr(_thread_local, 'http', None)
+    if http is None:
+        import httplib2
+        http = _thread_local.http = httplib2.Http()
+    return http
 
 # Function to retrieve channel information from YouTube
 def channel_information(channel_id):
@@ -14,7 +82,9 @@ def channel_information(channel_id):
         part="snippet,contentDetails,statistics",
         id=channel_id
     )
-    response = request.execute()
+    response = execute_with_backoff(request, http=thread_http())
+    if not response.get('items'):
+        raise ValueError(f"Channel not found: {channel_id}")
 
     for i in response['items']:
         channel_data = dict(
@@ -32,7 +102,7 @@ def channel_information(channel_id):
 
 # Function to retrieve playlist information of a channel from YouTube
 def playlist_information(channel_id):
-    playlist_info = []
+    pages = []
     nextPageToken = None
 
     while True:
@@ -42,139 +112,326 @@ def playlist_information(channel_id):
             maxResults=50,
             pageToken=nextPageToken
         )
-        response = request.execute()
-
-        for i in response['items']:
-            data = dict(
-                playlist_id=i['id'],
-                playlist_name=i['snippet']['title'],
-                publishedat=i['snippet']['publishedAt'],
-                channel_ID=i['snippet']['channelId'],
-                channel_name=i['snippet']['channelTitle'],
-                videoscount=i['contentDetails']['itemCount']
-            )
-            playlist_info.append(data)
+        response = execute_with_backoff(request, http=thread_http())
+
+        pages.append(records.playlist_batch(response['items']))
         nextPageToken = response.get('nextPageToken')
         if nextPageToken is None:
             break
 
-    return playlist_info
+    return RecordBatch.concat(pages, records.PLAYLIST_FIELDS)
 
-# Function to retrieve video IDs of a channel from YouTube
-def get_video_ids(channel_id):
-    response = youtube.channels().list(part="contentDetails", id=channel_id).execute()
-    playlist_videos = response['items'][0]['contentDetails']['relatedPlaylists']['uploads']
+# Function to look up the uploads playlist of a channel
+def get_uploads_playlist_id(channel_id):
+    request = youtube.channels().list(part="contentDetails", id=channel_id)
+    response = execute_with_backoff(request, http=thread_http())
+    return response['items'][0]['contentDetails']['relatedPlaylists']['uploads']
 
-    next_page_token = None
-    videos_ids = []
+# Function to retrieve video IDs of a channel from YouTube, one page of up to 50
+# IDs at a time, together with the token of the following page (None on the
+# last page). Paging starts at `page_token`, so an interrupted listing can resume.
+# A `watermark` dict gets the newest published_at and the ETag of the first
+# page when the listing starts there (see iter_new_video_id_pages).
+def iter_video_id_page_tokens(channel_id, playlist_id=None, page_token=None, watermark=None):
+    playlist_videos = playlist_id or get_uploads_playlist_id(channel_id)
+
+    next_page_token = page_token
 
     while True:
-        response1 = youtube.playlistItems().list(
+        request = youtube.playlistItems().list(
             part="snippet",
             playlistId=playlist_videos,
             maxResults=50,
             pageToken=next_page_token
-        ).execute()
+        )
+        response1 = execute_with_backoff(request, http=thread_http())
+        if watermark is not None and next_page_token is None:
+            # The uploads playlist is newest first
+            watermark['uploads_etag'] = response1.get('etag')
+            watermark['newest_published_at'] = max(
+                (convert_iso_to_mysql_datetime(i['snippet']['publishedAt']) for i in response1['items']),
+                default=None)
 
-        for i in range(len(response1['items'])):
-            videos_ids.append(response1['items'][i]['snippet']['resourceId']['videoId'])
         next_page_token = response1.get('nextPageToken')
+        yield [i['snippet']['resourceId']['videoId'] for i in response1['items']], next_page_token
         if next_page_token is None:
             break
 
+# Function to retrieve video IDs of a channel from YouTube, one page of up to 50 IDs at a time.
+# Pass the uploads `playlist_id` when it is already known (e.g. from
+# channel_information) to save the channels().list lookup.
+def iter_video_id_pages(channel_id, playlist_id=None):
+    for page, _ in iter_video_id_page_tokens(channel_id, playlist_id):
+        yield page
+
+# Function to retrieve only the video IDs uploaded after a channel's watermark
+# (see state_store.py). The uploads playlist is newest first, so paging stops at
+# the first video published at or before watermark['newest_published_at']. The
+# first page is sent with If-None-Match and the stored ETag; 304 Not Modified
+# means nothing was uploaded since the last run. The new watermark is left in
+# watermark['next'] for the caller to save once the harvest has succeeded.
+def iter_new_video_id_pages(channel_id, watermark):
+    playlist_videos = watermark.get('uploads_playlist_id') or get_uploads_playlist_id(channel_id)
+    since = watermark.get('newest_published_at')
+    next_watermark = watermark['next'] = dict(
+        uploads_playlist_id=playlist_videos,
+        newest_published_at=since,
+        uploads_etag=watermark.get('uploads_etag')
+    )
+
+    next_page_token = None
+
+    while True:
+        request = youtube.playlistItems().list(
+            part="snippet",
+            playlistId=playlist_videos,
+            maxResults=50,
+            pageToken=next_page_token
+        )
+        if next_page_token is None and watermark.get('uploads_etag'):
+            request.headers['If-None-Match'] = watermark['uploads_etag']
+        try:
+            response1 = execute_with_backoff(request, http=thread_http())
+        except googleapiclient.errors.HttpError as e:
+            if e.resp.status == 304:
+                return
+            raise
+        if next_page_token is None:
+            next_watermark['uploads_etag'] = response1.get('etag')
+
+        page = []
+        reached_known = False
+        for i in response1['items']:
+            published_at = convert_iso_to_mysql_datetime(i['snippet']['publishedAt'])
+            if since is not None and published_at <= since:
+                reached_known = True
+                break
+            page.append(i['snippet']['resourceId']['videoId'])
+            if next_watermark['newest_published_at'] is None or published_at > next_watermark['newest_published_at']:
+                next_watermark['newest_published_at'] = published_at
+
+        if page:
+            yield page
+        next_page_token = response1.get('nextPageToken')
+        if reached_known or next_page_token is None:
+            break
+
+# Function to retrieve video IDs of a channel from YouTube
+def get_video_ids(channel_id):
+    videos_ids = []
+    for page in iter_video_id_pages(channel_id):
+        videos_ids.extend(page)
+
     return videos_ids
 
+# The videos endpoint accepts up to 50 comma separated IDs per request
+VIDEO_BATCH_SIZE = 50
+
+# Function to split a list (or any iterable) into consecutive chunks of at most `size` items
+def chunk_list(items, size):
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            break
+        yield chunk
+
+# Function to retrieve video information in batches of up to 50 IDs per request.
+# Returns a RecordBatch of the videos (see records.py) together with the IDs
+# the API did not return (deleted, private or otherwise unavailable videos).
+def fetch_videos_batched(video_IDS, batch_size=VIDEO_BATCH_SIZE):
+    if not 1 <= batch_size <= VIDEO_BATCH_SIZE:
+        raise ValueError(f"batch_size must be between 1 and {VIDEO_BATCH_SIZE}")
+
+    pages = []
+    missing_ids = []
+    # Drop duplicate IDs but keep the playlist order
+    unique_ids = list(dict.fromkeys(video_IDS))
+
+    for batch in chunk_list(unique_ids, batch_size):
+        request = youtube.videos().list(
+            part="snippet,contentDetails,statistics",
+            id=",".join(batch)
+        )
+        response = execute_with_backoff(request, http=thread_http())
+
+        pages.append(records.video_batch(response['items']))
+        returned_ids = {i['id'] for i in response['items']}
+        missing_ids.extend(video_id for video_id in batch if video_id not in returned_ids)
+
+    return RecordBatch.concat(pages, records.VIDEO_FIELDS), missing_ids
+
 # Function to retrieve video information of all video IDs from YouTube
 def video_information(video_IDS):
-    video_info = []
-    for video_id in video_IDS:
-        response = youtube.videos().list(
-            part="snippet,contentDetails,statistics",
-            id=video_id
-        ).execute()
-
-        for i in response['items']:
-            data = dict(
-                channel_id=i['snippet']['channelId'],
-                video_id=i['id'],
-                video_name=i['snippet']['title'],
-                video_Description=i['snippet']['description'],
-                Thumbnail=i['snippet']['thumbnails']['default']['url'],
-                Tags=i['snippet'].get('tags'),
-                publishedAt=convert_iso_to_mysql_datetime(i['snippet']['publishedAt']),  # Ensure conversion
-                Duration=convert_duration(i['contentDetails']['duration']),
-                View_Count=i['statistics'].get('viewCount', 0),
-                Like_Count=i['statistics'].get('likeCount', 0),
-                Favorite_Count=i['statistics'].get('favoriteCount', 0),
-                Comment_Count=i['statistics'].get('commentCount', 0),
-                Caption_Status=i['contentDetails'].get('caption')
-            )
-            video_info.append(data)
+    video_info, missing_ids = fetch_videos_batched(video_IDS)
+    if missing_ids:
+        print(f"{len(missing_ids)} video(s) missing or deleted: {', '.join(missing_ids)}")
     return video_info
 
-# Function to convert duration from ISO 8601 format to HH:MM:SS format
-def convert_duration(duration):
-    regex = r'PT(\d+H)?(\d+M)?(\d+S)?'
-    match = re.match(regex, duration)
-    if not match:
-        return '00:00:00'
-    hours, minutes, seconds = match.groups()
-    hours = int(hours[:-1]) if hours else 0
-    minutes = int(minutes[:-1]) if minutes else 0
-    seconds = int(seconds[:-1]) if seconds else 0
-    return '{:02d}:{:02d}:{:02d}'.format(hours, minutes, seconds)
-
-# Function to retrieve comments information for all video IDs from YouTube
-def comments_information(video_IDS):
-    comments_info = []
-    for video_id in video_IDS:
-        try:
-            request = youtube.commentThreads().list(
-                part="snippet",
-                videoId=video_id,
-                maxResults=100
-            )
-            response = request.execute()
-
-            for i in response.get('items', []):
-                data = dict(
-                    video_id=i['snippet']['videoId'],
-                    comment_id=i['snippet']['topLevelComment']['id'],
-                    comment_text=i['snippet']['topLevelComment']['snippet']['textDisplay'],
-                    comment_author=i['snippet']['topLevelComment']['snippet']['authorDisplayName'],
-                    comment_publishedat=convert_iso_to_mysql_datetime(
-                        i['snippet']['topLevelComment']['snippet']['publishedAt']
-                    )
-                )
-                comments_info.append(data)
+# Defaults for the concurrent comment harvester
+COMMENT_WORKERS = 8
+COMMENT_REQUESTS_PER_SECOND = 20
+# Number of comment records per chunk yielded by iter_comment_chunks
+COMMENT_CHUNK_SIZE = 1000
 
-        except googleapiclient.errors.HttpError as e:
-            if e.resp.status == 403 and 'commentsDisabled' in str(e):
-                print(f"Comments are disabled for video ID: {video_id}")
-            else:
-                print(f"Error retrieving comments for video ID: {video_id} - {e}")
+# Function to page through all replies of a top level comment, yielding the
+# reply comment resources
+def iter_comment_replies(parent_id, limiter=None):
+    page_token = None
+    while True:
+        request = youtube.comments().list(
+            part="snippet",
+            parentId=parent_id,
+            maxResults=100,
+            pageToken=page_token
+        )
+        response = execute_with_backoff(request, limiter, http=thread_http())
+
+        yield from response.get('items', [])
+        page_token = response.get('nextPageToken')
+        if page_token is None:
+            break
+
+# Function to page through every comment thread of a video. Yields, per
+# commentThreads page, a RecordBatch of its top level comments each followed by
+# its replies, and the token of the next page (None on the last page). Threads
+# return up to 5 replies inline; comments().list is only called when a thread
+# has more replies than that. Paging starts at `page_token` to resume a video.
+def iter_video_comment_pages(video_id, limiter=None, include_replies=True, page_token=None):
+    while True:
+        request = youtube.commentThreads().list(
+            part="snippet,replies" if include_replies else "snippet",
+            videoId=video_id,
+            maxResults=100,
+            pageToken=page_token
+        )
+        response = execute_with_backoff(request, limiter, http=thread_http())
+
+        # (video_id, comment resource) pairs, converted in one go below
+        entries = []
+        for i in response.get('items', []):
+            entries.append((i['snippet']['videoId'], i['snippet']['topLevelComment']))
+            reply_count = i['snippet'].get('totalReplyCount', 0)
+            if not include_replies or not reply_count:
+                continue
+            inline_replies = i.get('replies', {}).get('comments', [])
+            if len(inline_replies) < reply_count:
+                inline_replies = iter_comment_replies(i['snippet']['topLevelComment']['id'], limiter)
+            entries.extend((video_id, reply) for reply in inline_replies)
+        page_token = response.get('nextPageToken')
+        yield records.comment_batch(entries), page_token
+        if page_token is None:
+            break
+
+# Function to report a failed comment fetch. Returns True when the error is
+# permanent for this video (comments disabled, video gone), False when a later
+# run could still succeed.
+def report_comment_error(video_id, e):
+    if e.resp.status == 403 and 'commentsDisabled' in str(e):
+        print(f"Comments are disabled for video ID: {video_id}")
+        return True
+    print(f"Error retrieving comments for video ID: {video_id} - {e}")
+    return e.resp.status == 404
+
+# Function to yield the comments of a single video one RecordBatch per page,
+# reporting disabled comments and API errors the same way for every caller
+def iter_video_comment_batches(video_id, limiter=None, include_replies=True):
+    try:
+        for batch, _ in iter_video_comment_pages(video_id, limiter, include_replies):
+            yield batch
+    except googleapiclient.errors.HttpError as e:
+        report_comment_error(video_id, e)
+
+# Function to retrieve the comments of a single video, used by the worker threads
+def video_comments(video_id, limiter=None):
+    return RecordBatch.concat(iter_video_comment_batches(video_id, limiter), records.COMMENT_FIELDS)
+
+# Function to retrieve comments information for all video IDs from YouTube.
+# Videos are fetched concurrently by `workers` threads sharing one global
+# requests-per-second limit; results keep the order of `video_IDS`.
+def comments_information(video_IDS, workers=COMMENT_WORKERS,
+                         requests_per_second=COMMENT_REQUESTS_PER_SECOND):
+    limiter = RateLimiter(requests_per_second) if requests_per_second else None
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return RecordBatch.concat(executor.map(lambda video_id: video_comments(video_id, limiter), video_IDS),
+                                  records.COMMENT_FIELDS)
+
+# Function to stream comments and replies for all video IDs as RecordBatches of
+# `chunk_size` rows (the last may be smaller). Worker threads page through videos
+# concurrently and hand pages over a bounded queue, so memory stays flat no
+# matter how many comments a video has. Chunks are not ordered by video.
+def iter_comment_chunks(video_IDS, chunk_size=COMMENT_CHUNK_SIZE, workers=COMMENT_WORKERS,
+                        requests_per_second=COMMENT_REQUESTS_PER_SECOND, include_replies=True):
+    limiter = RateLimiter(requests_per_second) if requests_per_second else None
+    workers = max(1, workers)
+    pending = queue.Queue(maxsize=workers * 2)
+    stop = threading.Event()
+    videos = iter(video_IDS)
+    videos_lock = threading.Lock()
+    finished = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker():
+        try:
+            while not stop.is_set():
+                with videos_lock:
+                    video_id = next(videos, None)
+                if video_id is None:
+                    break
+                for batch in iter_video_comment_batches(video_id, limiter, include_replies):
+                    if len(batch) and not put(batch):
+                        return
+        except Exception as e:
+            # Handed to the consumer, so a failed video fails the harvest
+            # instead of ending it with its comments missing
+            put(e)
+        finally:
+            put(finished)
+
+    def received():
+        running = workers
+        while running:
+            item = pending.get()
+            if item is finished:
+                running -= 1
+                continue
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
 
-    return comments_info
+    try:
+        yield from records.rebatch(received(), chunk_size)
+    finally:
+        # Also reached when the consumer stops iterating early
+        stop.set()
+        for thread in threads:
+            thread.join()
 
 
-# Function to connect to MySQL and create/use a database
-def connect_to_mysql():
+# Function to open a connection to the configured storage backend (see
+# storage.py); for MySQL it is borrowed from the shared pool. `local_infile`
+# enables LOAD DATA LOCAL INFILE for the bulk load mode.
+def connect_to_mysql(local_infile=False):
     try:
-        mydb = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="PASSWORD"
-        )
-        mycursor = mydb.cursor()
-        mycursor.execute('CREATE DATABASE IF NOT EXISTS youtube')
-        mycursor.execute('USE youtube')
-        print("Connected to MySQL and database 'youtube' is ready.")
-        return mydb
-    except mysql.connector.Error as err:
+        return storage.get_backend().connect(local_infile=local_infile)
+    except storage.Error as err:
         print(f"Error: {err}")
         return None
 
-# Function to create required tables
+# Function to create the required tables, bringing the schema up to the
+# latest version in migrations.py
 def create_tables():
     connection = connect_to_mysql()
     if connection is None:
@@ -182,69 +439,26 @@ def create_tables():
         return
 
     try:
-        cursor = connection.cursor()
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS channels (
-            channel_id VARCHAR(50) PRIMARY KEY,
-            channel_name VARCHAR(100),
-            channel_description TEXT,
-            channel_thumbnail VARCHAR(255),
-            channel_playlist_id VARCHAR(50),
-            channel_subscribers BIGINT,
-            channel_video_count INT,
-            channel_views BIGINT,
-            channel_publishedat DATETIME
-        );""")
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS playlist (
-            playlist_id VARCHAR(50) PRIMARY KEY,
-            playlist_name VARCHAR(100),
-            publishedat DATETIME,
-            channel_id VARCHAR(50),
-            channel_name VARCHAR(100),
-            videoscount BIGINT
-        );""")
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS videos (
-            video_id VARCHAR(50) PRIMARY KEY,
-            channel_id VARCHAR(50),
-            video_name VARCHAR(200),
-            video_description TEXT,
-            thumbnail VARCHAR(255),
-            tags TEXT,
-            publishedat DATETIME,
-            duration VARCHAR(20),
-            view_count BIGINT,
-            like_count INT,
-            favorite_count INT,
-            comment_count INT,
-            caption_status VARCHAR(50),
-            FOREIGN KEY (channel_id) REFERENCES channels(channel_id)
-        );""")
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS comments (
-            comment_id VARCHAR(50) PRIMARY KEY,
-            video_id VARCHAR(50),
-            comment_text TEXT,
-            comment_author VARCHAR(100),
-            comment_publishedat DATETIME,
-            FOREIGN KEY (video_id) REFERENCES videos(video_id)
-        );""")
-        connection.commit()
-        print("Tables created successfully.")
-    except mysql.connector.Error as err:
+        applied = migrations.migrate(connection)
+        print(f"Tables created successfully (schema version {migrations.LATEST_VERSION}, "
+              f"{len(applied)} migration(s) applied).")
+    except storage.Error as err:
         print(f"Error creating tables: {err}")
     finally:
-        cursor.close()
         connection.close()
 
-from datetime import datetime
-
 def convert_iso_to_mysql_datetime(iso_date):
     """
     Converts ISO 8601 format to MySQL-compatible datetime format.
+    Handles optional fractional seconds. Batches of API items are converted
+    column-wise by records.to_timestamps instead.
     """
-    return datetime.strptime(iso_date, "%Y-%m-%dT%H:%M:%SZ").strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        # Attempt to parse with fractional seconds
+        return datetime.strptime(iso_date, "%Y-%m-%dT%H:%M:%S.%fZ").strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        # Fallback to parse without fractional seconds
+        return datetime.strptime(iso_date, "%Y-%m-%dT%H:%M:%SZ").strftime("%Y-%m-%d %H:%M:%S")
 
 def insert_channel_data(channel_data):
     """
@@ -261,19 +475,8 @@ def insert_channel_data(channel_data):
         # Convert the datetime
         channel_publishedat = convert_iso_to_mysql_datetime(channel_data['channel_publishedat'])
 
-        query = """
-        INSERT INTO channels (channel_id, channel_name, channel_description, channel_thumbnail, 
-                              channel_playlist_id, channel_subscribers, channel_video_count, 
-                              channel_views, channel_publishedat)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ON DUPLICATE KEY UPDATE
-            channel_name = VALUES(channel_name),
-            channel_description = VALUES(channel_description),
-            channel_thumbnail = VALUES(channel_thumbnail),
-            channel_subscribers = VALUES(channel_subscribers),
-            channel_video_count = VALUES(channel_video_count),
-            channel_views = VALUES(channel_views);
-        """
+        query = storage.upsert_sql(storage.dialect_of(connection), 'channels', CHANNEL_COLUMNS, 1,
+                                   CHANNEL_UPDATE_COLUMNS)
         data = (
             channel_data['Channel_id'],
             channel_data['channel_name'],
@@ -285,162 +488,288 @@ def insert_channel_data(channel_data):
             int(channel_data['channel_views']),
             channel_publishedat  # Converted datetime
         )
+        # The statistics history is appended to in the same transaction
+        stats_history.record_channel_rows(cursor, CHANNEL_COLUMNS, [data])
+        start = time.perf_counter()
         cursor.execute(query, data)
-        connection.commit()
+        metrics.record_batch('channels', 1, time.perf_counter() - start)
+        bump_generation(connection)
         print(f"Channel '{channel_data['channel_name']}' inserted successfully.")
-    except mysql.connector.Error as err:
+    except storage.Error as err:
         print(f"Error inserting channel data: {err}")
     finally:
         cursor.close()
         connection.close()
-        
-def convert_iso_to_mysql_datetime(iso_date):
-    """
-    Converts ISO 8601 format to MySQL-compatible datetime format.
-    Handles optional fractional seconds.
-    """
-    try:
-        # Attempt to parse with fractional seconds
-        return datetime.strptime(iso_date, "%Y-%m-%dT%H:%M:%S.%fZ").strftime("%Y-%m-%d %H:%M:%S")
-    except ValueError:
-        # Fallback to parse without fractional seconds
-        return datetime.strptime(iso_date, "%Y-%m-%dT%H:%M:%SZ").strftime("%Y-%m-%d %H:%M:%S")
-
 
-def insert_playlist_data(playlist_data):
+# Function to list the stored videos of a channel whose statistics an
+# incremental harvest refreshes: everything published in the last `days` days
+# plus the `hot_limit` most viewed videos
+def refresh_window_video_ids(channel_id, days, hot_limit=0):
     connection = connect_to_mysql()
     if connection is None:
         print("Failed to connect to the database.")
-        return
+        return []
 
     try:
         cursor = connection.cursor()
-        query = """
-        INSERT INTO playlist (playlist_id, playlist_name, publishedat, channel_id, channel_name, videoscount)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        ON DUPLICATE KEY UPDATE
-            playlist_name = VALUES(playlist_name),
-            publishedat = VALUES(publishedat),
-            videoscount = VALUES(videoscount);
-        """
-        for playlist in playlist_data:
-            publishedat = convert_iso_to_mysql_datetime(playlist['publishedat'])
-            data = (
-                playlist['playlist_id'],
-                playlist['playlist_name'],
-                publishedat,  # Converted datetime
-                playlist['channel_ID'],
-                playlist['channel_name'],
-                int(playlist['videoscount'])
+        cutoff = (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+        cursor.execute(
+            "SELECT video_id FROM videos WHERE channel_id = %s AND publishedat >= %s ORDER BY publishedat DESC",
+            (channel_id, cutoff)
+        )
+        video_ids = [row[0] for row in cursor.fetchall()]
+        if hot_limit:
+            cursor.execute(
+                "SELECT video_id FROM videos WHERE channel_id = %s ORDER BY view_count DESC LIMIT %s",
+                (channel_id, hot_limit)
             )
-            cursor.execute(query, data)
-        connection.commit()
-        print("Playlist data inserted successfully.")
-    except mysql.connector.Error as err:
-        print(f"Error inserting playlist data: {err}")
-    finally:
+            video_ids.extend(row[0] for row in cursor.fetchall())
         cursor.close()
+        return list(dict.fromkeys(video_ids))
+    except storage.Error as err:
+        print(f"Error reading refresh window: {err}")
+        return []
+    finally:
         connection.close()
-def insert_video_data(video_data):
-    """
-    Inserts video data into the 'videos' table in MySQL.
-    """
-    connection = connect_to_mysql()
+
+# Rows per multi-row INSERT statement and rows between COMMITs in the bulk write path
+INSERT_CHUNK_SIZE = 1000
+COMMIT_EVERY = 10000
+
+# Columns of the loaded tables and the columns refreshed on a duplicate key
+CHANNEL_COLUMNS = ('channel_id', 'channel_name', 'channel_description', 'channel_thumbnail',
+                   'channel_playlist_id', 'channel_subscribers', 'channel_video_count', 'channel_views',
+                   'channel_publishedat')
+CHANNEL_UPDATE_COLUMNS = ('channel_name', 'channel_description', 'channel_thumbnail', 'channel_subscribers',
+                          'channel_video_count', 'channel_views')
+PLAYLIST_COLUMNS = ('playlist_id', 'playlist_name', 'publishedat', 'channel_id', 'channel_name', 'videoscount')
+PLAYLIST_UPDATE_COLUMNS = ('playlist_name', 'publishedat', 'videoscount')
+VIDEO_COLUMNS = ('video_id', 'channel_id', 'video_name', 'video_description', 'thumbnail', 'tags',
+                 'publishedat', 'duration', 'view_count', 'like_count', 'favorite_count', 'comment_count',
+                 'caption_status', 'duration_seconds')
+VIDEO_UPDATE_COLUMNS = ('view_count', 'like_count', 'comment_count')
+VIDEO_TAG_COLUMNS = ('video_id', 'tag')
+COMMENT_COLUMNS = ('comment_id', 'video_id', 'comment_text', 'comment_author', 'comment_publishedat')
+COMMENT_UPDATE_COLUMNS = ('comment_text', 'comment_author')
+
+# Function to upsert rows with multi-row INSERT ... ON DUPLICATE KEY UPDATE
+# (ON CONFLICT DO UPDATE on SQLite) statements of `chunk_size` rows, committing
+# every `commit_every` rows. Chunks are capped at the backend's placeholder limit.
+# `before_chunk(cursor, chunk)` runs in the same transaction before each chunk.
+def bulk_upsert(connection, table, columns, update_columns, rows,
+                chunk_size=INSERT_CHUNK_SIZE, commit_every=COMMIT_EVERY, before_chunk=None):
+    dialect = storage.dialect_of(connection)
+    chunk_size = max(1, min(chunk_size, storage.MAX_VARIABLES[dialect] // len(columns)))
+    cursor = connection.cursor()
+    total = 0
+    try:
+        uncommitted = 0
+        for chunk in chunk_list(rows, chunk_size):
+            if before_chunk is not None:
+                start = time.perf_counter()
+                before_chunk(cursor, chunk)
+                metrics.DB_BATCH_LATENCY.observe(time.perf_counter() - start, table='rollups')
+            query = storage.upsert_sql(dialect, table, columns, len(chunk), update_columns)
+            start = time.perf_counter()
+            cursor.execute(query, [value for row in chunk for value in row])
+            metrics.record_batch(table, len(chunk), time.perf_counter() - start)
+            total += len(chunk)
+            uncommitted += len(chunk)
+            if uncommitted >= commit_every:
+                timed_commit(connection, table)
+                uncommitted = 0
+        timed_commit(connection, table)
+    finally:
+        cursor.close()
+    return total
+
+# Function to escape one value for a tab separated LOAD DATA file
+def _infile_value(value):
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+# Function to upsert rows with LOAD DATA LOCAL INFILE for very large loads.
+# Rows are loaded into a temporary copy of the table and merged with
+# INSERT ... SELECT ... ON DUPLICATE KEY UPDATE, which keeps the same update
+# semantics as bulk_upsert (REPLACE would delete rows referenced by foreign keys).
+# The copy only has the columns and the primary key (the first column):
+# CREATE ... LIKE would also copy the FULLTEXT indexes of comments and videos,
+# which InnoDB does not allow on temporary tables.
+# `before_merge(cursor, staging)` runs in the same transaction before the merge.
+def bulk_upsert_infile(connection, table, columns, update_columns, rows, before_merge=None):
+    staging = f"{table}_staging"
+    update_clause = ", ".join(f"{column} = VALUES({column})" for column in update_columns)
+    column_list = ", ".join(columns)
+    cursor = connection.cursor()
+    fd, path = tempfile.mkstemp(prefix=f"{table}_", suffix=".tsv")
+    total = 0
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as infile:
+            for row in rows:
+                infile.write("\t".join(_infile_value(value) for value in row) + "\n")
+                total += 1
+
+        start = time.perf_counter()
+        cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {staging}")
+        cursor.execute(f"CREATE TEMPORARY TABLE {staging} (PRIMARY KEY ({columns[0]})) "
+                       f"SELECT {column_list} FROM {table} LIMIT 0")
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {staging} CHARACTER SET utf8mb4 "
+            f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' ({column_list})",
+            (path,)
+        )
+        if before_merge is not None:
+            before_merge(cursor, staging)
+        cursor.execute(
+            f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {staging} "
+            f"ON DUPLICATE KEY UPDATE {update_clause}"
+        )
+        cursor.execute(f"DROP TEMPORARY TABLE {staging}")
+        metrics.record_batch(table, total, time.perf_counter() - start)
+        timed_commit(connection, table)
+    finally:
+        cursor.close()
+        os.remove(path)
+    return total
+
+# Function to COMMIT and record the commit latency under `table`
+def timed_commit(connection, table):
+    start = time.perf_counter()
+    connection.commit()
+    metrics.DB_COMMIT_LATENCY.observe(time.perf_counter() - start, table=table)
+
+# Function to mark the warehouse as changed: bumps the generation counter that
+# keys the query result cache and commits
+def bump_generation(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute("UPDATE warehouse_generation SET generation = generation + 1 WHERE id = 1")
+        timed_commit(connection, 'warehouse_generation')
+    finally:
+        cursor.close()
+    query_cache.note_write()
+
+# Function to write rows through the multi-row INSERT path or, with
+# `load_data_infile=True`, through LOAD DATA LOCAL INFILE. Backends without
+# LOAD DATA (SQLite) always use the multi-row INSERT path.
+def _bulk_write(table, columns, update_columns, rows, chunk_size, commit_every, load_data_infile,
+                before_chunk=None, before_merge=None):
+    load_data_infile = load_data_infile and storage.get_backend().supports_load_data_infile
+    connection = connect_to_mysql(local_infile=load_data_infile)
     if connection is None:
         print("Failed to connect to the database.")
-        return
+        return None
 
     try:
-        cursor = connection.cursor()
-        query = """
-        INSERT INTO videos (video_id, channel_id, video_name, video_description, thumbnail, tags, 
-                            publishedat, duration, view_count, like_count, favorite_count, comment_count, caption_status)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ON DUPLICATE KEY UPDATE
-            view_count = VALUES(view_count),
-            like_count = VALUES(like_count),
-            comment_count = VALUES(comment_count);
-        """
-        for video in video_data:
-            data = (
-                video['video_id'],
-                video['channel_id'],
-                video['video_name'],
-                video['video_Description'],
-                video['Thumbnail'],
-                ','.join(video['Tags']) if video['Tags'] else None,
-                video['publishedAt'],
-                video['Duration'],
-                int(video['View_Count']),
-                int(video['Like_Count']) if video['Like_Count'] else None,
-                int(video['Favorite_Count']) if video['Favorite_Count'] else None,
-                int(video['Comment_Count']),
-                video['Caption_Status']
-            )
-            cursor.execute(query, data)
-        connection.commit()
-        print("Video data inserted successfully.")
-    except mysql.connector.Error as err:
-        print(f"Error inserting video data: {err}")
+        if load_data_infile:
+            written = bulk_upsert_infile(connection, table, columns, update_columns, rows, before_merge)
+        else:
+            written = bulk_upsert(connection, table, columns, update_columns, rows, chunk_size, commit_every,
+                                  before_chunk)
+        bump_generation(connection)
+        return written
     finally:
-        cursor.close()
         connection.close()
-def insert_comments_data(comments_data):
+
+# Function to build the video_tags rows of a video from its list of tags
+def video_tag_rows(video_id, tags):
+    tags = dict.fromkeys(tag.strip() for tag in tags or () if tag.strip())
+    return [(video_id, tag) for tag in tags]
+
+# Function to replace the normalized tags of `video_ids`; `tags` maps a video_id
+# to its list of tags. Returns the number of video_tags rows written.
+def replace_video_tags(cursor, video_ids, tags):
+    dialect = storage.dialect_of(cursor)
+    for chunk in chunk_list(video_ids, storage.MAX_VARIABLES[dialect]):
+        cursor.execute(f"DELETE FROM video_tags WHERE video_id IN ({', '.join(['%s'] * len(chunk))})", chunk)
+    rows = [row for video_id in video_ids for row in video_tag_rows(video_id, tags.get(video_id))]
+    for chunk in chunk_list(rows, storage.MAX_VARIABLES[dialect] // len(VIDEO_TAG_COLUMNS)):
+        cursor.execute(storage.upsert_sql(dialect, 'video_tags', VIDEO_TAG_COLUMNS, len(chunk), ('tag',)),
+                       [value for row in chunk for value in row])
+    return len(rows)
+
+def insert_playlist_data(playlist_data, chunk_size=INSERT_CHUNK_SIZE, commit_every=COMMIT_EVERY,
+                         load_data_infile=False):
     """
-    Inserts comment data into the 'comments' table in MySQL.
+    Inserts a RecordBatch of playlists into the 'playlist' table in MySQL.
     """
-    connection = connect_to_mysql()
-    if connection is None:
-        print("Failed to connect to the database.")
-        return
+    try:
+        written = _bulk_write('playlist', PLAYLIST_COLUMNS, PLAYLIST_UPDATE_COLUMNS,
+                              playlist_data.rows(PLAYLIST_COLUMNS),
+                              chunk_size, commit_every, load_data_infile)
+        if written is not None:
+            print(f"Playlist data inserted successfully ({written} rows).")
+        return written
+    except storage.Error as err:
+        print(f"Error inserting playlist data: {err}")
+        return None
+
+# Functions to fold a chunk of video rows, or a LOAD DATA staging table, into
+# the rollups, the statistics history and video_tags before it is written to
+# videos. `tags` maps a video_id to its list of tags.
+def _before_video_chunk(cursor, chunk, tags):
+    rollups.apply_video_chunk(cursor, VIDEO_COLUMNS, chunk)
+    stats_history.record_video_chunk(cursor, VIDEO_COLUMNS, chunk)
+    replace_video_tags(cursor, [row[0] for row in chunk], tags)
+
+def _before_video_merge(cursor, staging, tags):
+    rollups.apply_staged_videos(cursor, VIDEO_COLUMNS, staging)
+    stats_history.record_staged_videos(cursor, VIDEO_COLUMNS, staging)
+    replace_video_tags(cursor, list(tags), tags)
+
+def insert_video_data(video_data, chunk_size=INSERT_CHUNK_SIZE, commit_every=COMMIT_EVERY,
+                      load_data_infile=False):
+    """
+    Inserts a RecordBatch of videos into the 'videos' table and their tags into
+    'video_tags' in MySQL.
+    """
+    try:
+        # The dashboard rollups, the statistics history and the tags are
+        # updated in the same transactions as the rows
+        tags = dict(zip(video_data.column('video_id'), video_data.column('tag_list')))
+        written = _bulk_write('videos', VIDEO_COLUMNS, VIDEO_UPDATE_COLUMNS,
+                              video_data.rows(VIDEO_COLUMNS),
+                              chunk_size, commit_every, load_data_infile,
+                              before_chunk=lambda cursor, chunk: _before_video_chunk(cursor, chunk, tags),
+                              before_merge=lambda cursor, staging: _before_video_merge(cursor, staging, tags))
+        if written is None:
+            return None
+        tag_count = sum(len(video_tag_rows(video_id, video_tags)) for video_id, video_tags in tags.items())
+        print(f"Video data inserted successfully ({written} rows, {tag_count} tags).")
+        return written
+    except storage.Error as err:
+        print(f"Error inserting video data: {err}")
+        return None
 
+def insert_comments_data(comments_data, chunk_size=INSERT_CHUNK_SIZE, commit_every=COMMIT_EVERY,
+                         load_data_infile=False):
+    """
+    Inserts a RecordBatch of comments into the 'comments' table in MySQL.
+    """
     try:
-        cursor = connection.cursor()
-        query = """
-        INSERT INTO comments (comment_id, video_id, comment_text, comment_author, comment_publishedat)
-        VALUES (%s, %s, %s, %s, %s)
-        ON DUPLICATE KEY UPDATE
-            comment_text = VALUES(comment_text),
-            comment_author = VALUES(comment_author);
-        """
-        for comment in comments_data:
-            data = (
-                comment['comment_id'],
-                comment['video_id'],
-                comment['comment_text'],
-                comment['comment_author'],
-                comment['comment_publishedat']
-            )
-            cursor.execute(query, data)
-        connection.commit()
-        print("Comments data inserted successfully.")
-    except mysql.connector.Error as err:
+        written = _bulk_write('comments', COMMENT_COLUMNS, COMMENT_UPDATE_COLUMNS,
+                              comments_data.rows(COMMENT_COLUMNS),
+                              chunk_size, commit_every, load_data_infile)
+        if written is not None:
+            print(f"Comments data inserted successfully ({written} rows).")
+        return written
+    except storage.Error as err:
         print(f"Error inserting comments data: {err}")
-    finally:
-        cursor.close()
-        connection.close()
+        return None
 
 
 
 if __name__ == "__main__":
-    channel_id = "UClDuPFyU0XWwy5EviF8dEVw"
-
-    # Insert channel data
-    channel_data = channel_information(channel_id)
-    insert_channel_data(channel_data)
+    from pipeline import harvest_channel
 
-    # Insert playlist data
-    playlist_data = playlist_information(channel_id)
-    insert_playlist_data(playlist_data)
+    channel_id = "UClDuPFyU0XWwy5EviF8dEVw"
 
-    # Insert video data
-    video_ids = get_video_ids(channel_id)
-    video_data = video_information(video_ids)
-    insert_video_data(video_data)
+    # Stream channel, playlist, video and comment data into MySQL
+    def print_progress(stats):
+        print(" | ".join(f"{s['stage']}: {s['rows']} rows ({s['rows_per_second']}/s)" for s in stats))
 
-    # Insert comments data
-    comments_data = comments_information(video_ids)
-    insert_comments_data(comments_data)
+    harvest_channel(channel_id, on_progress=print_progress, progress_interval=5.0)
 
     print("All data inserted successfully into MySQL!")
-
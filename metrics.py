@@ -0,0 +1,331 @@
+import bisect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Process-wide counters and latency histograms for the harvest: every API
+# call (rate_limit.execute_with_backoff) and every warehouse write (main.py)
+# records into the metrics below. They are exposed in the Prometheus text
+# format, either as a file (YOUTUBE_METRICS_FILE, for node_exporter's textfile
+# collector; "{pid}" in the path is replaced by the process id) or over HTTP
+# (YOUTUBE_METRICS_PORT), and on the Operations page of the Streamlit app.
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Quota units per API request; every list call costs 1 and search.list 100
+QUOTA_COSTS = {"search": 100}
+DEFAULT_QUOTA_COST = 1
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {sorted(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self.samples().items())]
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, description, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            return {key: dict(buckets=list(counts), sum=total, count=count)
+                    for key, (counts, total, count) in self._series.items()}
+
+    # Function to estimate a quantile from the buckets by linear interpolation
+    # inside the bucket that holds it, like Prometheus' histogram_quantile()
+    def quantile(self, q, **labels):
+        series = self.samples().get(_label_key(self.labelnames, labels))
+        if series is None or not series["count"]:
+            return None
+        rank = q * series["count"]
+        seen = 0
+        for index, count in enumerate(series["buckets"]):
+            if count and seen + count >= rank:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def render(self):
+        lines = []
+        for key, series in sorted(self.samples().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series["buckets"]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series['count']}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+API_REQUESTS = Counter("youtube_api_requests_total", "YouTube API requests by endpoint and HTTP status "
+                       "(\"cached\" when served by the response cache)", ("endpoint", "status"))
+API_LATENCY = Histogram("youtube_api_request_seconds", "Latency of one YouTube API request attempt "
+                        "(cache hits excluded)", ("endpoint",))
+API_RETRIES = Counter("youtube_api_retries_total", "YouTube API requests retried after a transient error",
+                      ("endpoint", "status"))
+API_QUOTA_UNITS = Counter("youtube_api_quota_units_total", "YouTube API quota units spent", ("endpoint",))
+DB_ROWS = Counter("warehouse_rows_written_total", "Rows written to the warehouse", ("table",))
+DB_BATCH_LATENCY = Histogram("warehouse_batch_seconds", "Latency of one multi-row write statement", ("table",))
+DB_COMMIT_LATENCY = Histogram("warehouse_commit_seconds", "Latency of one COMMIT", ("table",))
+STAGE_ROWS = Counter("pipeline_stage_rows_total", "Rows produced by each harvest pipeline stage", ("stage",))
+STAGE_QUEUE_DEPTH = Gauge("pipeline_stage_queue_depth", "Chunks waiting in front of each pipeline stage",
+                          ("stage",))
+
+REGISTRY = [API_REQUESTS, API_LATENCY, API_RETRIES, API_QUOTA_UNITS, DB_ROWS, DB_BATCH_LATENCY,
+            DB_COMMIT_LATENCY, STAGE_ROWS, STAGE_QUEUE_DEPTH]
+
+
+# Function to name the endpoint of an API request: "youtube.videos.list" -> "videos"
+def request_endpoint(request):
+    method_id = getattr(request, "methodId", None)
+    if not method_id:
+        return "unknown"
+    parts = method_id.split(".")
+    return parts[1] if len(parts) > 2 else method_id
+
+
+def quota_cost(endpoint):
+    return QUOTA_COSTS.get(endpoint, DEFAULT_QUOTA_COST)
+
+
+# Function to record one API request attempt. Answers from the response cache
+# never reached the API, so they are only counted.
+def record_api_request(endpoint, seconds, status, cached=False):
+    API_REQUESTS.inc(endpoint=endpoint, status="cached" if cached else status)
+    if not cached:
+        API_LATENCY.observe(seconds, endpoint=endpoint)
+        API_QUOTA_UNITS.inc(quota_cost(endpoint), endpoint=endpoint)
+
+
+# Function to record one multi-row write of `rows` rows into `table`
+def record_batch(table, rows, seconds):
+    DB_ROWS.inc(rows, table=table)
+    DB_BATCH_LATENCY.observe(seconds, table=table)
+
+
+# Function to render every metric in the Prometheus text exposition format
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.description}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    for metric in REGISTRY:
+        metric.reset()
+
+
+# Function to write the metrics to `path`; the file is replaced atomically so
+# a scraper never reads half of it
+def write_textfile(path):
+    path = path.replace("{pid}", str(os.getpid()))
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as metrics_file:
+        metrics_file.write(render())
+    os.replace(temp_path, path)
+    return path
+
+
+_last_write = 0.0
+_write_lock = threading.Lock()
+
+
+# Function to write YOUTUBE_METRICS_FILE when it is set, at most every
+# `min_interval` seconds unless forced
+def write_textfile_from_env(min_interval=1.0, force=False):
+    global _last_write
+    path = os.environ.get("YOUTUBE_METRICS_FILE")
+    if not path:
+        return None
+    with _write_lock:
+        now = time.monotonic()
+        if not force and now - _last_write < min_interval:
+            return None
+        _last_write = now
+        return write_textfile(path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+# Function to serve /metrics on `port` from a daemon thread (once per process)
+def start_http_server(port, host=""):
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    return _server
+
+
+# Function to start the HTTP endpoint when YOUTUBE_METRICS_PORT is set
+def start_http_server_from_env():
+    port = os.environ.get("YOUTUBE_METRICS_PORT")
+    if port:
+        return start_http_server(int(port))
+    return None
+
+
+# Function to summarise the API metrics per endpoint for display
+def api_summary():
+    requests = API_REQUESTS.samples()
+    retries = API_RETRIES.samples()
+    quota = API_QUOTA_UNITS.samples()
+    latency = API_LATENCY.samples()
+    rows = []
+    for endpoint in sorted({name for name, _ in requests}):
+        by_status = {status: count for (name, status), count in requests.items() if name == endpoint}
+        series = latency.get((endpoint,), dict(sum=0.0, count=0))
+        rows.append(dict(
+            endpoint=endpoint,
+            requests=sum(by_status.values()),
+            cached=by_status.get("cached", 0),
+            errors=sum(count for status, count in by_status.items() if status not in ("200", "cached")),
+            retries=sum(count for (name, _), count in retries.items() if name == endpoint),
+            quota_units=quota.get((endpoint,), 0),
+            mean_ms=_milliseconds(series["sum"] / series["count"]) if series["count"] else None,
+            p50_ms=_milliseconds(API_LATENCY.quantile(0.5, endpoint=endpoint)),
+            p95_ms=_milliseconds(API_LATENCY.quantile(0.95, endpoint=endpoint)),
+        ))
+    return rows
+
+
+# Function to summarise the warehouse write metrics per table for display
+def write_summary():
+    written = DB_ROWS.samples()
+    batches = DB_BATCH_LATENCY.samples()
+    commits = DB_COMMIT_LATENCY.samples()
+    rows = []
+    for (table,) in sorted(set(batches) | set(commits)):
+        batch = batches.get((table,), dict(sum=0.0, count=0))
+        commit = commits.get((table,), dict(sum=0.0, count=0))
+        rows.append(dict(
+            table=table,
+            rows=written.get((table,), 0),
+            batches=batch["count"],
+            batch_seconds=round(batch["sum"], 3),
+            batch_p95_ms=_milliseconds(DB_BATCH_LATENCY.quantile(0.95, table=table)),
+            commits=commit["count"],
+            commit_seconds=round(commit["sum"], 3),
+            commit_p95_ms=_milliseconds(DB_COMMIT_LATENCY.quantile(0.95, table=table)),
+        ))
+    return rows
+
+
+# Function to list the rows and current queue depth of every pipeline stage
+def stage_summary():
+    depths = STAGE_QUEUE_DEPTH.samples()
+    return [dict(stage=stage, rows=count, queue_depth=depths.get((stage,)))
+            for (stage,), count in sorted(STAGE_ROWS.samples().items())]
+
+
+def _milliseconds(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
@@ -0,0 +1,237 @@
+from datetime import datetime
+
+import rollups
+import search
+import stats_history
+import storage
+
+# Versioned schema migrations for the warehouse. Each migration is a
+# (version, description, steps) tuple; a step is an SQL statement, a dict of
+# SQL statements keyed by dialect (see storage.py) or a function taking a
+# cursor. Applied versions are recorded in `schema_version`, so migrate() only
+# runs what a database has not seen yet.
+
+
+# Function to fill video_tags from the comma joined videos.tags column
+def _backfill_video_tags(cursor, batch_size=5000):
+    last_video_id = ""
+    while True:
+        cursor.execute(
+            "SELECT video_id, tags FROM videos WHERE video_id > %s AND tags IS NOT NULL "
+            "ORDER BY video_id LIMIT %s", (last_video_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        tag_rows = [(video_id, tag.strip()) for video_id, tags in rows
+                    for tag in tags.split(',') if tag.strip()]
+        if tag_rows:
+            cursor.executemany(storage.insert_ignore_sql(storage.dialect_of(cursor), "video_tags",
+                                                         ("video_id", "tag"), 1), tag_rows)
+        last_video_id = rows[-1][0]
+
+
+# Function to number comments in insertion order, so comment_analytics.py can
+# read only the comments stored since its last run. SQLite tables already
+# have one: the rowid.
+def _add_comment_sequence(cursor):
+    if storage.dialect_of(cursor) == "mysql":
+        cursor.execute("ALTER TABLE comments ADD COLUMN comment_seq BIGINT NOT NULL AUTO_INCREMENT UNIQUE")
+
+
+# Covering indexes for the dashboard queries in queries.py: ORDER BY ... LIMIT
+# queries read the first entries of an index, AVG/SUM and per-channel GROUP BY
+# scan a narrow index instead of the table rows.
+DASHBOARD_INDEXES = [
+    "CREATE INDEX idx_videos_view_count ON videos (view_count, video_name)",
+    "CREATE INDEX idx_videos_like_count ON videos (like_count, video_name)",
+    "CREATE INDEX idx_videos_comment_count ON videos (comment_count, video_name)",
+    "CREATE INDEX idx_videos_publishedat ON videos (publishedat, video_name)",
+    "CREATE INDEX idx_videos_channel_duration ON videos (channel_id, duration_seconds)",
+    "CREATE INDEX idx_channels_subscribers ON channels (channel_subscribers, channel_name)",
+    "CREATE INDEX idx_playlist_videoscount ON playlist (videoscount, playlist_name)",
+    "CREATE INDEX idx_comments_video ON comments (video_id, comment_publishedat)",
+]
+
+MIGRATIONS = [
+    (1, "base tables", [
+        """
+        CREATE TABLE IF NOT EXISTS channels (
+            channel_id VARCHAR(50) PRIMARY KEY,
+            channel_name VARCHAR(100),
+            channel_description TEXT,
+            channel_thumbnail VARCHAR(255),
+            channel_playlist_id VARCHAR(50),
+            channel_subscribers BIGINT,
+            channel_video_count INT,
+            channel_views BIGINT,
+            channel_publishedat DATETIME
+        );""",
+        """
+        CREATE TABLE IF NOT EXISTS playlist (
+            playlist_id VARCHAR(50) PRIMARY KEY,
+            playlist_name VARCHAR(100),
+            publishedat DATETIME,
+            channel_id VARCHAR(50),
+            channel_name VARCHAR(100),
+            videoscount BIGINT
+        );""",
+        """
+        CREATE TABLE IF NOT EXISTS videos (
+            video_id VARCHAR(50) PRIMARY KEY,
+            channel_id VARCHAR(50),
+            video_name VARCHAR(200),
+            video_description TEXT,
+            thumbnail VARCHAR(255),
+            tags TEXT,
+            publishedat DATETIME,
+            duration VARCHAR(20),
+            view_count BIGINT,
+            like_count INT,
+            favorite_count INT,
+            comment_count INT,
+            caption_status VARCHAR(50),
+            FOREIGN KEY (channel_id) REFERENCES channels(channel_id)
+        );""",
+        """
+        CREATE TABLE IF NOT EXISTS comments (
+            comment_id VARCHAR(50) PRIMARY KEY,
+            video_id VARCHAR(50),
+            comment_text TEXT,
+            comment_author VARCHAR(100),
+            comment_publishedat DATETIME,
+            FOREIGN KEY (video_id) REFERENCES videos(video_id)
+        );""",
+    ]),
+    (2, "numeric video duration", [
+        "ALTER TABLE videos ADD COLUMN duration_seconds INT",
+        {
+            "mysql": "UPDATE videos SET duration_seconds = TIME_TO_SEC(duration) WHERE duration IS NOT NULL",
+            # duration is stored as H:MM:SS
+            "sqlite": "UPDATE videos SET duration_seconds = "
+                      "CAST(substr(duration, 1, instr(duration, ':') - 1) AS INTEGER) * 3600 "
+                      "+ CAST(substr(duration, -5, 2) AS INTEGER) * 60 "
+                      "+ CAST(substr(duration, -2) AS INTEGER) WHERE duration IS NOT NULL",
+        },
+    ]),
+    (3, "dashboard indexes", DASHBOARD_INDEXES),
+    (4, "normalized video tags", [
+        """
+        CREATE TABLE IF NOT EXISTS video_tags (
+            video_id VARCHAR(50),
+            tag VARCHAR(255),
+            PRIMARY KEY (video_id, tag),
+            FOREIGN KEY (video_id) REFERENCES videos(video_id)
+        );""",
+        "CREATE INDEX idx_video_tags_tag ON video_tags (tag)",
+        _backfill_video_tags,
+    ]),
+    # Single-row counter bumped by every warehouse write; the query result
+    # cache in query_cache.py keys its entries by it
+    (5, "warehouse generation", [
+        """
+        CREATE TABLE IF NOT EXISTS warehouse_generation (
+            id TINYINT PRIMARY KEY,
+            generation BIGINT NOT NULL
+        );""",
+        {dialect: f"{insert_ignore} INTO warehouse_generation (id, generation) VALUES (1, 0)"
+         for dialect, insert_ignore in storage.INSERT_IGNORE.items()},
+    ]),
+    (6, "dashboard rollups", rollups.ROLLUP_TABLES + [rollups.rebuild_rollups]),
+    # Lets the engagement density chart scan an index instead of the table
+    (7, "engagement index", [
+        "CREATE INDEX idx_videos_engagement ON videos (like_count, comment_count)",
+    ]),
+    # Change-only history of video and channel statistics, seeded with the
+    # stored values as the baseline
+    (8, "statistics history", stats_history.HISTORY_SCHEMA + [stats_history.seed_history]),
+    # FULLTEXT indexes on MySQL, FTS5 tables on SQLite
+    (9, "full-text search", [search.create_search_indexes]),
+    # Offline comment sentiment, language and keywords (comment_analytics.py)
+    # and their per-video sums
+    (10, "comment analytics", [
+        """
+        CREATE TABLE IF NOT EXISTS comment_analytics (
+            comment_id VARCHAR(50) PRIMARY KEY,
+            video_id VARCHAR(50),
+            sentiment FLOAT,
+            sentiment_label VARCHAR(10),
+            language VARCHAR(8),
+            keywords VARCHAR(255),
+            analyzed_at DATETIME
+        );""",
+        """
+        CREATE TABLE IF NOT EXISTS video_sentiment (
+            video_id VARCHAR(50) PRIMARY KEY,
+            analyzed_comments BIGINT NOT NULL DEFAULT 0,
+            positive BIGINT NOT NULL DEFAULT 0,
+            neutral BIGINT NOT NULL DEFAULT 0,
+            negative BIGINT NOT NULL DEFAULT 0,
+            sentiment_sum DOUBLE NOT NULL DEFAULT 0
+        );""",
+        "CREATE INDEX idx_comment_analytics_video ON comment_analytics (video_id, language)",
+        "CREATE INDEX idx_video_sentiment_comments ON video_sentiment (analyzed_comments)",
+    ]),
+    # Insertion order of comments and the last one the analytics stage read
+    (11, "comment analytics high-water mark", [
+        _add_comment_sequence,
+        """
+        CREATE TABLE IF NOT EXISTS comment_analytics_progress (
+            id TINYINT PRIMARY KEY,
+            last_comment_seq BIGINT NOT NULL
+        );""",
+        {dialect: f"{insert_ignore} INTO comment_analytics_progress (id, last_comment_seq) VALUES (1, 0)"
+         for dialect, insert_ignore in storage.INSERT_IGNORE.items()},
+    ]),
+    # Keyset paging of the video browser (queries.VIDEO_BROWSER_NEXT_PAGE)
+    (12, "video browser index", [
+        "CREATE INDEX idx_videos_browser ON videos (view_count, video_id)",
+    ]),
+    # When the analytics stage last checked every comment for missing analytics
+    (13, "comment analytics backfill time", [
+        "ALTER TABLE comment_analytics_progress ADD COLUMN last_backfill_at DATETIME",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# Function to read the schema version of a database (0 when never migrated)
+def current_version(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INT PRIMARY KEY,
+        description VARCHAR(200),
+        applied_at DATETIME
+    );""")
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return cursor.fetchone()[0]
+
+
+# Function to apply every pending migration in order. Returns the versions applied.
+def migrate(connection):
+    dialect = storage.dialect_of(connection)
+    cursor = connection.cursor()
+    applied = []
+    try:
+        version = current_version(cursor)
+        for migration_version, description, steps in MIGRATIONS:
+            if migration_version <= version:
+                continue
+            for step in steps:
+                if callable(step):
+                    step(cursor)
+                elif isinstance(step, dict):
+                    cursor.execute(step[dialect])
+                else:
+                    cursor.execute(step)
+            cursor.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (%s, %s, %s)",
+                (migration_version, description, datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")))
+            connection.commit()
+            applied.append(migration_version)
+            print(f"Applied schema migration {migration_version}: {description}")
+        # Monthly partitions of the statistics history (MySQL) for the months ahead
+        stats_history.ensure_partitions(cursor)
+    finally:
+        cursor.close()
+    return applied
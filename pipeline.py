@@ -0,0 +1,382 @@
+import queue
+import threading
+import time
+
+from main import (
+    COMMENT_REQUESTS_PER_SECOND,
+    VIDEO_BATCH_SIZE,
+    chunk_list,
+    channel_information,
+    playlist_information,
+    iter_video_id_page_tokens,
+    iter_new_video_id_pages,
+    refresh_window_video_ids,
+    fetch_videos_batched,
+    iter_video_comment_pages,
+    report_comment_error,
+    insert_channel_data,
+    insert_playlist_data,
+    insert_video_data,
+    insert_comments_data,
+)
+from googleapiclient.errors import HttpError
+
+import metrics
+from rate_limit import RateLimiter
+from records import COMMENT_FIELDS, RecordBatch, rebatch
+from state_store import StateStore
+
+# Rows written per insert_* call; every batch is committed, so a channel
+# becomes queryable while it is still being harvested
+PIPELINE_BATCH_SIZE = 500
+# Maximum number of chunks waiting between two stages
+PIPELINE_QUEUE_SIZE = 8
+PIPELINE_COMMENT_WORKERS = 4
+# Incremental harvests refresh statistics and comments of videos published in
+# the last INCREMENTAL_REFRESH_DAYS days plus the INCREMENTAL_HOT_LIMIT most viewed
+INCREMENTAL_REFRESH_DAYS = 7
+INCREMENTAL_HOT_LIMIT = 50
+
+# Marks the end of a stage's output in the queue to the next stage
+_DONE = object()
+
+
+# Row counters for one pipeline stage
+class StageStats:
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.rows = 0
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def add(self, rows):
+        with self._lock:
+            self.rows += rows
+
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    def rows_per_second(self):
+        elapsed = self.elapsed()
+        return self.rows / elapsed if elapsed else 0.0
+
+    def as_dict(self, queue_depth=None):
+        return dict(
+            stage=self.name,
+            workers=self.workers,
+            rows=self.rows,
+            seconds=round(self.elapsed(), 2),
+            rows_per_second=round(self.rows_per_second(), 1),
+            queue_depth=queue_depth,
+            finished=self.finished_at is not None,
+        )
+
+
+# One stage of a linear pipeline. `func` takes an iterator over the chunks
+# produced by the previous stage (or nothing, for the source) and yields lists
+# of rows for the next one. With several workers, each worker thread runs its
+# own `func` over the shared inbox.
+class Stage:
+    def __init__(self, pipeline, name, func, workers=1):
+        self.pipeline = pipeline
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.stats = StageStats(name, workers)
+        self.inbox = None
+        self.outbox = None
+        self.next_stage = None
+        self._running = workers
+        self._lock = threading.Lock()
+
+    def _inputs(self):
+        while True:
+            try:
+                item = self.inbox.get(timeout=0.1)
+            except queue.Empty:
+                if self.pipeline.stopped.is_set():
+                    return
+                continue
+            if item is _DONE:
+                return
+            yield item
+
+    def _put(self, item):
+        while not self.pipeline.stopped.is_set():
+            try:
+                self.outbox.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        try:
+            outputs = self.func() if self.inbox is None else self.func(self._inputs())
+            for rows in outputs:
+                self.stats.add(len(rows))
+                metrics.STAGE_ROWS.inc(len(rows), stage=self.name)
+                if self.outbox is not None and not self._put(rows):
+                    break
+        except Exception as e:
+            self.pipeline.fail(self.name, e)
+        finally:
+            with self._lock:
+                self._running -= 1
+                last = self._running == 0
+            if last:
+                self.stats.finished_at = time.perf_counter()
+                # One end marker for every worker of the next stage
+                if self.next_stage is not None:
+                    for _ in range(self.next_stage.workers):
+                        self._put(_DONE)
+
+
+# A chain of stages connected by bounded queues, so fetching, transforming and
+# writing overlap and never hold more than `queue_size` chunks in between.
+class Pipeline:
+    def __init__(self, queue_size=PIPELINE_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.stages = []
+        self.stopped = threading.Event()
+        self.errors = []
+
+    def add_stage(self, name, func, workers=1):
+        stage = Stage(self, name, func, workers)
+        if self.stages:
+            previous = self.stages[-1]
+            previous.outbox = stage.inbox = queue.Queue(maxsize=self.queue_size)
+            previous.next_stage = stage
+        self.stages.append(stage)
+        return stage
+
+    def fail(self, stage_name, error):
+        self.errors.append((stage_name, error))
+        self.stopped.set()
+
+    def stats(self):
+        stats = []
+        for stage in self.stages:
+            queue_depth = stage.inbox.qsize() if stage.inbox is not None else None
+            if queue_depth is not None:
+                metrics.STAGE_QUEUE_DEPTH.set(queue_depth, stage=stage.name)
+            stats.append(stage.stats.as_dict(queue_depth))
+        return stats
+
+    # Run every stage to completion. `on_progress` is called from the calling
+    # thread every `progress_interval` seconds with the current stage stats.
+    def run(self, on_progress=None, progress_interval=1.0):
+        threads = []
+        for stage in self.stages:
+            stage.stats.started_at = time.perf_counter()
+            for n in range(stage.workers):
+                thread = threading.Thread(target=stage._run, name=f"{stage.name}-{n}", daemon=True)
+                threads.append(thread)
+                thread.start()
+
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=progress_interval / len(threads))
+                stats = self.stats()
+                if on_progress is not None:
+                    on_progress(stats)
+                metrics.write_textfile_from_env(progress_interval)
+        finally:
+            self.stopped.set()
+            for thread in threads:
+                thread.join()
+
+        if on_progress is not None:
+            on_progress(self.stats())
+        if self.errors:
+            stage_name, error = self.errors[0]
+            raise RuntimeError(f"Pipeline stage '{stage_name}' failed: {error}") from error
+        return self.stats()
+
+
+# The RecordBatch of one commentThreads page of a video, plus the token of the
+# page after it (None when it was the last page)
+class CommentPage:
+    def __init__(self, batch, video_id, next_page_token):
+        self.batch = batch
+        self.video_id = video_id
+        self.next_page_token = next_page_token
+
+    def __len__(self):
+        return len(self.batch)
+
+
+# Function to group whole comment pages into batches of at least `size` rows
+# (the last may be smaller), so a page is never split across two commits
+def group_pages(pages, size):
+    batch = []
+    rows = 0
+    for page in pages:
+        batch.append(page)
+        rows += len(page)
+        if rows >= size:
+            yield batch
+            batch = []
+            rows = 0
+    if batch:
+        yield batch
+
+
+# Function to harvest a channel into MySQL as a streaming pipeline:
+#   video ID pages -> video details -> video writes -> comments -> comment writes
+# Channel and playlist rows are small and written first, so the foreign keys of
+# the videos table are satisfied. Comments are only fetched for videos that are
+# already stored. Returns the per-stage stats.
+#
+# With `incremental=True` only uploads newer than the channel's stored watermark
+# are fetched, followed by a statistics refresh of the recent/hot window.
+#
+# Progress is checkpointed in the state store (state_store.py) as it is
+# committed: listed video ID pages with the next listing page token, committed
+# video batches, and for each video the next comment page after the last
+# committed one. If the process dies (quota exhausted, network failure), the
+# next harvest of the channel resumes from those checkpoints instead of page one.
+def harvest_channel(channel_id, batch_size=PIPELINE_BATCH_SIZE, queue_size=PIPELINE_QUEUE_SIZE,
+                    comment_workers=PIPELINE_COMMENT_WORKERS,
+                    requests_per_second=COMMENT_REQUESTS_PER_SECOND,
+                    on_progress=None, progress_interval=1.0,
+                    incremental=False, refresh_days=INCREMENTAL_REFRESH_DAYS,
+                    hot_limit=INCREMENTAL_HOT_LIMIT, state=None, limiter=None):
+    state = state or StateStore()
+    run_id, resumed = state.start_run(channel_id, "incremental" if incremental else "full")
+    run = state.get_run(run_id)
+
+    if resumed and run['uploads_playlist_id']:
+        print(f"Resuming interrupted harvest of channel {channel_id} (run {run_id}).")
+        uploads_playlist_id = run['uploads_playlist_id']
+    else:
+        channel_data = channel_information(channel_id)
+        insert_channel_data(channel_data)
+        insert_playlist_data(playlist_information(channel_id))
+        uploads_playlist_id = channel_data['channel_playlist_id']
+        state.set_run_playlist(run_id, uploads_playlist_id)
+
+    # A limiter passed in is shared with other harvests running in parallel
+    if limiter is None and requests_per_second:
+        limiter = RateLimiter(requests_per_second)
+
+    if incremental:
+        watermark = state.get_watermark(channel_id)
+        watermark['uploads_playlist_id'] = uploads_playlist_id
+        refresh_ids = refresh_window_video_ids(channel_id, refresh_days, hot_limit)
+
+        # The delta listing is short, so a resumed incremental run lists it
+        # again; IDs the run already recorded are skipped
+        def list_new_pages():
+            for page in iter_new_video_id_pages(channel_id, watermark):
+                new_ids = state.record_id_page(run_id, page, None, listing_done=False)
+                if new_ids:
+                    yield new_ids
+            for page in chunk_list(refresh_ids, VIDEO_BATCH_SIZE):
+                new_ids = state.record_id_page(run_id, page, None, listing_done=False)
+                if new_ids:
+                    yield new_ids
+            # Every listed ID is now checkpointed and will be finished by this
+            # run or its resumption, so the watermark can move on
+            if 'next' in watermark:
+                state.save_watermark(channel_id, **watermark['next'])
+            state.mark_listing_done(run_id)
+    else:
+        # The first listing page gives the watermark the next incremental run
+        # starts from. It is kept with the run, so a listing resumed past the
+        # first page still has it, and saved once the whole listing is stored.
+        def list_new_pages():
+            listing_watermark = {}
+            for page, next_page_token in iter_video_id_page_tokens(channel_id, uploads_playlist_id,
+                                                                   run['next_page_token'], listing_watermark):
+                if listing_watermark:
+                    state.set_run_watermark(run_id, **listing_watermark)
+                    listing_watermark.clear()
+                new_ids = state.record_id_page(run_id, page, next_page_token,
+                                               listing_done=next_page_token is None)
+                if next_page_token is None:
+                    run_watermark = state.get_run_watermark(run_id)
+                    if run_watermark is not None:
+                        state.save_watermark(channel_id, uploads_playlist_id, **run_watermark)
+                if new_ids:
+                    yield new_ids
+
+    def video_id_pages():
+        # Listed before an interruption but not committed yet
+        yield from chunk_list(state.pending_video_ids(run_id), VIDEO_BATCH_SIZE)
+        if not run['listing_done']:
+            yield from list_new_pages()
+
+    def fetch_videos(id_pages):
+        for video_ids in id_pages:
+            video_info, missing_ids = fetch_videos_batched(video_ids)
+            if missing_ids:
+                print(f"{len(missing_ids)} video(s) missing or deleted: {', '.join(missing_ids)}")
+                state.mark_videos_done(run_id, missing_ids)
+                state.record_comment_pages(run_id, dict.fromkeys(missing_ids))
+            yield video_info
+
+    def write_videos(video_chunks):
+        for batch in rebatch(video_chunks, batch_size):
+            if insert_video_data(batch) is None:
+                raise RuntimeError("Writing video data failed")
+            video_ids = batch.column('video_id')
+            state.mark_videos_done(run_id, video_ids)
+            yield video_ids
+
+    # Stored videos whose comments were incomplete when the run stopped
+    resume_comment_ids = iter(state.pending_comment_video_ids(run_id))
+    resume_lock = threading.Lock()
+
+    def next_resume_video():
+        with resume_lock:
+            return next(resume_comment_ids, None)
+
+    def video_comment_pages(video_id):
+        try:
+            page_token = state.comment_page_token(run_id, video_id)
+            for batch, next_page_token in iter_video_comment_pages(video_id, limiter, page_token=page_token):
+                yield CommentPage(batch, video_id, next_page_token)
+        except HttpError as e:
+            if e.resp.status == 403 and ('quotaExceeded' in str(e) or 'dailyLimitExceeded' in str(e)):
+                raise
+            if report_comment_error(video_id, e):
+                # Nothing more to fetch for this video
+                yield CommentPage(RecordBatch.empty(COMMENT_FIELDS), video_id, None)
+
+    def fetch_comments(video_id_batches):
+        video_id = next_resume_video()
+        while video_id is not None:
+            yield from video_comment_pages(video_id)
+            video_id = next_resume_video()
+        for video_ids in video_id_batches:
+            for video_id in video_ids:
+                yield from video_comment_pages(video_id)
+
+    def write_comments(comment_pages):
+        for pages in group_pages(comment_pages, batch_size):
+            rows = RecordBatch.concat((page.batch for page in pages), COMMENT_FIELDS)
+            if rows and insert_comments_data(rows) is None:
+                raise RuntimeError("Writing comments data failed")
+            # Pages of one video arrive in order, so the last token wins
+            state.record_comment_pages(run_id, {page.video_id: page.next_page_token for page in pages})
+            yield rows
+
+    pipeline = Pipeline(queue_size)
+    pipeline.add_stage("video_id_pages", video_id_pages)
+    pipeline.add_stage("fetch_videos", fetch_videos)
+    pipeline.add_stage("write_videos", write_videos)
+    pipeline.add_stage("fetch_comments", fetch_comments, workers=comment_workers)
+    pipeline.add_stage("write_comments", write_comments)
+    try:
+        stats = pipeline.run(on_progress, progress_interval)
+    finally:
+        metrics.write_textfile_from_env(force=True)
+
+    state.finish_run(run_id)
+    return stats
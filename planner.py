@@ -0,0 +1,267 @@
+import argparse
+import heapq
+import itertools
+import math
+import sys
+from datetime import datetime, timedelta
+
+from googleapiclient.errors import HttpError
+
+import main
+import metrics
+import storage
+from quota import QuotaExhausted, is_quota_error, pool_of
+from state_store import StateStore
+
+# Quota-aware harvester for many channels:
+#   python planner.py channels.txt --budget 9000 [--dry-run]
+# The planner estimates what each piece of work will cost in API units and
+# runs it from a priority queue, most useful data first:
+#   1. new uploads of every channel
+#   2. statistics of stored videos not refreshed for STALE_AFTER_HOURS
+#   3. comments of videos whose comment count grew since their last harvest
+# Work that does not fit the remaining budget is deferred; when the API keys
+# run out mid-item (QuotaExhausted from a key pool, or a quotaExceeded 403 with
+# a single key) the run pauses. Every item commits as it goes and is planned
+# again from the warehouse next time, so nothing is lost.
+
+PRIORITY_NEW_VIDEOS = 0
+PRIORITY_STALE_STATS = 1
+PRIORITY_COMMENTS = 2
+KIND_NAMES = {PRIORITY_NEW_VIDEOS: "new videos", PRIORITY_STALE_STATS: "stale statistics",
+              PRIORITY_COMMENTS: "comments"}
+
+STALE_AFTER_HOURS = 24
+# Results per page of playlistItems/videos (50) and commentThreads (100)
+VIDEO_PAGE_SIZE = 50
+COMMENT_PAGE_SIZE = 100
+
+
+# Function to estimate the units of fetching the comments of a video. Replies
+# beyond the five returned inline cost extra comments().list pages, which the
+# comment count cannot tell apart, so this is a lower bound.
+def comment_units(comment_count):
+    return max(1, math.ceil((comment_count or 0) / COMMENT_PAGE_SIZE))
+
+
+class HarvestPlanner:
+    def __init__(self, state=None, budget=None, stale_after_hours=STALE_AFTER_HOURS):
+        self.state = state or StateStore()
+        self.budget = budget
+        self.stale_after = timedelta(hours=stale_after_hours)
+        self.pool = pool_of(main.youtube)
+        self._queue = []
+        self._sequence = itertools.count()
+        self._spent_at_start = self._units_spent()
+        self.done = []
+        self.deferred = []
+        self.paused = None
+
+    @staticmethod
+    def _units_spent():
+        return sum(metrics.API_QUOTA_UNITS.samples().values())
+
+    def spent(self):
+        return self._units_spent() - self._spent_at_start
+
+    # Function to return the units this run may still spend: the smaller of
+    # the budget left and the quota left on the key pool (None = unlimited)
+    def remaining(self):
+        limits = []
+        if self.budget is not None:
+            limits.append(self.budget - self.spent())
+        if self.pool is not None:
+            limits.append(self.pool.remaining())
+        return min(limits) if limits else None
+
+    def _push(self, priority, units, channel_id, **work):
+        item = dict(kind=priority, units=units, channel_id=channel_id, **work)
+        heapq.heappush(self._queue, (priority, next(self._sequence), item))
+
+    # Function to plan the work of every channel. Costs one channels().list
+    # unit per channel, which also refreshes the stored channel row unless
+    # `write` is False (a dry run).
+    def plan(self, channel_ids, write=True):
+        for channel_id in channel_ids:
+            channel_data = main.channel_information(channel_id)
+            if write:
+                main.insert_channel_data(channel_data)
+            stored = storage.get_backend().query(
+                "SELECT video_id, comment_count FROM videos WHERE channel_id = %s ORDER BY publishedat DESC",
+                (channel_id,))
+
+            new_videos = max(0, int(channel_data['channel_video_count']) - len(stored))
+            if new_videos or not stored:
+                pages = math.ceil(new_videos / VIDEO_PAGE_SIZE)
+                # Listing pages plus videos().list pages, and the playlists on a first harvest
+                self._push(PRIORITY_NEW_VIDEOS, max(1, 2 * pages) + (0 if stored else 1), channel_id,
+                           channel_data=channel_data, first_harvest=not stored)
+
+            refreshed_at = self.state.stats_refreshed_at(channel_id)
+            if stored and (refreshed_at is None
+                           or datetime.strptime(refreshed_at, "%Y-%m-%d %H:%M:%S") < datetime.utcnow() - self.stale_after):
+                self._push(PRIORITY_STALE_STATS, math.ceil(len(stored) / VIDEO_PAGE_SIZE), channel_id,
+                           video_ids=[row['video_id'] for row in stored])
+
+            self._plan_comments(channel_id, {row['video_id']: row['comment_count'] for row in stored})
+
+    # Function to queue the comments of the videos whose comment count grew
+    # since their comments were last harvested (newest videos first)
+    def _plan_comments(self, channel_id, comment_counts):
+        harvested = self.state.harvested_comment_counts(list(comment_counts))
+        for video_id, comment_count in comment_counts.items():
+            comment_count = int(comment_count or 0)
+            if comment_count and comment_count > harvested.get(video_id, 0):
+                self._push(PRIORITY_COMMENTS, comment_units(comment_count), channel_id,
+                           video_id=video_id, comment_count=comment_count)
+
+    def summary(self):
+        totals = {}
+        for _, _, item in self._queue:
+            count, units = totals.get(item['kind'], (0, 0))
+            totals[item['kind']] = (count + 1, units + item['units'])
+        return [dict(work=KIND_NAMES[kind], items=count, estimated_units=units)
+                for kind, (count, units) in sorted(totals.items())]
+
+    # Function to run the queued work in priority order. Items that do not fit
+    # the remaining quota are deferred; running out of quota pauses the run.
+    def run(self):
+        while self._queue:
+            _, _, item = heapq.heappop(self._queue)
+            remaining = self.remaining()
+            if remaining is not None and item['units'] > remaining:
+                self.deferred.append(item)
+                continue
+            try:
+                self._run_item(item)
+                self.done.append(item)
+            except QuotaExhausted as e:
+                self._pause(item, str(e))
+            except HttpError as e:
+                # A single key reports its exhausted quota as a 403
+                if not is_quota_error(e):
+                    raise
+                self._pause(item, f"API quota exceeded: {e}")
+
+    # Function to defer the item being run and everything still queued
+    def _pause(self, item, reason):
+        self.paused = reason
+        self.deferred.append(item)
+        self.deferred.extend(entry[2] for entry in self._queue)
+        self._queue = []
+
+    def _run_item(self, item):
+        if item['kind'] == PRIORITY_NEW_VIDEOS:
+            self._harvest_new_videos(item)
+        elif item['kind'] == PRIORITY_STALE_STATS:
+            self._refresh_statistics(item)
+        else:
+            self._harvest_comments(item)
+
+    def _store_videos(self, video_ids):
+        video_info, _ = main.fetch_videos_batched(video_ids)
+        if video_info and main.insert_video_data(video_info) is None:
+            raise RuntimeError("Writing video data failed")
+        return video_info
+
+    # New uploads since the channel's watermark; the watermark only moves once
+    # every new video is stored. Their comments are queued afterwards.
+    def _harvest_new_videos(self, item):
+        channel_id = item['channel_id']
+        if item['first_harvest']:
+            main.insert_playlist_data(main.playlist_information(channel_id))
+        watermark = self.state.get_watermark(channel_id)
+        watermark['uploads_playlist_id'] = item['channel_data']['channel_playlist_id']
+        counts = {}
+        for page in main.iter_new_video_id_pages(channel_id, watermark):
+            video_info = self._store_videos(page)
+            counts.update(zip(video_info.column('video_id'), video_info.column('comment_count')))
+        if 'next' in watermark:
+            self.state.save_watermark(channel_id, **watermark['next'])
+        self._plan_comments(channel_id, counts)
+
+    def _refresh_statistics(self, item):
+        counts = {}
+        for video_ids in main.chunk_list(item['video_ids'], VIDEO_PAGE_SIZE):
+            video_info = self._store_videos(video_ids)
+            counts.update(zip(video_info.column('video_id'), video_info.column('comment_count')))
+        self.state.mark_stats_refreshed(item['channel_id'])
+        # Videos whose comment count grew since planning
+        queued = {entry[2].get('video_id') for entry in self._queue}
+        self._plan_comments(item['channel_id'],
+                            {video_id: count for video_id, count in counts.items() if video_id not in queued})
+
+    def _harvest_comments(self, item):
+        try:
+            for rows, _ in main.iter_video_comment_pages(item['video_id']):
+                if rows and main.insert_comments_data(rows) is None:
+                    raise RuntimeError("Writing comments data failed")
+        except HttpError as e:
+            if not main.report_comment_error(item['video_id'], e):
+                raise
+        self.state.mark_comments_harvested(item['video_id'], item['comment_count'])
+
+
+def print_plan(planner):
+    for row in planner.summary():
+        print(f"  {row['work']:<17} {row['items']:>6} item(s)  ~{row['estimated_units']} units")
+
+
+def print_key_usage(planner):
+    if planner.pool is None:
+        return
+    for row in planner.pool.usage():
+        state = "exhausted" if row['exhausted'] else f"{row['remaining']} left"
+        print(f"  key {row['key_id']}: {row['units']} units used, {state}")
+
+
+def main_cli(argv=None):
+    from harvest_cli import read_channel_ids
+
+    parser = argparse.ArgumentParser(description="Harvest channels within the daily YouTube API quota")
+    parser.add_argument("channels_file", help="file with one channel ID per line")
+    parser.add_argument("--budget", type=int, default=None,
+                        help="units this run may spend (default: whatever the API keys have left)")
+    parser.add_argument("--stale-hours", type=float, default=STALE_AFTER_HOURS,
+                        help="refresh video statistics older than this")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only print the plan; still spends one unit per channel, writes nothing")
+    args = parser.parse_args(argv)
+
+    channel_ids = read_channel_ids(args.channels_file)
+    if not channel_ids:
+        print("No channel IDs found.")
+        return 1
+
+    planner = HarvestPlanner(budget=args.budget, stale_after_hours=args.stale_hours)
+    try:
+        planner.plan(channel_ids, write=not args.dry_run)
+    except QuotaExhausted as e:
+        print(f"Quota exhausted while planning: {e}")
+        return 1
+    except HttpError as e:
+        if not is_quota_error(e):
+            raise
+        print(f"Quota exhausted while planning: {e}")
+        return 1
+    remaining = planner.remaining()
+    print(f"Plan for {len(channel_ids)} channel(s), "
+          f"{'unlimited' if remaining is None else remaining} units available:")
+    print_plan(planner)
+    print_key_usage(planner)
+    if args.dry_run:
+        return 0
+
+    planner.run()
+    print(f"Done: {len(planner.done)} item(s), {planner.spent()} units spent.")
+    if planner.deferred:
+        units = sum(item['units'] for item in planner.deferred)
+        print(f"Deferred: {len(planner.deferred)} item(s), ~{units} units; run again when quota is available.")
+    if planner.paused:
+        print(f"Paused: {planner.paused}")
+    print_key_usage(planner)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,145 @@
+# The dashboard questions computed from the raw tables. Every query is served
+# by an index from migrations.py; the schema benchmark times them.
+RAW_DASHBOARD_QUERIES = {
+    "Top 10 Most Viewed Videos": "SELECT video_name, view_count FROM videos ORDER BY view_count DESC LIMIT 10;",
+    "Channel with Most Subscribers": "SELECT channel_name, channel_subscribers FROM channels ORDER BY channel_subscribers DESC LIMIT 1;",
+    "Top 10 Videos by Likes": "SELECT video_name, like_count FROM videos ORDER BY like_count DESC LIMIT 10;",
+    "Average Views per Video": "SELECT AVG(view_count) AS average_views FROM videos;",
+    "Videos Count per Channel": "SELECT c.channel_name, v.video_count FROM (SELECT channel_id, COUNT(*) AS video_count FROM videos GROUP BY channel_id) v JOIN channels c ON c.channel_id = v.channel_id ORDER BY v.video_count DESC;",
+    "Top 5 Most Commented Videos": "SELECT video_name, comment_count FROM videos ORDER BY comment_count DESC LIMIT 5;",
+    "Total Number of Comments": "SELECT SUM(comment_count) AS total_comments FROM videos;",
+    "Playlists with Most Videos": "SELECT playlist_name, videoscount FROM playlist ORDER BY videoscount DESC LIMIT 5;",
+    "Total Videos Across All Channels": "SELECT SUM(channel_video_count) AS total_videos FROM channels;",
+    "Newest Videos by Publish Date": "SELECT video_name, publishedat FROM videos ORDER BY publishedat DESC LIMIT 10;",
+    "Average Duration per Channel": "SELECT c.channel_name, v.average_minutes FROM (SELECT channel_id, AVG(duration_seconds) / 60 AS average_minutes FROM videos GROUP BY channel_id) v JOIN channels c ON c.channel_id = v.channel_id ORDER BY v.average_minutes DESC;",
+    "Top 10 Tags": "SELECT tag, COUNT(*) AS video_count FROM video_tags GROUP BY tag ORDER BY video_count DESC LIMIT 10;",
+}
+
+# The same questions answered from the rollup tables in rollups.py, which the
+# "Query and Visualize Data" page uses; their cost does not grow with the
+# number of videos. The averages multiply by 1.0 first, since dividing one
+# integer total by another truncates on SQLite.
+DASHBOARD_QUERIES = dict(RAW_DASHBOARD_QUERIES, **{
+    "Top 10 Most Viewed Videos": "SELECT video_name, view_count FROM video_leaderboard WHERE metric = 'view_count' ORDER BY view_count DESC LIMIT 10;",
+    "Top 10 Videos by Likes": "SELECT video_name, like_count FROM video_leaderboard WHERE metric = 'like_count' ORDER BY like_count DESC LIMIT 10;",
+    "Average Views per Video": "SELECT SUM(total_views) * 1.0 / NULLIF(SUM(video_count), 0) AS average_views FROM channel_rollup;",
+    "Videos Count per Channel": "SELECT c.channel_name, r.video_count FROM channel_rollup r JOIN channels c ON c.channel_id = r.channel_id WHERE r.video_count > 0 ORDER BY r.video_count DESC;",
+    "Top 5 Most Commented Videos": "SELECT video_name, comment_count FROM video_leaderboard WHERE metric = 'comment_count' ORDER BY comment_count DESC LIMIT 5;",
+    "Total Number of Comments": "SELECT SUM(total_comments) AS total_comments FROM channel_rollup;",
+    "Average Duration per Channel": "SELECT c.channel_name, r.total_duration_seconds * 1.0 / r.video_count / 60 AS average_minutes FROM channel_rollup r JOIN channels c ON c.channel_id = r.channel_id WHERE r.video_count > 0 ORDER BY average_minutes DESC;",
+})
+
+# Queries behind the "Visualize the Data" charts
+TOP_LIKED_VIDEOS = """
+    SELECT video_name, like_count, comment_count, view_count
+    FROM video_leaderboard
+    WHERE metric = 'like_count'
+    ORDER BY like_count DESC
+    LIMIT 10;
+"""
+VIDEOS_PER_DAY = """
+    SELECT publish_date, video_count
+    FROM daily_uploads
+    WHERE video_count > 0
+    ORDER BY publish_date;
+"""
+
+# Engagement chart: video counts per log-scale (likes, comments) grid cell,
+# computed in the database, plus the leaderboard videos drawn as points
+ENGAGEMENT_DENSITY = """
+    SELECT FLOOR(LOG10(like_count) * %s) AS like_bin,
+           FLOOR(LOG10(comment_count) * %s) AS comment_bin,
+           COUNT(*) AS video_count
+    FROM videos
+    WHERE like_count > 0 AND comment_count > 0
+    GROUP BY like_bin, comment_bin;
+"""
+ENGAGEMENT_OUTLIERS = """
+    SELECT DISTINCT video_id, video_name, like_count, comment_count
+    FROM video_leaderboard
+    WHERE like_count > 0 AND comment_count > 0;
+"""
+
+# Video browser pages, most viewed first. The next page continues after the
+# last row of the previous one (keyset paging on idx_videos_browser, whose
+# columns are the sort key), so every page costs the same. Ties are broken by
+# the primary key rather than video_name, which may be NULL and would drop
+# rows from the row comparison.
+VIDEO_BROWSER_COLUMNS = "video_id, video_name, view_count, like_count, comment_count, publishedat"
+VIDEO_BROWSER_FIRST_PAGE = f"""
+    SELECT {VIDEO_BROWSER_COLUMNS}
+    FROM videos
+    ORDER BY view_count DESC, video_id DESC
+    LIMIT %s;
+"""
+VIDEO_BROWSER_NEXT_PAGE = f"""
+    SELECT {VIDEO_BROWSER_COLUMNS}
+    FROM videos
+    WHERE (view_count, video_id) < (%s, %s)
+    ORDER BY view_count DESC, video_id DESC
+    LIMIT %s;
+"""
+
+# Growth views over the statistics history in stats_history.py. The first
+# parameter is the first day of the window. Per-day totals come from the
+# daily_growth sums; the per-video and per-channel views read only the history
+# rows of the window (a range of the (captured_on, ...) primary key). The unary
+# plus in GROUP BY +id keeps the planner from walking the whole per-item
+# history index to group instead.
+DAILY_GROWTH = """
+    SELECT captured_on, views_gained, likes_gained, comments_gained
+    FROM daily_growth
+    WHERE captured_on >= %s
+    ORDER BY captured_on;
+"""
+# Videos that gained the most views in the window, with the views per day and
+# the growth relative to the views they had before the window
+FASTEST_GROWING_VIDEOS = """
+    SELECT v.video_name, g.views_gained, g.views_gained * 1.0 / %s AS views_per_day, g.view_count,
+           g.views_gained * 1.0 / NULLIF(g.view_count - g.views_gained, 0) AS growth_rate
+    FROM (SELECT video_id, SUM(views_gained) AS views_gained, MAX(view_count) AS view_count
+          FROM video_stats_history
+          WHERE captured_on >= %s
+          GROUP BY +video_id
+          ORDER BY views_gained DESC
+          LIMIT %s) g
+    JOIN videos v ON v.video_id = g.video_id
+    ORDER BY g.views_gained DESC;
+"""
+CHANNEL_GROWTH = """
+    SELECT c.channel_name, g.subscribers_gained, g.views_gained, g.videos_gained, c.channel_subscribers
+    FROM (SELECT channel_id, SUM(subscribers_gained) AS subscribers_gained, SUM(views_gained) AS views_gained,
+                 SUM(videos_gained) AS videos_gained
+          FROM channel_stats_history
+          WHERE captured_on >= %s
+          GROUP BY +channel_id) g
+    JOIN channels c ON c.channel_id = g.channel_id
+    ORDER BY g.subscribers_gained DESC, g.views_gained DESC;
+"""
+# Comment analytics (comment_analytics.py): the videos with the most analyzed
+# comments and their sentiment label counts from the video_sentiment sums
+VIDEO_SENTIMENT = """
+    SELECT s.video_id, v.video_name, s.analyzed_comments, s.positive, s.neutral, s.negative,
+           s.sentiment_sum / s.analyzed_comments AS average_sentiment
+    FROM (SELECT video_id, analyzed_comments, positive, neutral, negative, sentiment_sum
+          FROM video_sentiment
+          ORDER BY analyzed_comments DESC
+          LIMIT %s) s
+    LEFT JOIN videos v ON v.video_id = s.video_id
+    ORDER BY s.analyzed_comments DESC;
+"""
+# Languages of the analyzed comments of one video (idx_comment_analytics_video)
+VIDEO_COMMENT_LANGUAGES = """
+    SELECT language, COUNT(*) AS comments
+    FROM comment_analytics
+    WHERE video_id = %s
+    GROUP BY language
+    ORDER BY comments DESC;
+"""
+# The recorded history of one video (idx_video_stats_history_video)
+VIDEO_HISTORY = """
+    SELECT captured_on, view_count, like_count, comment_count, views_gained
+    FROM video_stats_history
+    WHERE video_id = %s
+    ORDER BY captured_on;
+"""
@@ -0,0 +1,121 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+# Default size limit of the query result cache and how often the warehouse
+# generation is re-read from the database
+QUERY_CACHE_MAX_BYTES = 64 * 1024 * 1024
+GENERATION_POLL_SECONDS = 5.0
+
+# Writes made by this process, so its own harvests invalidate the cache
+# without waiting for the next generation poll
+_local_writes = 0
+_local_writes_lock = threading.Lock()
+
+
+# Function to record a warehouse write made by this process
+def note_write():
+    global _local_writes
+    with _local_writes_lock:
+        _local_writes += 1
+
+
+# In-memory LRU cache of query results, shared by every thread of a process.
+# Results are keyed by (generation, query, params), where the generation is a
+# counter every insert_*_data call bumps in the warehouse; a harvest therefore
+# makes all older results unreachable and they age out of the LRU. When the
+# generation cannot be read results are not cached.
+class QueryCache:
+    def __init__(self, read_generation, max_bytes=QUERY_CACHE_MAX_BYTES,
+                 poll_seconds=GENERATION_POLL_SECONDS):
+        self.read_generation = read_generation
+        self.max_bytes = max_bytes
+        self.poll_seconds = poll_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._generation = None
+        self._generation_read_at = None
+        self._seen_local_writes = None
+
+    # Function to return the current warehouse generation, re-reading it at
+    # most every `poll_seconds` or right after a local write
+    def generation(self):
+        now = time.monotonic()
+        with self._lock:
+            stale = (self._generation_read_at is None
+                     or now - self._generation_read_at >= self.poll_seconds
+                     or self._seen_local_writes != _local_writes)
+            if not stale:
+                return self._generation
+            local_writes = _local_writes
+        generation = self.read_generation()
+        with self._lock:
+            if generation != self._generation:
+                self._drop_older(generation)
+            self._generation = generation
+            self._generation_read_at = now
+            self._seen_local_writes = local_writes
+        return generation
+
+    # Function to return the rows of a query, calling run(query, params) on a miss
+    def fetch(self, query, params, run):
+        generation = self.generation()
+        if generation is None:
+            self.misses += 1
+            return run(query, params)
+
+        key = (generation, query, tuple(params))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        rows = run(query, params)
+        size = len(pickle.dumps(rows, protocol=pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return rows
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old[1]
+            self._entries[key] = (rows, size)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                self.evictions += 1
+        return rows
+
+    # Drop the results of earlier generations; they can never be hit again
+    def _drop_older(self, generation):
+        for key in [key for key in self._entries if key[0] != generation]:
+            self._total_bytes -= self._entries.pop(key)[1]
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries)
+            total_bytes = self._total_bytes
+        lookups = self.hits + self.misses
+        return dict(
+            generation=self._generation,
+            entries=entries,
+            bytes=total_bytes,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            hit_rate=self.hits / lookups if lookups else 0.0,
+        )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+            self._generation_read_at = None
@@ -0,0 +1,176 @@
+import hashlib
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+from googleapiclient.errors import HttpError
+
+import metrics
+from state_store import StateStore
+
+# Daily quota of the YouTube Data API, spread over a pool of API keys:
+#   YOUTUBE_API_KEYS=key1,key2,key3   (or YOUTUBE_API_KEYS_FILE, one key per line)
+#   YOUTUBE_DAILY_QUOTA=10000         units per key and day
+# Quota is granted per Google Cloud project, so every key should belong to its
+# own project. Units are reserved in the state store (state_store.py) before a
+# request is sent, which keeps the count right across threads and processes.
+# When every key is spent, requests raise QuotaExhausted; the harvest stops and
+# resumes from its checkpoints on the next quota day.
+
+DAILY_QUOTA_UNITS = int(os.environ.get("YOUTUBE_DAILY_QUOTA", 10000))
+
+# 403 reasons meaning the key has no quota left today
+QUOTA_EXCEEDED_REASONS = ("quotaExceeded", "dailyLimitExceeded")
+
+
+class QuotaExhausted(Exception):
+    pass
+
+
+# Function to tell whether an HttpError means the key has no quota left today
+def is_quota_error(error):
+    return error.resp.status == 403 and any(reason in str(error) for reason in QUOTA_EXCEEDED_REASONS)
+
+
+# Function to return the current quota day. Quota resets at midnight Pacific Time.
+def quota_day(now=None):
+    try:
+        from zoneinfo import ZoneInfo
+        pacific = ZoneInfo("America/Los_Angeles")
+    except Exception:
+        # No time zone database: Pacific Standard Time is close enough
+        pacific = timezone(timedelta(hours=-8))
+    return (now or datetime.now(timezone.utc)).astimezone(pacific).strftime("%Y-%m-%d")
+
+
+# Function to name a key in the state store and in reports without storing it
+def key_id(key):
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:12]
+
+
+# Pool of API keys with per-key daily quota accounting
+class KeyPool:
+    def __init__(self, keys, daily_units=DAILY_QUOTA_UNITS, state=None):
+        keys = list(dict.fromkeys(key for key in keys if key))
+        if not keys:
+            raise ValueError("KeyPool needs at least one API key")
+        self.keys = keys
+        self.daily_units = daily_units
+        self.state = state or StateStore()
+        self._ids = {key: key_id(key) for key in keys}
+
+    # Function to reserve `units` on the key with the most quota left. Returns
+    # the key; raises QuotaExhausted when no key can afford the units.
+    def reserve(self, units):
+        day = quota_day()
+        usage = self.state.quota_usage(day)
+        candidates = sorted(self.keys, key=lambda key: usage.get(self._ids[key], (0, False))[0])
+        for key in candidates:
+            if self.state.reserve_quota(day, self._ids[key], units, self.daily_units):
+                return key
+        raise QuotaExhausted(f"All {len(self.keys)} API key(s) have used their {self.daily_units} "
+                             f"units for {day}")
+
+    def mark_exhausted(self, key):
+        self.state.exhaust_quota(quota_day(), self._ids[key])
+
+    # Function to list the usage of every key today
+    def usage(self):
+        day = quota_day()
+        usage = self.state.quota_usage(day)
+        rows = []
+        for key in self.keys:
+            units, exhausted = usage.get(self._ids[key], (0, False))
+            rows.append(dict(key_id=self._ids[key], units=units, exhausted=exhausted,
+                             remaining=0 if exhausted else max(0, self.daily_units - units)))
+        return rows
+
+    def remaining(self):
+        return sum(row['remaining'] for row in self.usage())
+
+
+# Wraps one discovery client per key behind the `youtube.<resource>().list(...)`
+# interface. The key is chosen when a request is executed, so a request built
+# on one key can be sent on another after the first one runs out.
+class RotatingYouTube:
+    def __init__(self, pool, build_client):
+        self.pool = pool
+        self._build_client = build_client
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def client(self, key):
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = self._build_client(key)
+            return self._clients[key]
+
+    def __getattr__(self, resource):
+        if resource.startswith("_"):
+            raise AttributeError(resource)
+
+        def resource_accessor():
+            return _RotatingResource(self, resource)
+        return resource_accessor
+
+
+class _RotatingResource:
+    def __init__(self, api, resource):
+        self._api = api
+        self._resource = resource
+
+    def list(self, **params):
+        return _RotatingRequest(self._api, self._resource, params)
+
+
+class _RotatingRequest:
+    def __init__(self, api, resource, params):
+        self._api = api
+        self._resource = resource
+        self._params = params
+        self.headers = {}
+        self.methodId = f"youtube.{resource}.list"
+
+    def execute(self, http=None, num_retries=0):
+        units = metrics.quota_cost(self._resource)
+        while True:
+            key = self._api.pool.reserve(units)
+            request = getattr(self._api.client(key), self._resource)().list(**self._params)
+            request.headers.update(self.headers)
+            try:
+                return request.execute(http=http, num_retries=num_retries)
+            except HttpError as e:
+                if is_quota_error(e):
+                    # Our count was behind the API's; try the next key
+                    self._api.pool.mark_exhausted(key)
+                    continue
+                raise
+
+
+# Function to find the key pool behind a client, looking through wrappers such
+# as the response cache (api_cache.CachedYouTube); None for a single-key client
+def pool_of(client):
+    while client is not None:
+        if isinstance(client, RotatingYouTube):
+            return client.pool
+        client = getattr(client, "_client", None)
+    return None
+
+
+# Function to read the API keys from YOUTUBE_API_KEYS or YOUTUBE_API_KEYS_FILE
+def keys_from_env():
+    keys = [key.strip() for key in os.environ.get("YOUTUBE_API_KEYS", "").split(",")]
+    path = os.environ.get("YOUTUBE_API_KEYS_FILE")
+    if path:
+        with open(path, encoding="utf-8") as keys_file:
+            keys += [line.split("#", 1)[0].strip() for line in keys_file]
+    return [key for key in keys if key]
+
+
+# Function to return a key-rotating client when API keys are configured in the
+# environment, or a plain client for `default_key` otherwise
+def client_from_env(build_client, default_key):
+    keys = keys_from_env()
+    if not keys:
+        return build_client(default_key)
+    return RotatingYouTube(KeyPool(keys), build_client)
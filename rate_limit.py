@@ -0,0 +1,72 @@
+import random
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+import metrics
+
+
+# HTTP statuses worth retrying: per-user rate limits (403/429) and server errors
+RETRY_STATUSES = {403, 429, 500, 502, 503, 504}
+
+# 403 reasons that will not go away by waiting, so they are never retried
+PERMANENT_403_REASONS = ("commentsDisabled", "quotaExceeded", "dailyLimitExceeded", "forbidden")
+
+
+# Token bucket shared by every worker thread. Each acquire() reserves the next
+# free slot under the lock and sleeps outside of it, so waiting threads do not
+# block each other.
+class RateLimiter:
+    def __init__(self, requests_per_second, burst=None):
+        if requests_per_second <= 0:
+            raise ValueError("requests_per_second must be positive")
+        self.rate = float(requests_per_second)
+        self.burst = float(burst if burst is not None else max(1.0, requests_per_second))
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+
+# Function to decide whether a failed API call should be retried
+def is_retryable(error):
+    status = error.resp.status
+    if status not in RETRY_STATUSES:
+        return False
+    if status == 403 and any(reason in str(error) for reason in PERMANENT_403_REASONS):
+        return False
+    return True
+
+
+# Function to execute an API request with the rate limiter and exponential
+# backoff (with jitter) on 403/429/5xx responses. Every attempt is recorded
+# in metrics.py.
+def execute_with_backoff(request, limiter=None, max_retries=5, base_delay=1.0, max_delay=32.0,
+                         **execute_kwargs):
+    endpoint = metrics.request_endpoint(request)
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        start = time.perf_counter()
+        try:
+            response = request.execute(**execute_kwargs)
+            metrics.record_api_request(endpoint, time.perf_counter() - start, 200,
+                                       cached=getattr(request, "served_from_cache", False))
+            return response
+        except HttpError as e:
+            metrics.record_api_request(endpoint, time.perf_counter() - start, e.resp.status)
+            if attempt == max_retries or not is_retryable(e):
+                raise
+            metrics.API_RETRIES.inc(endpoint=endpoint, status=e.resp.status)
+            delay = min(max_delay, base_delay * 2 ** attempt)
+            time.sleep(delay * random.uniform(0.5, 1.0))
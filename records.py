@@ -0,0 +1,215 @@
+import re
+
+import numpy as np
+
+# Columnar record batches for harvested data. A batch holds one page (or
+# several concatenated pages) of API results as one numpy array per warehouse
+# column instead of one dict per row, typed once per column:
+#   timestamps  "2024-01-02T03:04:05Z"  -> datetime64[s]
+#   durations   "PT1H2M3S"              -> "01:02:03" and 3723 seconds
+#   counts      "123"                   -> int64 (missing like/favorite counts
+#                                          are masked and written as NULL)
+#   text        object arrays holding the strings of the API response
+# The column names are the warehouse column names, so insert_*_data() in
+# main.py write a batch with batch.rows(COLUMNS); to_frame() returns a pandas
+# DataFrame for analysis.
+
+PLAYLIST_FIELDS = ('playlist_id', 'playlist_name', 'publishedat', 'channel_id', 'channel_name', 'videoscount')
+# tag_list keeps the tags of each video as a list for the video_tags table
+VIDEO_FIELDS = ('video_id', 'channel_id', 'video_name', 'video_description', 'thumbnail', 'tags',
+                'publishedat', 'duration', 'view_count', 'like_count', 'favorite_count', 'comment_count',
+                'caption_status', 'duration_seconds', 'tag_list')
+COMMENT_FIELDS = ('comment_id', 'video_id', 'comment_text', 'comment_author', 'comment_publishedat')
+
+# ISO 8601 durations as the API returns them; anything else (e.g. "P0D" for
+# live streams) counts as 00:00:00
+DURATION_REGEX = re.compile(r'PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?')
+NO_DURATION = ('0', '0', '0')
+
+
+class RecordBatch:
+    def __init__(self, columns):
+        self.columns = columns
+
+    # Function to build a batch from lists or arrays of equal length
+    @classmethod
+    def from_columns(cls, columns):
+        return cls({name: values if isinstance(values, np.ndarray) else object_array(values)
+                    for name, values in columns.items()})
+
+    @classmethod
+    def empty(cls, fields):
+        return cls({field: object_array([]) for field in fields})
+
+    # Function to concatenate batches of the same fields into one; `fields`
+    # names the columns of the result when there is nothing to concatenate
+    @classmethod
+    def concat(cls, batches, fields=()):
+        batches = [batch for batch in batches if len(batch)]
+        if not batches:
+            return cls.empty(fields)
+        if len(batches) == 1:
+            return batches[0]
+        columns = {}
+        for name in batches[0].columns:
+            parts = [batch.columns[name] for batch in batches]
+            if any(isinstance(part, np.ma.MaskedArray) for part in parts):
+                columns[name] = np.ma.concatenate(parts)
+            else:
+                columns[name] = np.concatenate(parts)
+        return cls(columns)
+
+    def __len__(self):
+        for values in self.columns.values():
+            return len(values)
+        return 0
+
+    @property
+    def fields(self):
+        return tuple(self.columns)
+
+    # Function to return one column as a list of Python values (None for
+    # NULL), timestamps formatted for the warehouse
+    def column(self, name):
+        values = self.columns[name]
+        if values.dtype.kind == 'M':
+            return np.char.replace(np.datetime_as_string(values, unit='s'), 'T', ' ').tolist()
+        return values.tolist()
+
+    # Function to return the rows as tuples of `columns`, ready for executemany
+    # or a multi-row INSERT
+    def rows(self, columns):
+        return zip(*(self.column(name) for name in columns))
+
+    def slice(self, start, stop):
+        return RecordBatch({name: values[start:stop] for name, values in self.columns.items()})
+
+    # Function to return the rows as dicts, e.g. for display
+    def records(self):
+        return [dict(zip(self.fields, row)) for row in self.rows(self.fields)]
+
+    # Function to return the batch as a pandas DataFrame (masked counts become
+    # nullable Int64 columns)
+    def to_frame(self):
+        import pandas as pd
+
+        frame = {}
+        for name, values in self.columns.items():
+            if isinstance(values, np.ma.MaskedArray):
+                values = pd.arrays.IntegerArray(values.filled(0), np.ma.getmaskarray(values))
+            frame[name] = values
+        return pd.DataFrame(frame)
+
+
+# Function to build a 1-d object array; np.array() would turn lists of equally
+# long lists (tags) into a 2-d array
+def object_array(values):
+    array = np.empty(len(values), dtype=object)
+    if any(isinstance(value, list) for value in values):
+        for index, value in enumerate(values):
+            array[index] = value
+    else:
+        array[:] = values
+    return array
+
+
+# Function to regroup batches into batches of exactly `size` rows (the last
+# may be shorter)
+def rebatch(batches, size):
+    buffer = []
+    buffered = 0
+    for batch in batches:
+        if not len(batch):
+            continue
+        buffer.append(batch)
+        buffered += len(batch)
+        if buffered < size:
+            continue
+        combined = RecordBatch.concat(buffer)
+        start = 0
+        while buffered - start >= size:
+            yield combined.slice(start, start + size)
+            start += size
+        buffer = [combined.slice(start, buffered)] if start < buffered else []
+        buffered -= start
+    if buffer:
+        yield RecordBatch.concat(buffer)
+
+
+# Function to convert API timestamps ("...Z", with or without fractional
+# seconds) to datetime64[s]. numpy parses and validates the whole column at
+# once; fractional seconds are dropped like strptime did.
+def to_timestamps(values):
+    return np.array([value[:19] for value in values], dtype='datetime64[s]')
+
+
+# Function to convert API count strings to int64; missing counts (None) are masked
+def to_counts(values):
+    if None not in values:
+        return np.array(values, dtype=np.int64)
+    mask = np.array([value is None for value in values])
+    return np.ma.masked_array(np.array([0 if value is None else value for value in values], dtype=np.int64),
+                              mask=mask)
+
+
+# Function to convert ISO 8601 durations to "HH:MM:SS" strings and seconds
+def to_durations(values):
+    if not values:
+        return object_array([]), np.zeros(0, dtype=np.int64)
+    matches = (DURATION_REGEX.match(value) for value in values)
+    parts = np.array([match.groups('0') if match else NO_DURATION for match in matches],
+                     dtype=np.int64).reshape(-1, 3)
+    padded = [np.char.zfill(parts[:, n].astype(str), 2) for n in range(3)]
+    text = np.char.add(np.char.add(np.char.add(np.char.add(padded[0], ':'), padded[1]), ':'), padded[2])
+    return text.astype(object), parts @ np.array([3600, 60, 1], dtype=np.int64)
+
+
+# Function to build a batch from playlists().list items
+def playlist_batch(items):
+    snippets = [i['snippet'] for i in items]
+    return RecordBatch.from_columns(dict(
+        playlist_id=[i['id'] for i in items],
+        playlist_name=[s['title'] for s in snippets],
+        publishedat=to_timestamps([s['publishedAt'] for s in snippets]),
+        channel_id=[s['channelId'] for s in snippets],
+        channel_name=[s['channelTitle'] for s in snippets],
+        videoscount=to_counts([i['contentDetails']['itemCount'] for i in items]),
+    ))
+
+
+# Function to build a batch from videos().list items
+def video_batch(items):
+    snippets = [i['snippet'] for i in items]
+    statistics = [i['statistics'] for i in items]
+    tag_lists = [s.get('tags') for s in snippets]
+    duration, duration_seconds = to_durations([i['contentDetails']['duration'] for i in items])
+    return RecordBatch.from_columns(dict(
+        video_id=[i['id'] for i in items],
+        channel_id=[s['channelId'] for s in snippets],
+        video_name=[s['title'] for s in snippets],
+        video_description=[s['description'] for s in snippets],
+        thumbnail=[s['thumbnails']['default']['url'] for s in snippets],
+        tags=[','.join(tags) if tags else None for tags in tag_lists],
+        publishedat=to_timestamps([s['publishedAt'] for s in snippets]),
+        duration=duration,
+        view_count=to_counts([s.get('viewCount', 0) for s in statistics]),
+        like_count=to_counts([s.get('likeCount') for s in statistics]),
+        favorite_count=to_counts([s.get('favoriteCount') for s in statistics]),
+        comment_count=to_counts([s.get('commentCount', 0) for s in statistics]),
+        caption_status=[i['contentDetails'].get('caption') for i in items],
+        duration_seconds=duration_seconds,
+        tag_list=tag_lists,
+    ))
+
+
+# Function to build a batch from (video_id, comment) pairs, where a comment is
+# a comment resource: the topLevelComment of a thread or a reply
+def comment_batch(entries):
+    snippets = [comment['snippet'] for _, comment in entries]
+    return RecordBatch.from_columns(dict(
+        comment_id=[comment['id'] for _, comment in entries],
+        video_id=[video_id for video_id, _ in entries],
+        comment_text=[s['textDisplay'] for s in snippets],
+        comment_author=[s['authorDisplayName'] for s in snippets],
+        comment_publishedat=to_timestamps([s['publishedAt'] for s in snippets]),
+    ))
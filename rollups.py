@@ -0,0 +1,269 @@
+import argparse
+import math
+import sys
+from collections import defaultdict
+
+import storage
+from queries import DASHBOARD_QUERIES, RAW_DASHBOARD_QUERIES
+
+# Rollup tables behind the dashboard, kept up to date by the video write path:
+#   channel_rollup     per-channel video count and view/like/comment/duration totals
+#   daily_uploads      videos published per day
+#   video_leaderboard  the top LEADERBOARD_SIZE videos per metric
+# apply_video_chunk() turns one chunk of video upserts into deltas in the same
+# transaction as the chunk; rebuild_rollups() recomputes everything from the
+# raw tables and check_rollups() reports where the two disagree.
+
+LEADERBOARD_SIZE = 100
+LEADERBOARD_METRICS = ('view_count', 'like_count', 'comment_count')
+LEADERBOARD_COLUMNS = ('metric', 'video_id', 'video_name', 'view_count', 'like_count', 'comment_count')
+CHANNEL_TOTALS = (
+    ('total_views', 'view_count'),
+    ('total_likes', 'like_count'),
+    ('total_comments', 'comment_count'),
+    ('total_duration_seconds', 'duration_seconds'),
+)
+# Dashboard averages computed from the rollup totals, checked against the
+# AVG() queries over the raw tables
+AVERAGE_QUERIES = ("Average Views per Video", "Average Duration per Channel")
+
+ROLLUP_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS channel_rollup (
+        channel_id VARCHAR(50) PRIMARY KEY,
+        video_count BIGINT NOT NULL DEFAULT 0,
+        total_views BIGINT NOT NULL DEFAULT 0,
+        total_likes BIGINT NOT NULL DEFAULT 0,
+        total_comments BIGINT NOT NULL DEFAULT 0,
+        total_duration_seconds BIGINT NOT NULL DEFAULT 0
+    );""",
+    """
+    CREATE TABLE IF NOT EXISTS daily_uploads (
+        publish_date DATE PRIMARY KEY,
+        video_count BIGINT NOT NULL DEFAULT 0
+    );""",
+    """
+    CREATE TABLE IF NOT EXISTS video_leaderboard (
+        metric VARCHAR(20),
+        video_id VARCHAR(50),
+        video_name VARCHAR(200),
+        view_count BIGINT,
+        like_count INT,
+        comment_count INT,
+        PRIMARY KEY (metric, video_id)
+    );""",
+]
+
+
+def _placeholders(count):
+    return ", ".join(["%s"] * count)
+
+
+def _publish_date(value):
+    if value is None:
+        return None
+    return str(value)[:10]
+
+
+# Function to fold one chunk of video rows (tuples in `columns` order) into the
+# rollups. Must run before the chunk is upserted into videos, on the same
+# cursor, so the old statistics of already stored videos can be read.
+def apply_video_chunk(cursor, columns, chunk):
+    rows = [dict(zip(columns, row)) for row in chunk]
+    video_ids = list(dict.fromkeys(row['video_id'] for row in rows))
+    cursor.execute(
+        f"SELECT video_id, view_count, like_count, comment_count FROM videos "
+        f"WHERE video_id IN ({_placeholders(len(video_ids))})", video_ids)
+    current = {video_id: dict(view_count=views, like_count=likes, comment_count=comments)
+               for video_id, views, likes, comments in cursor.fetchall()}
+
+    channel_deltas = defaultdict(lambda: defaultdict(int))
+    day_deltas = defaultdict(int)
+    for row in rows:
+        old = current.get(row['video_id'])
+        delta = channel_deltas[row['channel_id']]
+        if old is None:
+            # New video: every column counts, including its duration and day
+            delta['video_count'] += 1
+            for total, column in CHANNEL_TOTALS:
+                delta[total] += row.get(column) or 0
+            day = _publish_date(row.get('publishedat'))
+            if day is not None:
+                day_deltas[day] += 1
+        else:
+            # Stored video: only the statistics in VIDEO_UPDATE_COLUMNS change
+            for total, column in CHANNEL_TOTALS[:3]:
+                delta[total] += (row[column] or 0) - (old[column] or 0)
+        current[row['video_id']] = dict(view_count=row['view_count'], like_count=row['like_count'],
+                                        comment_count=row['comment_count'])
+
+    # Rows are written in key order so concurrent writers lock them in the same order
+    channel_rows = [(channel_id, delta['video_count']) + tuple(delta[total] for total, _ in CHANNEL_TOTALS)
+                    for channel_id, delta in sorted(channel_deltas.items()) if any(delta.values())]
+    dialect = storage.dialect_of(cursor)
+    if channel_rows:
+        totals = ["video_count"] + [total for total, _ in CHANNEL_TOTALS]
+        cursor.execute(
+            storage.upsert_sql(dialect, "channel_rollup", ["channel_id"] + totals, len(channel_rows),
+                               increment_columns=totals),
+            [value for row in channel_rows for value in row])
+    if day_deltas:
+        cursor.execute(
+            storage.upsert_sql(dialect, "daily_uploads", ("publish_date", "video_count"), len(day_deltas),
+                               increment_columns=("video_count",)),
+            [value for item in sorted(day_deltas.items()) for value in item])
+
+    latest = {row['video_id']: row for row in rows}
+    for metric in LEADERBOARD_METRICS:
+        _merge_leaderboard(cursor, metric, latest)
+
+
+# Function to fold the rows of a LOAD DATA staging table into the rollups,
+# before the staging table is merged into videos
+def apply_staged_videos(cursor, columns, staging, chunk_size=1000):
+    last_video_id = ""
+    while True:
+        cursor.execute(f"SELECT {', '.join(columns)} FROM {staging} WHERE video_id > %s "
+                       f"ORDER BY video_id LIMIT %s", (last_video_id, chunk_size))
+        chunk = cursor.fetchall()
+        if not chunk:
+            break
+        apply_video_chunk(cursor, columns, chunk)
+        last_video_id = chunk[-1][columns.index('video_id')]
+
+
+# Function to merge the latest values of a chunk into one leaderboard. A board
+# member whose value dropped may have been overtaken by a video outside the
+# board, so in that case the board is refilled from the videos outside the
+# chunk (via the metric's index) before the chunk is merged.
+def _merge_leaderboard(cursor, metric, latest):
+    cursor.execute(f"SELECT video_id, {metric} FROM video_leaderboard WHERE metric = %s", (metric,))
+    board = dict(cursor.fetchall())
+    if any(video_id in board and (row[metric] or 0) < (board[video_id] or 0)
+           for video_id, row in latest.items()):
+        _rebuild_leaderboard(cursor, metric, exclude=list(latest))
+        cursor.execute(f"SELECT video_id, {metric} FROM video_leaderboard WHERE metric = %s", (metric,))
+        board = dict(cursor.fetchall())
+
+    threshold = min(board.values(), default=0) if len(board) >= LEADERBOARD_SIZE else None
+    entries = [row for row in latest.values()
+               if row['video_id'] in board or threshold is None or (row[metric] or 0) > threshold]
+    if not entries:
+        return
+    cursor.execute(
+        storage.upsert_sql(storage.dialect_of(cursor), "video_leaderboard", LEADERBOARD_COLUMNS, len(entries),
+                           LEADERBOARD_COLUMNS[2:]),
+        [value for row in entries for value in (metric, row['video_id'], row['video_name'], row['view_count'],
+                                               row['like_count'], row['comment_count'])])
+
+    # Trim the board back to its size
+    cursor.execute(f"SELECT video_id FROM video_leaderboard WHERE metric = %s "
+                   f"ORDER BY {metric} DESC, video_id LIMIT %s, 1000000", (metric, LEADERBOARD_SIZE))
+    extra = [row[0] for row in cursor.fetchall()]
+    if extra:
+        cursor.execute(f"DELETE FROM video_leaderboard WHERE metric = %s "
+                       f"AND video_id IN ({_placeholders(len(extra))})", [metric] + extra)
+
+
+def _rebuild_leaderboard(cursor, metric, exclude=()):
+    where = f"WHERE video_id NOT IN ({_placeholders(len(exclude))}) " if exclude else ""
+    cursor.execute("DELETE FROM video_leaderboard WHERE metric = %s", (metric,))
+    cursor.execute(
+        f"INSERT INTO video_leaderboard ({', '.join(LEADERBOARD_COLUMNS)}) "
+        f"SELECT %s, video_id, video_name, view_count, like_count, comment_count FROM videos {where}"
+        f"ORDER BY {metric} DESC, video_id LIMIT %s", [metric] + list(exclude) + [LEADERBOARD_SIZE])
+
+
+# Raw-table queries the rollups must agree with
+CHANNEL_ROLLUP_SOURCE = (
+    "SELECT channel_id, COUNT(*), " + ", ".join(f"COALESCE(SUM({column}), 0)" for _, column in CHANNEL_TOTALS)
+    + " FROM videos GROUP BY channel_id")
+DAILY_UPLOADS_SOURCE = (
+    "SELECT DATE(publishedat), COUNT(*) FROM videos WHERE publishedat IS NOT NULL GROUP BY DATE(publishedat)")
+
+
+# Function to recompute every rollup from the raw tables (used by the schema
+# migration and to repair drift reported by check_rollups)
+def rebuild_rollups(cursor):
+    cursor.execute("DELETE FROM channel_rollup")
+    cursor.execute("INSERT INTO channel_rollup (channel_id, video_count, "
+                   + ", ".join(total for total, _ in CHANNEL_TOTALS) + ") " + CHANNEL_ROLLUP_SOURCE)
+    cursor.execute("DELETE FROM daily_uploads")
+    cursor.execute("INSERT INTO daily_uploads (publish_date, video_count) " + DAILY_UPLOADS_SOURCE)
+    for metric in LEADERBOARD_METRICS:
+        _rebuild_leaderboard(cursor, metric)
+
+
+def _compare(name, expected, actual):
+    problems = []
+    for key in sorted(set(expected) | set(actual), key=str):
+        if expected.get(key) != actual.get(key):
+            problems.append(f"{name} {key}: rollup {actual.get(key)} != raw {expected.get(key)}")
+    return problems
+
+
+# Function to compare the rollups against the raw tables. Returns a list of
+# human readable mismatches; an empty list means the rollups are consistent.
+def check_rollups(cursor):
+    cursor.execute(CHANNEL_ROLLUP_SOURCE)
+    expected = {row[0]: tuple(int(value) for value in row[1:]) for row in cursor.fetchall()}
+    cursor.execute("SELECT channel_id, video_count, " + ", ".join(total for total, _ in CHANNEL_TOTALS)
+                   + " FROM channel_rollup WHERE video_count <> 0")
+    actual = {row[0]: tuple(int(value) for value in row[1:]) for row in cursor.fetchall()}
+    problems = _compare("channel_rollup", expected, actual)
+
+    cursor.execute(DAILY_UPLOADS_SOURCE)
+    expected = {str(day): int(count) for day, count in cursor.fetchall()}
+    cursor.execute("SELECT publish_date, video_count FROM daily_uploads WHERE video_count <> 0")
+    actual = {str(day): int(count) for day, count in cursor.fetchall()}
+    problems += _compare("daily_uploads", expected, actual)
+
+    # Leaderboards are compared by value, since ties may order differently
+    for metric in LEADERBOARD_METRICS:
+        cursor.execute(f"SELECT {metric} FROM videos ORDER BY {metric} DESC LIMIT %s", (LEADERBOARD_SIZE,))
+        expected = [row[0] for row in cursor.fetchall()]
+        cursor.execute(f"SELECT {metric} FROM video_leaderboard WHERE metric = %s ORDER BY {metric} DESC",
+                       (metric,))
+        actual = [row[0] for row in cursor.fetchall()]
+        if expected != actual:
+            problems.append(f"video_leaderboard {metric}: top {LEADERBOARD_SIZE} values differ from videos")
+
+    # Averages are compared with a tolerance, since the division order differs
+    for name in AVERAGE_QUERIES:
+        cursor.execute(RAW_DASHBOARD_QUERIES[name])
+        expected = {row[:-1]: row[-1] for row in cursor.fetchall()}
+        cursor.execute(DASHBOARD_QUERIES[name])
+        actual = {row[:-1]: row[-1] for row in cursor.fetchall()}
+        for key in sorted(set(expected) | set(actual), key=str):
+            raw, rollup = expected.get(key), actual.get(key)
+            if (raw is None) != (rollup is None) or (
+                    raw is not None and not math.isclose(float(raw), float(rollup), rel_tol=1e-9, abs_tol=1e-6)):
+                problems.append(f"{name} {key}: rollup {rollup} != raw {raw}")
+    return problems
+
+
+# Command line entry point:  python rollups.py [--repair]
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Check the dashboard rollups against the raw tables")
+    parser.add_argument("--repair", action="store_true", help="rebuild the rollups when they disagree")
+    args = parser.parse_args(argv)
+
+    connection = storage.get_backend().connect()
+    try:
+        cursor = connection.cursor()
+        problems = check_rollups(cursor)
+        for problem in problems:
+            print(problem)
+        print(f"{len(problems)} rollup mismatch(es).")
+        if problems and args.repair:
+            rebuild_rollups(cursor)
+            connection.commit()
+            print("Rollups rebuilt from the raw tables.")
+        cursor.close()
+    finally:
+        connection.close()
+    return 1 if problems and not args.repair else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,175 @@
+import re
+
+import storage
+
+# Full-text search over comment texts and video titles and descriptions:
+#   MySQL   FULLTEXT indexes on comments (comment_text) and videos
+#           (video_name, video_description), maintained by InnoDB
+#   SQLite  FTS5 tables (comments_fts, videos_fts) over the same columns,
+#           maintained by triggers on comments and videos
+# Either way the index is updated by the statements of the insert path, in the
+# same transaction. Every word of a search must match (MySQL boolean mode,
+# FTS5 implicit AND); results are ranked by relevance (MySQL's score, FTS5's
+# bm25) and fetched a page at a time. On SQLite the page is taken from the FTS5
+# table with ORDER BY rank LIMIT/OFFSET before the join, so FTS5 keeps only the
+# best matches while scoring instead of sorting all of them.
+#
+# InnoDB leaves stopwords and words shorter than innodb_ft_min_token_size out
+# of its FULLTEXT index, so a required (+) stopword would match nothing. Those
+# words are dropped from MySQL searches.
+
+SEARCH_KINDS = ("comments", "videos")
+
+# InnoDB's defaults: innodb_ft_min_token_size and INNODB_FT_DEFAULT_STOPWORD
+MYSQL_MIN_WORD_LENGTH = 3
+MYSQL_STOPWORDS = frozenset(
+    "a about an are as at be by com de en for from how i in is it la of on or that the this to was what when "
+    "where who will with und www".split())
+
+# Words of a search; everything else (quotes, operators) is dropped so user
+# input cannot break the MATCH syntax
+WORD_REGEX = re.compile(r"\w+", re.UNICODE)
+
+SEARCH_QUERIES = {
+    "mysql": {
+        "comments": """
+            SELECT c.comment_id, c.video_id, v.video_name, c.comment_author, c.comment_text,
+                   c.comment_publishedat, MATCH (c.comment_text) AGAINST (%s IN BOOLEAN MODE) AS score
+            FROM comments c
+            LEFT JOIN videos v ON v.video_id = c.video_id
+            WHERE MATCH (c.comment_text) AGAINST (%s IN BOOLEAN MODE)
+            ORDER BY score DESC
+            LIMIT %s OFFSET %s;
+        """,
+        "videos": """
+            SELECT video_id, video_name, view_count, publishedat,
+                   MATCH (video_name, video_description) AGAINST (%s IN BOOLEAN MODE) AS score
+            FROM videos
+            WHERE MATCH (video_name, video_description) AGAINST (%s IN BOOLEAN MODE)
+            ORDER BY score DESC
+            LIMIT %s OFFSET %s;
+        """,
+    },
+    # bm25() is lower for better matches; FTS5 orders by it through `rank`
+    "sqlite": {
+        "comments": """
+            SELECT c.comment_id, c.video_id, v.video_name, c.comment_author, c.comment_text,
+                   c.comment_publishedat, -f.rank AS score
+            FROM (SELECT rowid, rank FROM comments_fts WHERE comments_fts MATCH %s
+                  ORDER BY rank LIMIT %s OFFSET %s) f
+            JOIN comments c ON c.rowid = f.rowid
+            LEFT JOIN videos v ON v.video_id = c.video_id
+            ORDER BY f.rank;
+        """,
+        "videos": """
+            SELECT v.video_id, v.video_name, v.view_count, v.publishedat, -f.rank AS score
+            FROM (SELECT rowid, rank FROM videos_fts WHERE videos_fts MATCH %s
+                  ORDER BY rank LIMIT %s OFFSET %s) f
+            JOIN videos v ON v.rowid = f.rowid
+            ORDER BY f.rank;
+        """,
+    },
+}
+
+MYSQL_INDEXES = [
+    "CREATE FULLTEXT INDEX ft_comments_text ON comments (comment_text)",
+    "CREATE FULLTEXT INDEX ft_videos_text ON videos (video_name, video_description)",
+]
+
+# External content FTS5 tables: the text stays in comments and videos, the FTS
+# tables only hold the index. The update triggers only fire when the indexed
+# columns change, not for the statistics a re-harvest refreshes.
+SQLITE_INDEXES = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS comments_fts USING fts5("
+    "comment_text, content='comments', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2')",
+    """CREATE TRIGGER IF NOT EXISTS comments_fts_insert AFTER INSERT ON comments BEGIN
+        INSERT INTO comments_fts (rowid, comment_text) VALUES (new.rowid, new.comment_text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comments_fts_delete AFTER DELETE ON comments BEGIN
+        INSERT INTO comments_fts (comments_fts, rowid, comment_text) VALUES ('delete', old.rowid, old.comment_text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comments_fts_update AFTER UPDATE OF comment_text ON comments
+    WHEN old.comment_text IS NOT new.comment_text BEGIN
+        INSERT INTO comments_fts (comments_fts, rowid, comment_text) VALUES ('delete', old.rowid, old.comment_text);
+        INSERT INTO comments_fts (rowid, comment_text) VALUES (new.rowid, new.comment_text);
+    END""",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS videos_fts USING fts5("
+    "video_name, video_description, content='videos', content_rowid='rowid', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    """CREATE TRIGGER IF NOT EXISTS videos_fts_insert AFTER INSERT ON videos BEGIN
+        INSERT INTO videos_fts (rowid, video_name, video_description)
+        VALUES (new.rowid, new.video_name, new.video_description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS videos_fts_delete AFTER DELETE ON videos BEGIN
+        INSERT INTO videos_fts (videos_fts, rowid, video_name, video_description)
+        VALUES ('delete', old.rowid, old.video_name, old.video_description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS videos_fts_update AFTER UPDATE OF video_name, video_description ON videos
+    WHEN old.video_name IS NOT new.video_name OR old.video_description IS NOT new.video_description BEGIN
+        INSERT INTO videos_fts (videos_fts, rowid, video_name, video_description)
+        VALUES ('delete', old.rowid, old.video_name, old.video_description);
+        INSERT INTO videos_fts (rowid, video_name, video_description)
+        VALUES (new.rowid, new.video_name, new.video_description);
+    END""",
+]
+SQLITE_REBUILD = [
+    "INSERT INTO comments_fts (comments_fts) VALUES ('rebuild')",
+    "INSERT INTO videos_fts (videos_fts) VALUES ('rebuild')",
+]
+
+
+# Function to create the search indexes of the cursor's backend and index the
+# rows already stored (a migration step)
+def create_search_indexes(cursor):
+    if storage.dialect_of(cursor) == "mysql":
+        for statement in MYSQL_INDEXES:
+            cursor.execute(statement)
+        return
+    for statement in SQLITE_INDEXES:
+        cursor.execute(statement)
+    rebuild_search_indexes(cursor)
+
+
+# Function to rebuild the FTS5 tables from comments and videos. They refer to
+# rows by rowid, which VACUUM may renumber, so run it after a VACUUM. MySQL
+# maintains its FULLTEXT indexes itself.
+def rebuild_search_indexes(cursor):
+    if storage.dialect_of(cursor) == "mysql":
+        return
+    for statement in SQLITE_REBUILD:
+        cursor.execute(statement)
+
+
+# Function to turn a search into the MATCH argument of a dialect, or None when
+# it has no words. Every word is required, except on MySQL the words the
+# FULLTEXT index leaves out.
+def match_expression(dialect, text):
+    words = WORD_REGEX.findall(text or "")
+    if dialect == "mysql":
+        words = [word for word in words
+                 if len(word) >= MYSQL_MIN_WORD_LENGTH and word.lower() not in MYSQL_STOPWORDS]
+    if not words:
+        return None
+    if dialect == "mysql":
+        return " ".join(f"+{word}" for word in words)
+    return " ".join(f'"{word}"' for word in words)
+
+
+# Function to build the query for one page of `kind` results. Returns
+# (query, params), or None when the search has no words.
+def search_query(dialect, kind, text, limit, offset=0):
+    match = match_expression(dialect, text)
+    if match is None:
+        return None
+    params = (match, match) if dialect == "mysql" else (match,)
+    return SEARCH_QUERIES[dialect][kind], params + (limit, offset)
+
+
+# Function to search the configured warehouse; returns a list of dicts, best
+# match first
+def search(kind, text, limit=50, offset=0):
+    backend = storage.get_backend()
+    query = search_query(backend.name, kind, text, limit, offset)
+    if query is None:
+        return []
+    return backend.query(*query)
@@ -0,0 +1,260 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import rollups
+import storage
+
+# Columnar snapshots of the warehouse for analytics away from the database:
+#   python snapshot.py export --out snapshot --workers 4
+#   python snapshot.py sql "SELECT COUNT(*) FROM videos"
+# Every table is written as Parquet, partitioned by channel and (for videos
+# and comments) by month, in Hive layout: videos/channel_id=UC.../month=2024-05/.
+# SnapshotEngine runs the app's queries on a snapshot with DuckDB.
+# pyarrow and duckdb are only needed by this module.
+
+SNAPSHOT_DIR = os.environ.get("YOUTUBE_SNAPSHOT_DIR", "snapshot")
+SNAPSHOT_WORKERS = 4
+SNAPSHOT_CHUNK_ROWS = 100000
+MANIFEST = "_manifest.json"
+
+# (table, SELECT for one channel, partition columns); the SELECTs add the
+# channel_id partition value to every row
+SNAPSHOT_TABLES = [
+    ("channels", "SELECT * FROM channels WHERE channel_id = %s", ["channel_id"]),
+    ("playlist", "SELECT * FROM playlist WHERE channel_id = %s", ["channel_id"]),
+    ("videos", "SELECT v.* FROM videos v WHERE v.channel_id = %s", ["channel_id", "month"]),
+    ("comments",
+     "SELECT c.*, v.channel_id FROM comments c JOIN videos v ON v.video_id = c.video_id WHERE v.channel_id = %s",
+     ["channel_id", "month"]),
+]
+
+# Column the month partition of a table is taken from
+MONTH_COLUMNS = {"videos": "publishedat", "comments": "comment_publishedat"}
+
+
+# Function to build the Arrow schema of every snapshot table. Kept explicit so
+# chunks with only NULLs in a column still get the same types.
+def arrow_schemas():
+    import pyarrow as pa
+
+    timestamp = pa.timestamp("s")
+    return {
+        "channels": pa.schema([
+            ("channel_id", pa.string()), ("channel_name", pa.string()), ("channel_description", pa.string()),
+            ("channel_thumbnail", pa.string()), ("channel_playlist_id", pa.string()),
+            ("channel_subscribers", pa.int64()), ("channel_video_count", pa.int64()),
+            ("channel_views", pa.int64()), ("channel_publishedat", timestamp),
+        ]),
+        "playlist": pa.schema([
+            ("playlist_id", pa.string()), ("playlist_name", pa.string()), ("publishedat", timestamp),
+            ("channel_id", pa.string()), ("channel_name", pa.string()), ("videoscount", pa.int64()),
+        ]),
+        "videos": pa.schema([
+            ("video_id", pa.string()), ("channel_id", pa.string()), ("video_name", pa.string()),
+            ("video_description", pa.string()), ("thumbnail", pa.string()), ("tags", pa.string()),
+            ("publishedat", timestamp), ("duration", pa.string()), ("view_count", pa.int64()),
+            ("like_count", pa.int64()), ("favorite_count", pa.int64()), ("comment_count", pa.int64()),
+            ("caption_status", pa.string()), ("duration_seconds", pa.int64()), ("month", pa.string()),
+        ]),
+        "comments": pa.schema([
+            ("comment_id", pa.string()), ("video_id", pa.string()), ("comment_text", pa.string()),
+            ("comment_author", pa.string()), ("comment_publishedat", timestamp),
+            ("channel_id", pa.string()), ("month", pa.string()),
+        ]),
+    }
+
+
+# Function to reduce a database row to the snapshot columns. A column the
+# database does not have yet is written as NULL; DATETIMEs, which SQLite
+# returns as text, become datetimes, and the month partition is derived here.
+def _snapshot_row(row, schema, month_column):
+    import pyarrow as pa
+
+    values = {}
+    for field in schema:
+        value = row.get(field.name)
+        if isinstance(value, str) and pa.types.is_timestamp(field.type):
+            value = datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+        values[field.name] = value
+    if month_column is not None:
+        published = values.get(month_column)
+        values["month"] = published.strftime("%Y-%m") if published is not None else "unknown"
+    return values
+
+
+# Function to export one table of one channel, streaming `chunk_rows` rows at a
+# time into Parquet part files. Returns the number of rows written.
+def _export_channel_table(root, table, query, partition_cols, schema, channel_id, chunk_rows):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    month_column = MONTH_COLUMNS.get(table)
+    connection = storage.get_backend().connect()
+    written = 0
+    try:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(query, (channel_id,))
+        part = 0
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            chunk = pa.Table.from_pylist([_snapshot_row(row, schema, month_column) for row in rows],
+                                         schema=schema)
+            pq.write_to_dataset(chunk, os.path.join(root, table), partition_cols=partition_cols,
+                                basename_template=f"{channel_id}-{part}-{{i}}.parquet")
+            written += len(rows)
+            part += 1
+        cursor.close()
+    finally:
+        connection.close()
+    return written
+
+
+# Function to snapshot every table to Parquet under `out_dir`. Channels are
+# exported in parallel, each on its own connection. The snapshot is
+# written next to `out_dir` and swapped in when complete, so readers never see
+# a half written snapshot. Returns the manifest.
+def export_snapshot(out_dir=SNAPSHOT_DIR, workers=SNAPSHOT_WORKERS, chunk_rows=SNAPSHOT_CHUNK_ROWS):
+    schemas = arrow_schemas()
+    connection = storage.get_backend().connect()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT channel_id FROM channels ORDER BY channel_id")
+        channel_ids = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+    finally:
+        connection.close()
+
+    staging = out_dir.rstrip("/\\") + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    start = time.perf_counter()
+    rows = {table: 0 for table, _, _ in SNAPSHOT_TABLES}
+    rows_lock = threading.Lock()
+
+    def export(task):
+        table, query, partition_cols, channel_id = task
+        written = _export_channel_table(staging, table, query, partition_cols, schemas[table], channel_id,
+                                        chunk_rows)
+        with rows_lock:
+            rows[table] += written
+
+    tasks = [(table, query, partition_cols, channel_id)
+             for channel_id in channel_ids for table, query, partition_cols in SNAPSHOT_TABLES]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # list() re-raises the first export error
+        list(executor.map(export, tasks))
+
+    manifest = dict(
+        snapshot_id=datetime.utcnow().strftime("%Y%m%dT%H%M%S.%fZ"),
+        created_at=datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+        channels=len(channel_ids),
+        rows=rows,
+        seconds=round(time.perf_counter() - start, 1),
+    )
+    with open(os.path.join(staging, MANIFEST), "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+    previous = out_dir.rstrip("/\\") + ".old"
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(out_dir):
+        os.rename(out_dir, previous)
+    os.rename(staging, out_dir)
+    shutil.rmtree(previous, ignore_errors=True)
+    return manifest
+
+
+def read_manifest(root=SNAPSHOT_DIR):
+    with open(os.path.join(root, MANIFEST), encoding="utf-8") as manifest_file:
+        return json.load(manifest_file)
+
+
+# DuckDB session over a snapshot. The snapshot tables are views over the
+# Parquet files; the rollup tables and video_tags, which the dashboard
+# queries read, are computed once when the engine opens, so queries.py runs
+# unchanged. Safe to share between threads: every query uses its own cursor.
+class SnapshotEngine:
+    def __init__(self, root=SNAPSHOT_DIR):
+        import duckdb
+
+        self.root = root
+        self.manifest = read_manifest(root)
+        self._connection = duckdb.connect()
+        schemas = arrow_schemas()
+        for table, _, _ in SNAPSHOT_TABLES:
+            path = os.path.join(root, table)
+            exclude = " EXCLUDE (month)" if "month" in schemas[table].names else ""
+            if os.path.isdir(path) and any(name.endswith(".parquet") for _, _, names in os.walk(path)
+                                           for name in names):
+                pattern = os.path.join(path, "**", "*.parquet").replace("'", "''")
+                self._connection.execute(
+                    f"CREATE VIEW {table} AS SELECT *{exclude} FROM read_parquet('{pattern}', "
+                    f"hive_partitioning = true, union_by_name = true)")
+            else:
+                self._connection.register(f"{table}_empty", schemas[table].empty_table())
+                self._connection.execute(f"CREATE VIEW {table} AS SELECT *{exclude} FROM {table}_empty")
+        self._build_derived_tables()
+
+    def _build_derived_tables(self):
+        execute = self._connection.execute
+        execute("CREATE TABLE channel_rollup AS SELECT channel_id, COUNT(*) AS video_count, "
+                + ", ".join(f"COALESCE(SUM({column}), 0) AS {total}" for total, column in rollups.CHANNEL_TOTALS)
+                + " FROM videos GROUP BY channel_id")
+        execute("CREATE TABLE daily_uploads AS SELECT CAST(publishedat AS DATE) AS publish_date, "
+                "COUNT(*) AS video_count FROM videos WHERE publishedat IS NOT NULL GROUP BY 1")
+        execute("CREATE TABLE video_leaderboard AS " + " UNION ALL ".join(
+            f"SELECT * FROM (SELECT '{metric}' AS metric, video_id, video_name, view_count, like_count, "
+            f"comment_count FROM videos ORDER BY {metric} DESC, video_id LIMIT {rollups.LEADERBOARD_SIZE})"
+            for metric in rollups.LEADERBOARD_METRICS))
+        execute("CREATE TABLE video_tags AS SELECT DISTINCT video_id, tag FROM ("
+                "SELECT video_id, trim(unnest(string_split(tags, ','))) AS tag FROM videos "
+                "WHERE tags IS NOT NULL) WHERE tag <> ''")
+
+    def generation(self):
+        return "snapshot:" + self.manifest["snapshot_id"]
+
+    # Function to run a MySQL-style query (%s placeholders) and return a list
+    # of dicts, like a dictionary cursor
+    def query(self, query, params=()):
+        cursor = self._connection.cursor()
+        try:
+            cursor.execute(query.strip().rstrip(";").replace("%s", "?"), list(params))
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Columnar snapshots of the YouTube warehouse")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="snapshot the warehouse tables to Parquet")
+    export_parser.add_argument("--out", default=SNAPSHOT_DIR)
+    export_parser.add_argument("--workers", type=int, default=SNAPSHOT_WORKERS)
+    export_parser.add_argument("--chunk-rows", type=int, default=SNAPSHOT_CHUNK_ROWS)
+    sql_parser = commands.add_parser("sql", help="run a query on a snapshot with DuckDB")
+    sql_parser.add_argument("query")
+    sql_parser.add_argument("--snapshot", default=SNAPSHOT_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        manifest = export_snapshot(args.out, workers=args.workers, chunk_rows=args.chunk_rows)
+        print(f"Snapshot {manifest['snapshot_id']} of {manifest['channels']} channels written to {args.out} "
+              f"in {manifest['seconds']}s: "
+              + ", ".join(f"{table}={count}" for table, count in manifest['rows'].items()))
+    else:
+        for row in SnapshotEngine(args.snapshot).query(args.query):
+            print(row)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
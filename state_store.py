@@ -0,0 +1,288 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+# Local SQLite file holding harvest state (per-channel watermarks, the
+# checkpoints of unfinished harvest runs and the API quota spent per key)
+STATE_DB = os.environ.get("YOUTUBE_STATE_DB", "harvest_state.db")
+
+
+# Small SQLite-backed store for harvest bookkeeping that must survive restarts.
+# One connection is shared by all threads and guarded by a lock.
+class StateStore:
+    def __init__(self, path=STATE_DB):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS channel_watermarks (
+                channel_id TEXT PRIMARY KEY,
+                uploads_playlist_id TEXT,
+                newest_published_at TEXT,
+                uploads_etag TEXT,
+                updated_at TEXT
+            )""")
+            # One row per harvest run; a run that is still 'running' when the
+            # process dies is resumed by the next harvest of the same channel
+            self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS harvest_runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel_id TEXT,
+                mode TEXT,
+                status TEXT,
+                uploads_playlist_id TEXT,
+                next_page_token TEXT,
+                listing_done INTEGER DEFAULT 0,
+                started_at TEXT,
+                finished_at TEXT
+            )""")
+            # The watermark a full run's listing will leave, taken from its
+            # first page, kept until the whole listing is stored
+            self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS run_watermarks (
+                run_id INTEGER PRIMARY KEY,
+                newest_published_at TEXT,
+                uploads_etag TEXT
+            )""")
+            # Every video ID listed by a run, whether its row is committed and
+            # where its comment paging continues
+            self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS run_videos (
+                run_id INTEGER,
+                video_id TEXT,
+                position INTEGER,
+                video_done INTEGER DEFAULT 0,
+                comments_done INTEGER DEFAULT 0,
+                comment_page_token TEXT,
+                PRIMARY KEY (run_id, video_id)
+            )""")
+            # Quota units spent per API key and quota day (see quota.py); keys
+            # are stored as a hash, never in clear
+            self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS quota_usage (
+                quota_day TEXT,
+                key_id TEXT,
+                units INTEGER NOT NULL DEFAULT 0,
+                exhausted INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (quota_day, key_id)
+            )""")
+            # When the statistics of a channel's stored videos were last refreshed
+            self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS channel_refreshes (
+                channel_id TEXT PRIMARY KEY,
+                stats_refreshed_at TEXT
+            )""")
+            # The video's comment count when its comments were last harvested
+            self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS comment_harvests (
+                video_id TEXT PRIMARY KEY,
+                comment_count INTEGER,
+                harvested_at TEXT
+            )""")
+
+    # Function to read the watermark of a channel; an empty watermark means
+    # the channel has never been harvested
+    def get_watermark(self, channel_id):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT uploads_playlist_id, newest_published_at, uploads_etag FROM channel_watermarks "
+                "WHERE channel_id = ?", (channel_id,)
+            ).fetchone()
+        if row is None:
+            return dict(uploads_playlist_id=None, newest_published_at=None, uploads_etag=None)
+        return dict(row)
+
+    def save_watermark(self, channel_id, uploads_playlist_id, newest_published_at, uploads_etag):
+        with self._lock, self._connection:
+            self._connection.execute("""
+            INSERT INTO channel_watermarks (channel_id, uploads_playlist_id, newest_published_at, uploads_etag, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(channel_id) DO UPDATE SET
+                uploads_playlist_id = excluded.uploads_playlist_id,
+                newest_published_at = excluded.newest_published_at,
+                uploads_etag = excluded.uploads_etag,
+                updated_at = excluded.updated_at
+            """, (channel_id, uploads_playlist_id, newest_published_at, uploads_etag, _now()))
+
+    def set_run_watermark(self, run_id, newest_published_at, uploads_etag):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO run_watermarks (run_id, newest_published_at, uploads_etag) VALUES (?, ?, ?)",
+                (run_id, newest_published_at, uploads_etag))
+
+    # Function to read the watermark recorded by a run, or None
+    def get_run_watermark(self, run_id):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT newest_published_at, uploads_etag FROM run_watermarks WHERE run_id = ?", (run_id,)
+            ).fetchone()
+        return None if row is None else dict(row)
+
+    # Function to resume the unfinished run of a channel harvested in the same
+    # mode, or start a new one. Returns (run_id, resumed).
+    def start_run(self, channel_id, mode):
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT run_id FROM harvest_runs WHERE channel_id = ? AND mode = ? AND status = 'running' "
+                "ORDER BY run_id DESC LIMIT 1", (channel_id, mode)
+            ).fetchone()
+            if row is not None:
+                return row[0], True
+            cursor = self._connection.execute(
+                "INSERT INTO harvest_runs (channel_id, mode, status, started_at) VALUES (?, ?, 'running', ?)",
+                (channel_id, mode, _now())
+            )
+            return cursor.lastrowid, False
+
+    def get_run(self, run_id):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT * FROM harvest_runs WHERE run_id = ?", (run_id,)).fetchone()
+        return dict(row)
+
+    def set_run_playlist(self, run_id, uploads_playlist_id):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE harvest_runs SET uploads_playlist_id = ? WHERE run_id = ?", (uploads_playlist_id, run_id))
+
+    # Function to record one page of listed video IDs together with the token
+    # of the next listing page, in one transaction. Returns the IDs this run
+    # had not listed before.
+    def record_id_page(self, run_id, video_ids, next_page_token, listing_done):
+        new_ids = []
+        with self._lock, self._connection:
+            position = self._connection.execute(
+                "SELECT COALESCE(MAX(position), -1) + 1 FROM run_videos WHERE run_id = ?", (run_id,)
+            ).fetchone()[0]
+            for video_id in video_ids:
+                cursor = self._connection.execute(
+                    "INSERT OR IGNORE INTO run_videos (run_id, video_id, position) VALUES (?, ?, ?)",
+                    (run_id, video_id, position))
+                if cursor.rowcount:
+                    new_ids.append(video_id)
+                    position += 1
+            self._connection.execute(
+                "UPDATE harvest_runs SET next_page_token = ?, listing_done = ? WHERE run_id = ?",
+                (next_page_token, int(listing_done), run_id))
+        return new_ids
+
+    def mark_listing_done(self, run_id):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE harvest_runs SET next_page_token = NULL, listing_done = 1 WHERE run_id = ?", (run_id,))
+
+    # Listed videos whose rows are not committed yet, in listing order
+    def pending_video_ids(self, run_id):
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT video_id FROM run_videos WHERE run_id = ? AND video_done = 0 ORDER BY position",
+                (run_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def mark_videos_done(self, run_id, video_ids):
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "UPDATE run_videos SET video_done = 1 WHERE run_id = ? AND video_id = ?",
+                [(run_id, video_id) for video_id in video_ids])
+
+    # Committed videos whose comments are not complete yet, in listing order
+    def pending_comment_video_ids(self, run_id):
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT video_id FROM run_videos WHERE run_id = ? AND video_done = 1 AND comments_done = 0 "
+                "ORDER BY position", (run_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def comment_page_token(self, run_id, video_id):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT comment_page_token FROM run_videos WHERE run_id = ? AND video_id = ?",
+                (run_id, video_id)).fetchone()
+        return row[0] if row else None
+
+    # Function to record committed comment pages: {video_id: next_page_token},
+    # where a None token means every comment of the video is stored
+    def record_comment_pages(self, run_id, page_tokens):
+        with self._lock, self._connection:
+            for video_id, next_page_token in page_tokens.items():
+                self._connection.execute(
+                    "UPDATE run_videos SET comment_page_token = ?, comments_done = ? "
+                    "WHERE run_id = ? AND video_id = ?",
+                    (next_page_token, int(next_page_token is None), run_id, video_id))
+
+    # Function to reserve `units` of a key's daily quota. The check and the
+    # increment are one statement, so processes sharing the state file never
+    # overspend a key. Returns False when the key cannot afford them.
+    def reserve_quota(self, quota_day, key_id, units, limit):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR IGNORE INTO quota_usage (quota_day, key_id) VALUES (?, ?)", (quota_day, key_id))
+            cursor = self._connection.execute(
+                "UPDATE quota_usage SET units = units + ? "
+                "WHERE quota_day = ? AND key_id = ? AND exhausted = 0 AND units + ? <= ?",
+                (units, quota_day, key_id, units, limit))
+            return cursor.rowcount == 1
+
+    # Function to mark a key as spent for the day, e.g. after the API answered
+    # quotaExceeded although the local count says otherwise
+    def exhaust_quota(self, quota_day, key_id):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO quota_usage (quota_day, key_id, exhausted) VALUES (?, ?, 1) "
+                "ON CONFLICT(quota_day, key_id) DO UPDATE SET exhausted = 1", (quota_day, key_id))
+
+    # Function to read {key_id: (units, exhausted)} for one quota day
+    def quota_usage(self, quota_day):
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT key_id, units, exhausted FROM quota_usage WHERE quota_day = ?", (quota_day,)).fetchall()
+        return {row[0]: (row[1], bool(row[2])) for row in rows}
+
+    def stats_refreshed_at(self, channel_id):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT stats_refreshed_at FROM channel_refreshes WHERE channel_id = ?", (channel_id,)).fetchone()
+        return row[0] if row else None
+
+    def mark_stats_refreshed(self, channel_id):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO channel_refreshes (channel_id, stats_refreshed_at) VALUES (?, ?) "
+                "ON CONFLICT(channel_id) DO UPDATE SET stats_refreshed_at = excluded.stats_refreshed_at",
+                (channel_id, _now()))
+
+    # Function to read {video_id: comment_count} at the last comment harvest
+    def harvested_comment_counts(self, video_ids):
+        counts = {}
+        with self._lock:
+            for chunk in (video_ids[n:n + 500] for n in range(0, len(video_ids), 500)):
+                rows = self._connection.execute(
+                    f"SELECT video_id, comment_count FROM comment_harvests "
+                    f"WHERE video_id IN ({', '.join('?' * len(chunk))})", chunk).fetchall()
+                counts.update((row[0], row[1]) for row in rows)
+        return counts
+
+    def mark_comments_harvested(self, video_id, comment_count):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO comment_harvests (video_id, comment_count, harvested_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(video_id) DO UPDATE SET comment_count = excluded.comment_count, "
+                "harvested_at = excluded.harvested_at", (video_id, comment_count, _now()))
+
+    # Function to close a finished run; its per-video checkpoints are dropped
+    def finish_run(self, run_id):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE harvest_runs SET status = 'done', finished_at = ? WHERE run_id = ?", (_now(), run_id))
+            self._connection.execute("DELETE FROM run_videos WHERE run_id = ?", (run_id,))
+            self._connection.execute("DELETE FROM run_watermarks WHERE run_id = ?", (run_id,))
+
+    def close(self):
+        self._connection.close()
+
+
+def _now():
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
@@ -0,0 +1,211 @@
+from datetime import date, datetime
+
+import storage
+
+# Append-only history of the statistics that the warehouse overwrites in place:
+#   video_stats_history    views, likes and comments of a video
+#   channel_stats_history  subscribers, views and video count of a channel
+# A row is appended only when a value changed since the stored one, at most
+# one per item and day: a second change on the same day updates that day's row.
+# Every row keeps the new values and how much they grew since the previous
+# row (the *_gained columns), so "views gained in the last 7 days" is a SUM
+# over the rows of those 7 days instead of a value-at-date lookup per video.
+# The first row of an item is its baseline and gains nothing. daily_growth
+# sums the video gains per day for the warehouse-wide growth chart.
+#
+# Both tables are keyed (captured_on, id), which keeps the rows of a day
+# together (InnoDB clusters on the primary key, the SQLite tables are WITHOUT
+# ROWID), so a window reads only its own days. On MySQL the tables are also
+# RANGE partitioned by month; ensure_partitions() adds the upcoming months and
+# old months can be dropped with ALTER TABLE ... DROP PARTITION.
+
+VIDEO_STATS = ('view_count', 'like_count', 'comment_count')
+VIDEO_GAINED = ('views_gained', 'likes_gained', 'comments_gained')
+CHANNEL_STATS = ('channel_subscribers', 'channel_views', 'channel_video_count')
+CHANNEL_GAINED = ('subscribers_gained', 'views_gained', 'videos_gained')
+
+# (history table, source table, key column, statistics, gains)
+VIDEO_HISTORY = ('video_stats_history', 'videos', 'video_id', VIDEO_STATS, VIDEO_GAINED)
+CHANNEL_HISTORY = ('channel_stats_history', 'channels', 'channel_id', CHANNEL_STATS, CHANNEL_GAINED)
+HISTORY_TABLES = (VIDEO_HISTORY[0], CHANNEL_HISTORY[0])
+
+# Monthly partitions created ahead of the current month on MySQL
+PARTITION_MONTHS_AHEAD = 3
+
+# The tables are created with the options of their dialect
+TABLE_OPTIONS = {
+    "mysql": "\n    PARTITION BY RANGE COLUMNS (captured_on) (PARTITION p_future VALUES LESS THAN (MAXVALUE))",
+    "sqlite": " WITHOUT ROWID",
+}
+VIDEO_HISTORY_TABLE = """
+    CREATE TABLE IF NOT EXISTS video_stats_history (
+        captured_on DATE NOT NULL,
+        video_id VARCHAR(50) NOT NULL,
+        view_count BIGINT,
+        like_count BIGINT,
+        comment_count BIGINT,
+        views_gained BIGINT NOT NULL DEFAULT 0,
+        likes_gained BIGINT NOT NULL DEFAULT 0,
+        comments_gained BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (captured_on, video_id)
+    )"""
+CHANNEL_HISTORY_TABLE = """
+    CREATE TABLE IF NOT EXISTS channel_stats_history (
+        captured_on DATE NOT NULL,
+        channel_id VARCHAR(50) NOT NULL,
+        channel_subscribers BIGINT,
+        channel_views BIGINT,
+        channel_video_count BIGINT,
+        subscribers_gained BIGINT NOT NULL DEFAULT 0,
+        views_gained BIGINT NOT NULL DEFAULT 0,
+        videos_gained BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (captured_on, channel_id)
+    )"""
+DAILY_GROWTH_TABLE = """
+    CREATE TABLE IF NOT EXISTS daily_growth (
+        captured_on DATE PRIMARY KEY,
+        views_gained BIGINT NOT NULL DEFAULT 0,
+        likes_gained BIGINT NOT NULL DEFAULT 0,
+        comments_gained BIGINT NOT NULL DEFAULT 0
+    );"""
+
+# Migration steps creating the history tables, plus the indexes that read the
+# history of one video or channel
+HISTORY_SCHEMA = [
+    {dialect: f"{table}{options};" for dialect, options in TABLE_OPTIONS.items()}
+    for table in (VIDEO_HISTORY_TABLE, CHANNEL_HISTORY_TABLE)
+] + [
+    DAILY_GROWTH_TABLE,
+    "CREATE INDEX idx_video_stats_history_video ON video_stats_history (video_id, captured_on)",
+    "CREATE INDEX idx_channel_stats_history_channel ON channel_stats_history (channel_id, captured_on)",
+]
+
+
+# Function to return the day history rows are recorded under (UTC)
+def capture_date():
+    return datetime.utcnow().strftime("%Y-%m-%d")
+
+
+def _placeholders(count):
+    return ", ".join(["%s"] * count)
+
+
+def _gained(new, old):
+    if new is None or old is None:
+        return 0
+    return new - old
+
+
+# Function to append the changed statistics of `rows` (tuples in `columns`
+# order) to a history table. Must run before the rows are upserted into the
+# source table, on the same cursor, so the stored values can be compared.
+# Returns the history rows written.
+def _record(cursor, spec, columns, rows, captured_on=None):
+    history, source, key, stats, gained = spec
+    positions = [columns.index(column) for column in (key,) + stats]
+    latest = {}
+    for row in rows:
+        latest[row[positions[0]]] = tuple(row[position] for position in positions[1:])
+    if not latest:
+        return []
+    cursor.execute(f"SELECT {key}, {', '.join(stats)} FROM {source} "
+                   f"WHERE {key} IN ({_placeholders(len(latest))})", list(latest))
+    current = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+
+    day = captured_on or capture_date()
+    changed = []
+    # Rows are written in key order so concurrent writers lock them in the same order
+    for item_id, values in sorted(latest.items()):
+        old = current.get(item_id)
+        if old == values:
+            continue
+        gains = tuple(_gained(new, before) for new, before in zip(values, old or values))
+        changed.append((day, item_id) + values + gains)
+    if changed:
+        cursor.execute(
+            storage.upsert_sql(storage.dialect_of(cursor), history, ('captured_on', key) + stats + gained,
+                               len(changed), update_columns=stats, increment_columns=gained),
+            [value for row in changed for value in row])
+    return changed
+
+
+# Function to record one chunk of video rows (tuples in `columns` order)
+def record_video_chunk(cursor, columns, chunk, captured_on=None):
+    changed = _record(cursor, VIDEO_HISTORY, columns, chunk, captured_on)
+    # The gains are the last columns of the history rows
+    totals = [sum(row[position] for row in changed) for position in range(-len(VIDEO_GAINED), 0)]
+    if any(totals):
+        cursor.execute(
+            storage.upsert_sql(storage.dialect_of(cursor), "daily_growth", ('captured_on',) + VIDEO_GAINED, 1,
+                               increment_columns=VIDEO_GAINED),
+            [changed[0][0]] + totals)
+    return len(changed)
+
+
+# Function to record the rows of a LOAD DATA staging table before it is merged
+# into videos
+def record_staged_videos(cursor, columns, staging, chunk_size=1000):
+    last_video_id = ""
+    while True:
+        cursor.execute(f"SELECT {', '.join(columns)} FROM {staging} WHERE video_id > %s "
+                       f"ORDER BY video_id LIMIT %s", (last_video_id, chunk_size))
+        chunk = cursor.fetchall()
+        if not chunk:
+            break
+        record_video_chunk(cursor, columns, chunk)
+        last_video_id = chunk[-1][columns.index('video_id')]
+
+
+# Function to record channel rows (tuples in `columns` order)
+def record_channel_rows(cursor, columns, rows, captured_on=None):
+    return len(_record(cursor, CHANNEL_HISTORY, columns, rows, captured_on))
+
+
+# Function to seed the history with today's values of every stored video and
+# channel, the baseline later changes are measured against
+def seed_history(cursor):
+    day = capture_date()
+    for history, source, key, stats, _ in (VIDEO_HISTORY, CHANNEL_HISTORY):
+        cursor.execute(
+            f"INSERT INTO {history} (captured_on, {key}, {', '.join(stats)}) "
+            f"SELECT %s, {key}, {', '.join(stats)} FROM {source}", (day,))
+
+
+def _month_start(day, months_later=0):
+    month = day.month - 1 + months_later
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+# Function to split the catch-all partition of the MySQL history tables into
+# monthly partitions up to PARTITION_MONTHS_AHEAD months from now, so queries
+# over recent days only touch their months. No-op on SQLite and when the
+# partitions exist. ALTER TABLE commits, so call it outside write transactions.
+def ensure_partitions(cursor, today=None, months_ahead=PARTITION_MONTHS_AHEAD):
+    if storage.dialect_of(cursor) != "mysql":
+        return []
+    today = today or datetime.utcnow().date()
+    added = []
+    for table in HISTORY_TABLES:
+        cursor.execute(
+            "SELECT partition_name FROM information_schema.partitions "
+            "WHERE table_schema = DATABASE() AND table_name = %s AND partition_name IS NOT NULL", (table,))
+        partitions = [row[0] for row in cursor.fetchall()]
+        if "p_future" not in partitions:
+            # Not partitioned, e.g. partitioning was removed by hand
+            continue
+        monthly = sorted(name for name in partitions if name != "p_future")
+        first = (_month_start(datetime.strptime(monthly[-1], "p%Y%m").date(), 1) if monthly
+                 else _month_start(today))
+        months = []
+        month = first
+        while month <= _month_start(today, months_ahead):
+            months.append(month)
+            month = _month_start(month, 1)
+        if not months:
+            continue
+        clauses = ", ".join(f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{_month_start(month, 1)}')"
+                            for month in months)
+        cursor.execute(f"ALTER TABLE {table} REORGANIZE PARTITION p_future INTO "
+                       f"({clauses}, PARTITION p_future VALUES LESS THAN (MAXVALUE))")
+        added.extend(f"{table}.p{month:%Y%m}" for month in months)
+    return added
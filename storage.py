@@ -0,0 +1,255 @@
+import abc
+import math
+import os
+import sqlite3
+import threading
+
+import mysql.connector
+
+import database
+
+# Storage backends for the warehouse. The write path, the schema migrations
+# and the dashboard queries are written once against the DB-API with %s
+# placeholders; everything that differs between databases goes through here:
+#   MySQLBackend   the pooled MySQL server from database.py (the default)
+#   SQLiteBackend  a local SQLite file, for single-node runs and for running
+#                  the write path and benchmarks without a MySQL server
+# Select one with "backend" in db_config.json or YOUTUBE_DB_BACKEND=sqlite;
+# the SQLite file is "sqlite_path" / YOUTUBE_DB_SQLITE_PATH.
+
+# Errors raised by any backend
+Error = (mysql.connector.Error, sqlite3.Error)
+
+INSERT_IGNORE = {"mysql": "INSERT IGNORE", "sqlite": "INSERT OR IGNORE"}
+
+# Placeholders allowed in one statement (SQLite: SQLITE_MAX_VARIABLE_NUMBER
+# of 3.32 and later)
+MAX_VARIABLES = {"mysql": 65535, "sqlite": 32766}
+
+
+# Function to tell which SQL dialect a connection or cursor speaks.
+# mysql.connector objects carry no marker and are MySQL.
+def dialect_of(connection_or_cursor):
+    return getattr(connection_or_cursor, "dialect", "mysql")
+
+
+# Function to build a multi-row upsert of `row_count` rows. On a duplicate key
+# `update_columns` take the new value and `increment_columns` add it.
+def upsert_sql(dialect, table, columns, row_count, update_columns=(), increment_columns=()):
+    row_placeholder = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([row_placeholder] * row_count)}"
+    new = "VALUES({0})" if dialect == "mysql" else "excluded.{0}"
+    updates = ([f"{column} = {new.format(column)}" for column in update_columns]
+               + [f"{column} = {column} + {new.format(column)}" for column in increment_columns])
+    if dialect == "mysql":
+        if not updates:
+            return insert.replace("INSERT", INSERT_IGNORE[dialect], 1)
+        return f"{insert} ON DUPLICATE KEY UPDATE {', '.join(updates)}"
+    if not updates:
+        return f"{insert} ON CONFLICT DO NOTHING"
+    return f"{insert} ON CONFLICT DO UPDATE SET {', '.join(updates)}"
+
+
+# Function to build a multi-row INSERT that skips rows whose key exists
+def insert_ignore_sql(dialect, table, columns, row_count):
+    return upsert_sql(dialect, table, columns, row_count)
+
+
+# Interface of a backend. Subclasses provide connect(); schema creation and
+# queries are shared since they only use the DB-API surface.
+class StorageBackend(abc.ABC):
+    name = None
+    supports_load_data_infile = False
+
+    @abc.abstractmethod
+    def connect(self, local_infile=False):
+        pass
+
+    def describe(self):
+        return self.name
+
+    # Function to bring the schema up to date; returns the migrations applied
+    def create_schema(self):
+        import migrations
+
+        connection = self.connect()
+        try:
+            return migrations.migrate(connection)
+        finally:
+            connection.close()
+
+    # Function to run a query and return its rows as dicts
+    def query(self, query, params=()):
+        connection = self.connect()
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            cursor.close()
+            return rows
+        finally:
+            connection.close()
+
+    def check_health(self):
+        try:
+            self.query("SELECT 1")
+            return True
+        except Error:
+            return False
+
+
+class MySQLBackend(StorageBackend):
+    name = "mysql"
+    supports_load_data_infile = True
+
+    def connect(self, local_infile=False):
+        return database.get_connection(allow_local_infile=local_infile)
+
+    def check_health(self):
+        return database.check_health()
+
+    def describe(self):
+        config = database.load_db_config()
+        return f"MySQL database '{config['database']}' on {config['host']}:{config['port']}"
+
+
+# sqlite3 connection with the mysql.connector surface the warehouse code uses:
+# %s placeholders and cursor(dictionary=True)
+class SQLiteConnection:
+    dialect = "sqlite"
+
+    def __init__(self, path, timeout=30.0):
+        self._connection = sqlite3.connect(path, timeout=timeout, check_same_thread=False,
+                                           isolation_level="IMMEDIATE")
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        _add_math_functions(self._connection)
+
+    def cursor(self, dictionary=False):
+        return SQLiteCursor(self._connection.cursor(), dictionary)
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        self._connection.close()
+
+
+class SQLiteCursor:
+    dialect = "sqlite"
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    @staticmethod
+    def _translate(query):
+        return query.replace("%s", "?").replace("%%", "%")
+
+    def execute(self, query, params=()):
+        self._cursor.execute(self._translate(query), tuple(params))
+
+    def executemany(self, query, rows):
+        self._cursor.executemany(self._translate(query), rows)
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip(self.column_names, row))
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    @property
+    def column_names(self):
+        return [column[0] for column in self._cursor.description or ()]
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self):
+        self._cursor.close()
+
+
+# Function to provide FLOOR and LOG10 when SQLite was built without its math
+# functions (the dashboard density chart uses them)
+def _add_math_functions(connection):
+    try:
+        connection.execute("SELECT FLOOR(LOG10(10))")
+    except sqlite3.OperationalError:
+        connection.create_function("FLOOR", 1, lambda x: None if x is None else math.floor(x),
+                                   deterministic=True)
+        connection.create_function("LOG10", 1, lambda x: None if x is None or x <= 0 else math.log10(x),
+                                   deterministic=True)
+
+
+class SQLiteBackend(StorageBackend):
+    name = "sqlite"
+
+    def __init__(self, path):
+        self.path = path
+
+    # Every call opens its own connection; SQLite connections are cheap and
+    # WAL mode lets readers run while a harvest writes. LOAD DATA is MySQL
+    # only, so `local_infile` is ignored and multi-row INSERTs are used.
+    def connect(self, local_infile=False):
+        return SQLiteConnection(self.path)
+
+    def describe(self):
+        return f"SQLite database '{os.path.abspath(self.path)}'"
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+# Function to return the process-wide backend selected by the configuration
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                config = database.load_db_config()
+                if config["backend"] == "sqlite":
+                    _backend = SQLiteBackend(config["sqlite_path"])
+                elif config["backend"] == "mysql":
+                    _backend = MySQLBackend()
+                else:
+                    raise ValueError(f"Unknown storage backend: {config['backend']}")
+    return _backend
+
+
+# Function to switch the process to another backend (tests and benchmarks)
+def set_backend(backend):
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+# Function to read the warehouse generation that main.bump_generation()
+# advances, or None when it is unavailable. Lives here rather than in main so
+# the dashboard can key its query cache without importing the harvester.
+def get_generation():
+    try:
+        rows = get_backend().query("SELECT generation FROM warehouse_generation WHERE id = 1")
+    except Error:
+        return None
+    return rows[0]["generation"] if rows else None
@@ -0,0 +1,141 @@
+import html
+import math
+import re
+from collections import Counter
+
+# Lexicon based analysis of one comment text, cheap enough to run over
+# millions of comments on a few CPU cores and with no model to download:
+#   sentiment  -1.0 .. 1.0 from a small valence lexicon (English words and
+#              common emoji) with negation and intensifier handling, squashed
+#              like VADER's compound score; labelled positive/neutral/negative
+#   language   the language whose function words the text uses most, or the
+#              script for non-Latin text ('und' when nothing matches)
+#   keywords   the most frequent words that are not function words
+# Only this module runs in the analytics worker processes, so it imports
+# nothing from the warehouse side. comment_analytics.py runs it.
+
+NEUTRAL_THRESHOLD = 0.05
+MAX_KEYWORDS = 3
+# Longer "words" (URLs, keyboard mashing) are not keywords
+MAX_KEYWORD_LENGTH = 30
+# Weight of a negated word and of a word after an intensifier
+NEGATION_SCALAR = -0.74
+INTENSIFIER_SCALAR = 1.3
+NEGATION_WINDOW = 3
+# Squashes a sum of valences into -1..1 (the constant VADER uses)
+NORMALIZATION_ALPHA = 15
+
+VALENCE_WORDS = [
+    ("love loved loving lovely amazing awesome excellent fantastic incredible masterpiece perfect "
+     "brilliant outstanding superb wonderful legendary goat", 3.0),
+    ("great good nice cool beautiful best better enjoy enjoyed enjoying fun funny happy helpful "
+     "impressive inspiring interesting glad thanks thank thankful useful wow respect favorite "
+     "favourite recommend recommended underrated satisfying wholesome clean epic hilarious", 2.0),
+    ("like liked fine ok okay decent solid fair agree clear easy smart calm pretty informative", 1.0),
+    ("hate hated horrible terrible awful worst disgusting pathetic garbage trash scam", -3.0),
+    ("bad boring poor sad angry annoying cringe disappointed disappointing fake lame stupid "
+     "useless waste wrong ugly weird worse overrated misleading clickbait sucks broken rude", -2.0),
+    ("meh confusing slow dislike unfortunately problem issue bug mistake unclear", -1.0),
+]
+VALENCES = {word: valence for words, valence in VALENCE_WORDS for word in words.split()}
+EMOJI_VALENCES = {
+    "❤": 3.0, "😍": 3.0, "🥰": 3.0, "🔥": 2.0, "👍": 2.0, "👏": 2.0, "😂": 1.5, "🤣": 1.5, "😊": 2.0,
+    "🙏": 1.5, "💯": 2.0, "😀": 2.0, "😁": 2.0, "🙌": 2.0,
+    "👎": -2.0, "😡": -3.0, "🤬": -3.0, "😢": -2.0, "😭": -1.5, "💩": -2.0, "🤮": -3.0, "😒": -1.5,
+}
+NEGATIONS = frozenset("not no never none nobody nothing neither nor cannot cant dont doesnt didnt isnt "
+                      "wasnt arent werent wont wouldnt shouldnt couldnt aint without".split())
+INTENSIFIERS = frozenset("very really so extremely super totally absolutely incredibly truly too most".split())
+
+# Function words per language, used both to guess the language and to leave
+# them out of the keywords
+FUNCTION_WORDS = {language: frozenset(words.split()) for language, words in {
+    "en": "the and is are was were this that it you he she they we with for not but have has what "
+          "of to in on my your so just be at from can will would an or i me all its",
+    "es": "el la los las de que y en un una es por para con no se lo como pero mas muy esta este "
+          "yo tu mi su al del",
+    "pt": "o a os as de que e em um uma para com nao se por mais como mas muito esta isso voce eu "
+          "meu sua do da no na",
+    "fr": "le la les de des et en un une est pour que qui dans pas sur avec ce cette je tu il elle "
+          "mais tres du au",
+    "de": "der die das und ist nicht ein eine ich du er sie es mit auf fur den dem zu auch aber "
+          "sehr wie von",
+    "it": "il lo la gli le di che e un una per con non sono questo questa ma molto come del della io tu",
+    "id": "yang dan di ini itu dengan untuk tidak ada saya kamu aku dari ke juga bisa sudah",
+    "hi": "hai ka ki ke se mein aur nahi bhi ye yeh kya bahut ho tha",
+}.items()}
+ALL_FUNCTION_WORDS = frozenset().union(*FUNCTION_WORDS.values())
+
+# Scripts of non-Latin text: (language, first code point, last code point)
+SCRIPTS = [
+    ("hi", 0x0900, 0x097F), ("ar", 0x0600, 0x06FF), ("ru", 0x0400, 0x04FF), ("ko", 0xAC00, 0xD7AF),
+    ("ja", 0x3040, 0x30FF), ("zh", 0x4E00, 0x9FFF), ("th", 0x0E00, 0x0E7F), ("ta", 0x0B80, 0x0BFF),
+]
+
+TAG_REGEX = re.compile(r"<[^>]+>")
+TOKEN_REGEX = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?|[\U0001F300-\U0001FAFF☀-➿]", re.UNICODE)
+
+
+# Function to turn a comment's textDisplay (HTML) into lower case tokens:
+# words (apostrophes dropped, so "don't" matches "dont") and emoji
+def tokenize(text):
+    text = html.unescape(TAG_REGEX.sub(" ", text or "")).lower()
+    return [token.replace("'", "") for token in TOKEN_REGEX.findall(text)]
+
+
+def sentiment_score(tokens):
+    total = 0.0
+    for index, token in enumerate(tokens):
+        valence = VALENCES.get(token) or EMOJI_VALENCES.get(token)
+        if not valence:
+            continue
+        if index and tokens[index - 1] in INTENSIFIERS:
+            valence *= INTENSIFIER_SCALAR
+        if any(previous in NEGATIONS for previous in tokens[max(0, index - NEGATION_WINDOW):index]):
+            valence *= NEGATION_SCALAR
+        total += valence
+    return total / math.sqrt(total * total + NORMALIZATION_ALPHA)
+
+
+def sentiment_label(score):
+    if score >= NEUTRAL_THRESHOLD:
+        return "positive"
+    if score <= -NEUTRAL_THRESHOLD:
+        return "negative"
+    return "neutral"
+
+
+def detect_language(text, tokens):
+    hits = Counter()
+    for token in tokens:
+        for language, words in FUNCTION_WORDS.items():
+            if token in words:
+                hits[language] += 1
+    if hits:
+        return hits.most_common(1)[0][0]
+    for character in text or "":
+        code = ord(character)
+        for language, first, last in SCRIPTS:
+            if first <= code <= last:
+                return language
+    return "und"
+
+
+def keywords(tokens, limit=MAX_KEYWORDS):
+    counts = Counter(token for token in tokens
+                     if 2 < len(token) <= MAX_KEYWORD_LENGTH and token.isalpha() and token not in ALL_FUNCTION_WORDS
+                     and token not in NEGATIONS and token not in INTENSIFIERS)
+    return [word for word, _ in counts.most_common(limit)]
+
+
+# Function to analyze one comment; returns (sentiment, label, language, keywords)
+def analyze(text):
+    tokens = tokenize(text)
+    score = round(sentiment_score(tokens), 4)
+    return score, sentiment_label(score), detect_language(text, tokens), ",".join(keywords(tokens))
+
+
+# Function to analyze a chunk of (comment_id, video_id, comment_text) rows in a
+# worker process; returns the comment_analytics rows without analyzed_at
+def analyze_chunk(rows):
+    return [(comment_id, video_id) + analyze(text) for comment_id, video_id, text in rows]